@@ -0,0 +1,320 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+import sys
+import os
+# Get the directory where the current script is located
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+# Add custom module folders relative to the script location
+sys.path.insert(0, os.path.join(parent_dir, 'Mylogging'))
+sys.path.insert(0, os.path.join(parent_dir, 'FeatureSelection'))
+
+import json
+import time
+import platform
+import argparse
+import itertools
+import subprocess
+import contextlib
+
+import numpy as np
+
+import mylogging
+import profiling
+import synthetic_cohorts
+
+import features_selection
+import permutation_tests
+import parallel
+
+# %%%%%%%%%%%%%
+name = "Benchmark"
+# %%%%%%%%%%%%%
+
+# Version of the result records; bump when a field changes meaning
+RECORD_VERSION = 1
+
+STAGES = ("constant_groups", "permutation_tests", "if_stat_signif_features", "calc_stat_sign_feat")
+
+# Parameter grids: every combination of the listed values is one cohort
+GRIDS = {
+    "smoke": dict(n_samples=[60], n_regions=[100], n_classes=[2], imbalance=[1.0], n_informative=[5],
+                  n_constant_groups=[0], effect=[1.0], seed=[0], size=[10]),
+    "default": dict(n_samples=[100, 400], n_regions=[200, 1000], n_classes=[2, 3], imbalance=[1.0, 0.3],
+                    n_informative=[10], n_constant_groups=[0, 1], effect=[1.0], seed=[0], size=[20]),
+    "wide": dict(n_samples=[200], n_regions=[2000, 10000], n_classes=[2], imbalance=[1.0], n_informative=[20],
+                 n_constant_groups=[0], effect=[0.8], seed=[0], size=[30]),
+}
+
+# features_selection parameters recorded with every result (and settable with --set)
+SETTINGS = ("pValue", "n_permutations", "permutation_seed", "stats_engine", "sequential_permutations",
+            "size_search", "elimination_step", "elimination_switch_factor", "quantized_training",
+            "resampling", "adaptive_runs", "adaptive_max_runs",
+            "prefilter_top_k", "prefilter_variance", "prefilter_statistic", "prefilter_correlation")
+
+
+def expand_grid(grid):
+    """List of parameter dicts, one per combination of the grid values."""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def load_grid(spec):
+    """Named grid (see GRIDS) or JSON file with the same layout."""
+    if spec in GRIDS:
+        return GRIDS[spec]
+    with open(spec) as f:
+        return json.load(f)
+
+
+def environment():
+    """Code version and environment of a benchmark run, stored with every record."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=script_dir, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=script_dir,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+
+    import pandas
+    import sklearn
+    import xgboost
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pandas.__version__,
+        "sklearn": sklearn.__version__,
+        "xgboost": xgboost.__version__,
+        "cores": parallel.available_cores(default=os.cpu_count() or 1),
+    }
+
+
+def read_selected(output_file):
+    """Selected regions of a calc_stat_sign_feat output (features with a non-zero importance)."""
+    with open(output_file) as f:
+        features = f.readline().strip().split(",")
+        importances = [float(v) for v in f.readline().strip().split(",")]
+    return [feat for feat, imp in zip(features, importances) if imp > 0.0]
+
+
+def run_stage(stage, dataframe, config, workdir, loggers):
+    """Runs one stage on a cohort and returns its outcome fields (selection quality, p-value)."""
+    logger_functions, logger_write, logger_stats = loggers
+    group_col = synthetic_cohorts.LABEL_COLUMN
+
+    if stage == "constant_groups":
+        constant = features_selection.detect_constant_groups(dataframe, group_col)
+        return {"constant_groups": len(constant)}
+
+    if stage == "permutation_tests":
+        X, _ = features_selection.split_features_labels(dataframe)
+        groups = dataframe[group_col].astype(str).values
+        alpha = features_selection.pValue if features_selection.sequential_permutations else None
+        # Same test as significance_test: distance to the first constant group if there is one
+        constant = features_selection.detect_constant_groups(dataframe, group_col)
+        if constant:
+            p_value, _, _, info = features_selection.permutation_test_vs_constant(
+                X, groups, str(constant[0]), n_permutations=features_selection.n_permutations,
+                random_state=features_selection.permutation_seed, alpha=alpha)
+            return {"p_value": float(p_value), "permutations_used": int(info["permutations used"]),
+                    "constant_groups": len(constant)}
+        coordinates = permutation_tests.euclidean_coordinates(X)
+        result = permutation_tests.permanova(X, groups, permutations=features_selection.n_permutations,
+                                             seed=features_selection.permutation_seed,
+                                             coordinates=coordinates, alpha=alpha)
+        permutation_tests.permdisp(X, groups, permutations=features_selection.n_permutations,
+                                   seed=features_selection.permutation_seed, coordinates=coordinates, alpha=alpha)
+        return {"p_value": float(result["p-value"]), "permutations_used": int(result["permutations used"])}
+
+    output_file = os.path.join(workdir, "selected_features.txt")
+    if stage == "if_stat_signif_features":
+        p_value, selected, _ = features_selection.if_stat_signif_features(
+            dataframe, output_file, config["size"], logger_functions, logger_stats)
+        return {"p_value": float(p_value), "selected": selected}
+
+    if stage == "calc_stat_sign_feat":
+        name_map = {c: c for c in dataframe.columns}
+        size = features_selection.calc_stat_sign_feat(dataframe, output_file, config["size"], name_map,
+                                                      logger_functions, logger_write, logger_stats)
+        return {"final_size": int(size), "selected": read_selected(output_file)}
+
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def benchmark(grid, stages, output, workdir, repeat=1, logger=None):
+    """
+    Runs every stage on every cohort of the grid and appends one JSON record per
+    (cohort, stage, repetition) to `output`. Returns the records.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    profiler = profiling.setup_profiler(os.path.join(workdir, "metrics.jsonl"), logger=logger)
+    loggers = (mylogging.setup_logger("Benchmark.Functions", f"{workdir}/__Functions__.log"),
+               mylogging.setup_logger("Benchmark.WriteToFile", f"{workdir}/__WriteToFile__.log"),
+               mylogging.setup_logger("Benchmark.Statistics", f"{workdir}/__Stats__.log"))
+    env = environment()
+    settings = {key: getattr(features_selection, key) for key in SETTINGS}
+    records = []
+
+    for config in expand_grid(grid):
+        cohort_params = {k: v for k, v in config.items() if k != "size"}
+        dataframe, informative = synthetic_cohorts.make_cohort(**cohort_params)
+        n_samples = dataframe.shape[0]
+        n_regions = dataframe.shape[1] - 1
+
+        for stage, repetition in itertools.product(stages, range(repeat)):
+            status = "ok"
+            outcome = {}
+            # The FeatureSelection module prints per-group and per-step diagnostics
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                try:
+                    with profiler.span(stage, **config):
+                        outcome = run_stage(stage, dataframe, config, workdir, loggers)
+                except SystemExit as e:
+                    status = f"exit {e.code}"
+                except Exception as e:
+                    status = type(e).__name__
+                    if logger:
+                        logger.exception(f"{stage} failed on {config}")
+            span = profiler.records[-1]
+
+            record = {
+                "version": RECORD_VERSION,
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "stage": stage,
+                "repetition": repetition,
+                "config": config,
+                "settings": settings,
+                "environment": env,
+                "status": status,
+                "n_samples": n_samples,
+                "n_regions": n_regions,
+                "wall_s": span["wall_s"],
+                "cpu_s": span["cpu_s"] + span["cpu_children_s"],
+                "peak_rss_mb": span["peak_rss_mb"],
+                # Matrix cells processed per second
+                "throughput": n_samples * n_regions / span["wall_s"] if span["wall_s"] > 0 else None,
+            }
+            selected = outcome.pop("selected", None)
+            if selected is not None:
+                record["n_selected"] = len(selected)
+                record["recall"] = synthetic_cohorts.recall(selected, informative)
+                record["precision"] = synthetic_cohorts.precision(selected, informative)
+            record.update(outcome)
+            records.append(record)
+
+            with open(output, "a") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+            if logger:
+                logger.info(f"{stage} {config}: {record['wall_s']:.2f} s, {record['peak_rss_mb']:.0f} MB, "
+                            f"recall={record.get('recall')}, status={status}")
+    return records
+
+
+def record_key(record):
+    """Identifies the same measurement across runs: stage, cohort and settings."""
+    return json.dumps([record["stage"], record["config"], record["settings"]], sort_keys=True, default=str)
+
+
+def read_records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(baseline_file, candidate_file, tolerance=0.10):
+    """
+    Compares two benchmark result files measurement by measurement (median over
+    repetitions). A measurement regresses if its wall time or peak RSS grows by
+    more than `tolerance`, or its recall drops.
+
+    Returns:
+    - lines of the comparison table
+    - number of regressions
+    """
+    def medians(records):
+        grouped = {}
+        for record in records:
+            if record["status"] == "ok":
+                grouped.setdefault(record_key(record), []).append(record)
+        return {key: {field: float(np.median([r[field] for r in group if r.get(field) is not None] or [np.nan]))
+                      for field in ("wall_s", "peak_rss_mb", "recall")} | {"record": group[0]}
+                for key, group in grouped.items()}
+
+    baseline = medians(read_records(baseline_file))
+    candidate = medians(read_records(candidate_file))
+
+    lines = [f"{'stage':<24} {'samples':>7} {'regions':>7} {'wall_s':>17} {'peak_rss_mb':>19} {'recall':>13}"]
+    regressions = 0
+    for key in sorted(set(baseline) & set(candidate)):
+        old, new = baseline[key], candidate[key]
+        flags = []
+        if new["wall_s"] > old["wall_s"] * (1 + tolerance):
+            flags.append("slower")
+        if new["peak_rss_mb"] > old["peak_rss_mb"] * (1 + tolerance):
+            flags.append("memory")
+        if new["recall"] < old["recall"]:
+            flags.append("recall")
+        regressions += bool(flags)
+        record = new["record"]
+        lines.append(f"{record['stage']:<24} {record['n_samples']:>7} {record['n_regions']:>7} "
+                     f"{old['wall_s']:>8.2f}>{new['wall_s']:<8.2f} {old['peak_rss_mb']:>9.0f}>{new['peak_rss_mb']:<9.0f} "
+                     f"{old['recall']:>6.2f}>{new['recall']:<6.2f} {' '.join(flags)}")
+    missing = len(set(baseline) ^ set(candidate))
+    if missing:
+        lines.append(f"{missing} measurements present in only one of the files")
+    return lines, regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the feature-selection pipeline on synthetic cohorts")
+    parser.add_argument("--grid", default="smoke", help=f"grid name ({', '.join(GRIDS)}) or JSON grid file")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES), help="stages to run")
+    parser.add_argument("--repeat", type=int, default=1, help="repetitions of every measurement")
+    parser.add_argument("--output", default="bench_results.jsonl", help="JSON-lines result file (appended)")
+    parser.add_argument("--workdir", default="logs/benchmark", help="logs, metrics and temporary outputs")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a features_selection parameter (JSON value), e.g. elimination_step=0.2")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"),
+                        help="compare two result files instead of running")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="relative slowdown/memory growth tolerated")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+
+    if args.compare:
+        lines, regressions = compare(*args.compare, tolerance=args.tolerance)
+        print("\n".join(lines))
+        print(f"{regressions} regressions")
+        sys.exit(1 if regressions else 0)
+
+    for assignment in args.set:
+        key, _, value = assignment.partition("=")
+        if key not in SETTINGS:
+            raise SystemExit(f"Unknown setting {key}; one of {', '.join(SETTINGS)}")
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            pass
+        setattr(features_selection, key, value)
+
+    logger = mylogging.setup_logger("Benchmark.Main", f"{args.workdir}/__Benchmark__.log")
+    logger.info("Inside the " + name + " module")
+    records = benchmark(load_grid(args.grid), args.stages, args.output, args.workdir, repeat=args.repeat,
+                        logger=logger)
+    for record in records:
+        print(f"{record['stage']:<24} {record['n_samples']:>5}x{record['n_regions']:<6} "
+              f"{record['wall_s']:>8.2f} s {record['peak_rss_mb']:>8.0f} MB "
+              f"recall={record.get('recall', float('nan')):.2f} {record['status']}")
+
+
+# Guard needed by the process pools of the FeatureSelection module ('spawn' start method)
+if __name__ == "__main__":
+    main()
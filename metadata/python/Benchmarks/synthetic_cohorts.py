@@ -0,0 +1,92 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+import numpy as np
+import pandas as pd
+
+# Label column expected by the FeatureSelection module
+LABEL_COLUMN = 'Diagnostic_status'
+
+
+def class_sizes(n_samples, n_classes, imbalance=1.0):
+    """
+    Number of samples per class: class sizes decrease geometrically so that the
+    smallest class has `imbalance` times the samples of the largest (1.0: balanced).
+    """
+    weights = imbalance ** (np.arange(n_classes) / max(1, n_classes - 1))
+    sizes = np.maximum(1, np.floor(n_samples * weights / weights.sum()).astype(int))
+    sizes[0] += n_samples - sizes.sum()
+    return sizes
+
+
+def make_cohort(n_samples=100, n_regions=500, n_classes=2, imbalance=1.0, n_informative=10,
+                n_constant_groups=0, constant_group_size=3, effect=1.0, seed=0):
+    """
+    Generates a synthetic regions matrix in the layout of the importantRegions
+    CSV exports: one column per region (chrN_start) and Diagnostic_status last.
+
+    Regions are standard normal copy-number scores. The first n_informative
+    regions (in a shuffled column order) get a class-dependent shift of
+    `effect` standard deviations per class, so they are the regions a
+    feature selection should recover. Constant groups are extra classes whose
+    samples share one identical profile, as detected by detect_constant_groups.
+
+    Parameters:
+    - n_samples: samples of the non-constant classes
+    - n_regions: number of regions (feature columns)
+    - n_classes: number of non-constant classes
+    - imbalance: smallest / largest class size (see class_sizes)
+    - n_informative: number of regions with class-dependent means
+    - n_constant_groups: number of additional feature-constant classes
+    - constant_group_size: samples per constant class
+    - effect: shift between consecutive classes, in standard deviations
+    - seed: random seed
+
+    Returns:
+    - dataframe: regions followed by Diagnostic_status
+    - informative: names of the informative regions
+    """
+    rng = np.random.default_rng(seed)
+    sizes = class_sizes(n_samples, n_classes, imbalance)
+    labels = np.repeat(np.arange(n_classes), sizes)
+
+    values = rng.standard_normal((n_samples, n_regions)).astype(np.float64)
+    n_informative = min(n_informative, n_regions)
+    # Each informative region separates the classes with its own direction
+    directions = rng.choice([-1.0, 1.0], size=n_informative)
+    values[:, :n_informative] += effect * labels[:, None] * directions[None, :]
+
+    diagnostic = np.array([f"class_{c}" for c in labels], dtype=object)
+    if n_constant_groups:
+        profiles = rng.standard_normal((n_constant_groups, n_regions))
+        constant = np.repeat(profiles, constant_group_size, axis=0)
+        values = np.vstack([values, constant])
+        diagnostic = np.concatenate([diagnostic, np.repeat([f"constant_{g}" for g in range(n_constant_groups)],
+                                                           constant_group_size)])
+
+    # Region names along a synthetic chromosome, informative regions at random positions
+    order = rng.permutation(n_regions)
+    columns = np.array([f"chr1_{i * 1000}" for i in range(n_regions)])[order]
+    dataframe = pd.DataFrame(values, columns=columns)
+    dataframe = dataframe[sorted(columns, key=lambda c: int(c.split("_")[1]))]
+    dataframe[LABEL_COLUMN] = diagnostic
+
+    # Shuffle the rows so that classes are not contiguous
+    dataframe = dataframe.sample(frac=1.0, random_state=seed).reset_index(drop=True)
+    return dataframe, [str(c) for c in columns[:n_informative]]
+
+
+def recall(selected, informative):
+    """Share of the informative regions found among the selected ones."""
+    if not informative:
+        return float("nan")
+    return len(set(selected) & set(informative)) / len(informative)
+
+
+def precision(selected, informative):
+    """Share of the selected regions that are informative."""
+    if not selected:
+        return float("nan")
+    return len(set(selected) & set(informative)) / len(selected)
@@ -0,0 +1,146 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+import os
+import sys
+import json
+import pickle
+import shutil
+import signal
+import hashlib
+
+import numpy as np
+
+
+def data_fingerprint(X, y, chunk_rows=4096):
+    """
+    Hash of a feature matrix and its labels (values, dtypes, column names, label order).
+    The matrix is hashed in row chunks, so memory-mapped inputs are not loaded at once.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([str(c) for c in X.columns]).encode())
+    digest.update(str(X.dtypes.tolist()).encode())
+    values = X.to_numpy()
+    for start in range(0, values.shape[0], chunk_rows):
+        digest.update(np.ascontiguousarray(values[start:start + chunk_rows]).tobytes())
+    digest.update(np.ascontiguousarray(np.asarray(y)).tobytes())
+    return digest.hexdigest()
+
+
+class CheckpointStore:
+    """
+    Persistent state of a calc_stat_sign_feat run, so that a preempted or
+    requeued job resumes from the last completed unit of work.
+
+    State is kept under <directory>/<key>/, where the key hashes the input
+    data and the run parameters, so a changed input or parameter never
+    resumes from a stale checkpoint:
+    - paths/seed<seed>_split<size>.pkl: elimination trace of one (seed, split)
+      (rfe_path.EliminationPath.state())
+    - attempts.pkl: size -> (p_value, selected_features, importances_dic)
+
+    Files are written atomically (temporary file + rename), so a job killed
+    while writing leaves the previous version in place. The directory is only
+    meant for preempted or failed runs: a completed run removes it (remove()),
+    so a later run never replays its results.
+
+    Parameters:
+    - directory: root checkpoint directory (e.g. logs/ML/<job>_<task>/checkpoint)
+    - fingerprint: data_fingerprint of the input
+    - params: dict of the parameters that affect the results
+    - logger: optional logger
+    """
+
+    def __init__(self, directory, fingerprint, params, logger=None):
+        payload = json.dumps({"data": fingerprint, "params": params}, sort_keys=True, default=str)
+        self.key = hashlib.blake2b(payload.encode(), digest_size=12).hexdigest()
+        self.directory = os.path.join(directory, self.key)
+        self.logger = logger
+        # Objects flushed by flush(): callables returning {relative path: object}
+        self._sources = []
+        os.makedirs(os.path.join(self.directory, "paths"), exist_ok=True)
+
+        meta_file = os.path.join(self.directory, "meta.json")
+        if not os.path.exists(meta_file):
+            with open(meta_file, "w") as f:
+                f.write(payload)
+
+    def _file(self, name):
+        return os.path.join(self.directory, name)
+
+    def save(self, name, obj):
+        target = self._file(name)
+        tmp = f"{target}.tmp{os.getpid()}"
+        with open(tmp, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, target)
+
+    def load(self, name, default=None):
+        target = self._file(name)
+        if not os.path.exists(target):
+            return default
+        try:
+            with open(target, "rb") as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            if self.logger:
+                self.logger.warning(f"Ignoring unreadable checkpoint {target}: {e}")
+            return default
+
+    # (seed, split) elimination traces
+    @staticmethod
+    def path_name(seed, size):
+        return os.path.join("paths", f"seed{seed}_split{size}.pkl")
+
+    def save_path(self, seed, size, state):
+        self.save(self.path_name(seed, size), state)
+
+    def load_path(self, seed, size):
+        return self.load(self.path_name(seed, size))
+
+    # Per-size test outcomes
+    def save_attempts(self, attempts):
+        self.save("attempts.pkl", dict(attempts))
+
+    def load_attempts(self):
+        return self.load("attempts.pkl", {})
+
+    def remove(self):
+        """Removes the checkpoint of this key, once its run has completed."""
+        self._sources.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        if self.logger:
+            self.logger.info(f"Checkpoint {self.directory} removed")
+
+    def register(self, source):
+        """Registers a callable returning {name: object} to be written by flush()."""
+        self._sources.append(source)
+
+    def flush(self):
+        """Writes the current state of every registered source."""
+        for source in self._sources:
+            for name, obj in source().items():
+                self.save(name, obj)
+        if self.logger:
+            self.logger.info(f"Checkpoint flushed to {self.directory}")
+
+
+def install_sigterm_handler(store, logger=None):
+    """
+    Flushes the checkpoint store when SLURM sends SIGTERM (preemption, walltime,
+    scancel), then exits with the conventional 128 + SIGTERM status.
+    Returns the previous handler.
+    """
+    def handler(signum, frame):
+        if logger:
+            logger.warning("SIGTERM received: saving checkpoint before exit")
+        try:
+            store.flush()
+        finally:
+            sys.exit(128 + signum)
+
+    return signal.signal(signal.SIGTERM, handler)
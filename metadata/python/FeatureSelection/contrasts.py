@@ -0,0 +1,154 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+import parallel
+import permutation_tests
+
+# Contrast kinds
+PAIRWISE, ONE_VS_REST, BOTH = "pairwise", "one-vs-rest", "both"
+# Label of the other classes in a one-vs-rest contrast
+REST = "rest"
+# Groups smaller than this are not tested (as detect_constant_groups in features_selection)
+MIN_GROUP_SIZE = 3
+
+
+def define_contrasts(labels, kind=PAIRWISE, reference=None):
+    """
+    Contrasts between the classes of labels.
+
+    Parameters:
+    - labels: class label of every sample
+    - kind: "pairwise" (every pair of classes, or the reference against every
+      other class if reference is set), "one-vs-rest" (every class against all the
+      others) or "both"
+    - reference: class compared to each other class in pairwise contrasts (e.g. healthy)
+
+    Returns:
+    - list of (name, group_a, group_b, rows, grouping): rows are the indices of
+      the samples of the contrast (None: all samples) and grouping their labels
+    """
+    if kind not in (PAIRWISE, ONE_VS_REST, BOTH):
+        raise ValueError(f"Unknown contrast kind: {kind}")
+    labels = np.asarray(labels).astype(str)
+    classes = np.unique(labels)
+    if reference is not None and str(reference) not in classes:
+        raise ValueError(f"Reference class {reference} not found in {', '.join(classes)}")
+
+    contrasts = []
+    if kind in (PAIRWISE, BOTH):
+        if reference is None:
+            pairs = combinations(classes, 2)
+        else:
+            pairs = [(str(reference), other) for other in classes if other != str(reference)]
+        for a, b in pairs:
+            rows = np.flatnonzero((labels == a) | (labels == b))
+            contrasts.append((f"{a} vs {b}", a, b, rows, labels[rows]))
+    if kind in (ONE_VS_REST, BOTH) and len(classes) > 2:
+        for a in classes:
+            contrasts.append((f"{a} vs {REST}", a, REST, None, np.where(labels == a, a, REST)))
+    return contrasts
+
+
+def adjust_pvalues(p_values, method="holm"):
+    """
+    Multiple-testing adjusted p-values ("holm", "bonferroni" or "fdr_bh"
+    Benjamini-Hochberg, as in statsmodels' multipletests). NaN p-values are
+    left out of the correction and stay NaN.
+    """
+    p = np.asarray(p_values, dtype=np.float64)
+    adjusted = np.full(p.shape, np.nan)
+    tested = np.flatnonzero(~np.isnan(p))
+    m = len(tested)
+    if not m:
+        return adjusted
+    order = tested[np.argsort(p[tested], kind="stable")]
+    ranked = p[order]
+    if method == "bonferroni":
+        values = np.minimum(1.0, ranked * m)
+    elif method == "holm":
+        values = np.minimum(1.0, np.maximum.accumulate(ranked * (m - np.arange(m))))
+    elif method == "fdr_bh":
+        values = np.minimum(1.0, np.minimum.accumulate((ranked * m / np.arange(1, m + 1))[::-1])[::-1])
+    else:
+        raise ValueError(f"Unknown p-value correction: {method}")
+    adjusted[order] = values
+    return adjusted
+
+
+def _sub_distances(distances, rows):
+    """Distances of a subset of samples: sub-block of a DistanceMatrix, or re-centered coordinates."""
+    if rows is None:
+        return distances
+    if hasattr(distances, "filter"):
+        return distances.filter([distances.ids[i] for i in rows])
+    # Centered coordinates of the subset: same Gram matrix as the sub-block of the distances
+    Z = distances[rows]
+    return Z - Z.mean(axis=0)
+
+
+def _test_contrast(task):
+    """Thread entry point: PERMANOVA and PERMDISP of one contrast on the shared distances."""
+    (name, a, b, rows, grouping), distances, permutations, seed = task
+    counts = pd.Series(grouping).value_counts()
+    result = {"contrast": name, "group_a": a, "group_b": b,
+              "n_a": int(counts.get(a, 0)), "n_b": int(counts.get(b, 0))}
+    if min(result["n_a"], result["n_b"]) < MIN_GROUP_SIZE:
+        result.update(pseudo_F=np.nan, p_value=np.nan, permdisp_F=np.nan, permdisp_p=np.nan,
+                      note=f"group with < {MIN_GROUP_SIZE} samples")
+        return result
+
+    sub = _sub_distances(distances, rows)
+    if hasattr(sub, "filter"):
+        from skbio.stats.distance import permanova, permdisp
+
+        adonis = permanova(sub, grouping=grouping, permutations=permutations, seed=seed)
+        disp = permdisp(sub, grouping, permutations=permutations, seed=seed)
+    else:
+        adonis = permutation_tests.permanova(None, grouping, permutations=permutations, seed=seed, coordinates=sub)
+        disp = permutation_tests.permdisp(None, grouping, permutations=permutations, seed=seed, coordinates=sub)
+    result.update(pseudo_F=adonis['test statistic'], p_value=adonis['p-value'],
+                  permdisp_F=disp['test statistic'], permdisp_p=disp['p-value'], note="")
+    return result
+
+
+def run_contrasts(distances, labels, kind=PAIRWISE, reference=None, permutations=999, seed=None,
+                  correction="holm", alpha=0.05, n_workers=1):
+    """
+    PERMANOVA (and PERMDISP) of every contrast between the classes of labels,
+    from one distance object shared by all contrasts: pairwise contrasts use
+    the sub-block of their samples, one-vs-rest contrasts the whole object with
+    a relabelled grouping. Contrasts run in a thread pool, on the same memory.
+
+    All permutations are run (no sequential stopping), so that the p-values can
+    be adjusted for multiple testing.
+
+    Parameters:
+    - distances: skbio DistanceMatrix, or centered coordinates
+      (permutation_tests.euclidean_coordinates) of the samples
+    - labels: class label of every sample, aligned with distances
+    - kind, reference: contrasts (see define_contrasts)
+    - permutations, seed: permutation test settings, as in the global test
+    - correction: p-value adjustment (see adjust_pvalues)
+    - alpha: significance level of the adjusted p-values
+    - n_workers: number of threads
+
+    Returns:
+    - DataFrame with one row per contrast: contrast, group_a, group_b, n_a, n_b,
+      pseudo_F, p_value, p_adjusted, significant, permdisp_F, permdisp_p, note
+    """
+    contrasts = define_contrasts(labels, kind, reference)
+    results = parallel.map_threads(_test_contrast,
+                                   [(contrast, distances, permutations, seed) for contrast in contrasts],
+                                   n_workers)
+    summary = pd.DataFrame(results, columns=["contrast", "group_a", "group_b", "n_a", "n_b", "pseudo_F",
+                                             "p_value", "permdisp_F", "permdisp_p", "note"])
+    summary.insert(7, "p_adjusted", adjust_pvalues(summary["p_value"], correction))
+    summary.insert(8, "significant", summary["p_adjusted"] < alpha)
+    return summary
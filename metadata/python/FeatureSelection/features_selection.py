@@ -27,31 +27,28 @@ from numpy import mean
 from numpy import std
 
 import mylogging
+import profiling
+import rfe_path
+import parallel
+import permutation_tests
+import checkpoint
+import prefilter
+import significance_cache
+import rebalance
+import incremental
+import contrasts
+import permutation_shards
+import result_store
 import math
-from itertools import permutations
-
-# Machine learning and statistical tools
-from sklearn.feature_selection import RFE
-from sklearn.model_selection import train_test_split
-from collections import Counter
-from imblearn.over_sampling import SMOTE
-from sklearn.model_selection import RepeatedStratifiedKFold
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import cross_val_score
-from sklearn.metrics import accuracy_score
-
-# Feature selection with embedded hyperparameter tuning
-from shaphypetune import  BoostRFE
-import xgboost as xgb
+
+# Heavy dependencies (sklearn, xgboost, skbio, scipy) are imported by the
+# functions that use them, so that importing this module stays fast
+# (e.g. for the resident worker, the benchmarks and the batch driver)
 
 # MANOVA test and assumptions checking
 #import pre_manova
 #from statsmodels.multivariate.manova import MANOVA
 
-#PERMANOVA
-from skbio.stats.distance import DistanceMatrix, permanova, permdisp 
-from scipy.spatial.distance import pdist, squareform, cdist
-
 import warnings
 warnings.filterwarnings('ignore', module = 'statsmodels')
 
@@ -61,6 +58,92 @@ warnings.filterwarnings('ignore', module = 'statsmodels')
 pValue = 0.05
 test_statistic = "Wilks' lambda"
 
+# Permutation tests: number of permutations and seed for reproducible p-values
+n_permutations = 999
+permutation_seed = 123456
+
+# PERMDISP/PERMANOVA implementation: "native" (permutation_tests, Euclidean,
+# no square distance matrix) or "skbio" (DistanceMatrix + skbio.stats.distance)
+stats_engine = "native"
+
+# Sequential (Besag-Clifford) permutation tests of the native engine: stop as
+# soon as the decision p < pValue is settled instead of running all permutations
+sequential_permutations = True
+
+# Search over the minimum feature size in calc_stat_sign_feat: "linear", "bisection" or "galloping"
+size_search = "linear"
+
+# Elimination schedule of the RFE paths (see rfe_path.EliminationPath): 1 removes one
+# feature per refit (BoostRFE step=1); a fraction in (0, 1) removes that share of the
+# surviving features per refit until elimination_switch_factor x the initial minimum
+# size is reached, then one at a time
+elimination_step = 1
+elimination_switch_factor = 2
+
+# Train the RFE steps on bin codes quantized once per split (rfe_path.QuantizedSplit);
+# same trees as training on the raw values, without re-converting the data at every step
+quantized_training = True
+
+# Rebalancing of the training part of every RFE split (see rebalance.rebalance), done once
+# per split and shared by all seeds: "auto" uses random oversampling if the minority class
+# has < 40% of the majority's samples and SMOTE if < 50%; "ros", "smote" or None force a method
+resampling = "auto"
+
+# Stability-driven number of RFE runs (see rfe_path.RFEPathEngine): if adaptive_runs is True,
+# seeds (each with every split size) are added from adaptive_min_runs until the Jaccard index of
+# the selected sets and the Spearman correlation of the mean ranks of successive aggregates reach
+# convergence_jaccard and convergence_correlation for convergence_patience seeds in a row, or
+# adaptive_max_runs seeds are used; otherwise rfe_path.N_RUNS seeds are always used
+adaptive_runs = False
+adaptive_min_runs = 2
+adaptive_max_runs = 10
+convergence_jaccard = 1.0
+convergence_correlation = 0.95
+convergence_patience = 2
+
+# Memory budget (MB) of the cache of significance tests by selected-feature set in
+# calc_stat_sign_feat (0 disables it)
+test_cache_mb = 256
+
+# Univariate pre-filter before BoostRFE (see prefilter.prefilter); enabled when any of
+# prefilter_top_k, prefilter_variance or prefilter_correlation is set (not None).
+# Columns with variance <= prefilter_variance (None: 0) are dropped, the others are ranked by
+# prefilter_statistic ("kruskal" or "anova"), deduplicated by |r| > prefilter_correlation
+# (None: no deduplication) and the best prefilter_top_k are kept (None: all)
+prefilter_top_k = None
+prefilter_variance = None
+prefilter_statistic = "kruskal"
+prefilter_correlation = None
+
+# Incremental runs (calc_stat_sign_feat with incremental_run=True) on a cohort with appended
+# samples: the RFE is warm-started on the first incremental_pool_factor x (previous size)
+# features of the previous elimination order, and its result is kept if the Spearman
+# correlation of their new and previous elimination ranks is at least
+# incremental_min_stability (otherwise all features are refitted)
+incremental_pool_factor = 2
+incremental_min_stability = 0.7
+
+# Per-contrast tests on the final features (see contrasts.run_contrasts), written to
+# <output stem>_contrasts.csv: None, "pairwise", "one-vs-rest" or "both". Pairwise
+# contrasts compare contrast_reference with every other class if set, every pair otherwise;
+# p-values are adjusted with contrast_correction ("holm", "bonferroni" or "fdr_bh")
+contrast_kind = None
+contrast_reference = None
+contrast_correction = "holm"
+
+# Sharded PERMANOVA of the final features (see permutation_shards): if sharded_permutations > 0,
+# a plan of that many permutations split into permutation_shards shards (SLURM array tasks of
+# main/sharded_permanova.py) is written to <output stem>_permutations. Chunks of permutations
+# are seeded from permutation_seed, so the merged p-value does not depend on the number of shards
+sharded_permutations = 0
+permutation_shards_count = 10
+
+# Result store (see result_store): if store_results is True, every run is added to the SQLite
+# file result_store_path (None: <output stem>_results.sqlite) with its parameters, the test of
+# every evaluated size, the final features and the ranking of every (seed, split) at the final size
+store_results = True
+result_store_path = None
+
 # Logging module name
 name = "FeatureSelection"
 
@@ -113,6 +196,27 @@ def write_features_and_importances(filepath, selected_features, importances_dic,
             print("Error writing features:", e)
         sys.exit(3)
 
+def split_features_labels(dataframe, group_col='Diagnostic_status'):
+    """
+    Splits the input dataframe into the feature matrix and the encoded labels.
+
+    When the label column is the last one (as written by the Java modules and
+    data_loading), the features are returned as a column slice, which is a view
+    of the original (possibly memory-mapped) matrix rather than a copy.
+    The features must be treated as read-only.
+
+    Returns:
+    - X: DataFrame of features
+    - y: Series of category codes of group_col
+    """
+    y = dataframe[group_col].astype("category").cat.codes
+    if dataframe.columns[-1] == group_col:
+        X = dataframe.iloc[:, :-1]
+    else:
+        X = dataframe.drop(columns=[group_col])
+    return X, y
+
+@profiling.profiled()
 def detect_constant_groups(data_df, group_col, min_group_size=3, tol=1e-8):
     """
     Detect groups that are either:
@@ -162,6 +266,8 @@ def detect_constant_groups(data_df, group_col, min_group_size=3, tol=1e-8):
     return constant_groups
 
 def add_noise_to_zeros(dm, epsilon=1e-8):
+    from skbio.stats.distance import DistanceMatrix
+
     arr = dm.data.copy()
     
     arr += np.random.normal(0, epsilon, arr.shape)
@@ -173,10 +279,15 @@ def add_noise_to_zeros(dm, epsilon=1e-8):
     
     return DistanceMatrix(arr, ids=dm.ids)
 
-def permutation_test_vs_constant(X, groups, constant_group, n_permutations=999, metric='euclidean', random_state=None):
+@profiling.profiled()
+def permutation_test_vs_constant(X, groups, constant_group, n_permutations=999, metric='euclidean', random_state=None, block_size=256, alpha=None):
     """
     Permutation test comparing average distance of non-constant groups to a fixed reference point (constant group centroid).
     
+    Permutations are generated in blocks of integer label arrays, and the group
+    means of each block are computed at once with a single bincount, so the
+    cost per permutation is a few vectorized operations instead of a Python loop.
+
     Parameters:
     - X: DataFrame of selected features
     - groups: array-like of group labels (aligned with X)
@@ -184,13 +295,19 @@ def permutation_test_vs_constant(X, groups, constant_group, n_permutations=999,
     - n_permutations: number of permutations
     - metric: distance metric (default: Euclidean)
     - random_state: reproducibility seed
+    - block_size: number of permutations evaluated per block
+    - alpha: significance level for a sequential test that stops once the
+      decision p < alpha is settled (see permutation_tests.monte_carlo)
 
     Returns:
     - p_value: permutation-based p-value
     - observed_stat: observed average distance to the constant group centroid
     - permutation_distribution: array of permuted statistics
+    - info: permutations used and bounds of the full-run p-value
     """
-    rng = np.random.default_rng(random_state)
+    from scipy.spatial.distance import cdist
+
+    groups = np.asarray(groups)
 
     # Extract centroid of the constant group
     ref_point = X.loc[groups == constant_group].mean(axis=0).values.reshape(1, -1)
@@ -198,30 +315,38 @@ def permutation_test_vs_constant(X, groups, constant_group, n_permutations=999,
     # Compute distances from all samples to this reference point
     distances = cdist(X.values, ref_point, metric=metric).flatten()
 
-    # Compute observed mean distance for non-constant groups
-    non_const_groups = [g for g in np.unique(groups) if g != constant_group]
-    observed_means = [distances[groups == g].mean() for g in non_const_groups]
-    observed_stat = np.mean(observed_means)
-
-    # Permutation test
-    perm_stats = np.empty(n_permutations)
-    for i in range(n_permutations):
-        permuted = rng.permutation(groups)
-        perm_means = [distances[permuted == g].mean() for g in non_const_groups]
-        perm_stats[i] = np.mean(perm_means)
-
-    # Compute p-value (upper tail)
-    p_value = (np.sum(perm_stats >= observed_stat) + 1) / (n_permutations + 1)
-
-    return p_value, observed_stat, perm_stats
-
+    # Integer labels; group sizes do not change under permutation
+    group_names, codes = permutation_tests.encode_groups(groups)
+    n_groups = len(group_names)
+    counts = np.bincount(codes, minlength=n_groups)
+    non_const = group_names != constant_group
+
+    def mean_distance(perm_codes):
+        # Offset the labels of each permutation so one bincount covers the whole block
+        n_block, n_samples = perm_codes.shape
+        offsets = (np.arange(n_block) * n_groups)[:, None]
+        sums = np.bincount((perm_codes + offsets).ravel(),
+                           weights=np.broadcast_to(distances, (n_block, n_samples)).ravel(),
+                           minlength=n_block * n_groups).reshape(n_block, n_groups)
+        # Mean over non-constant groups of their mean distance
+        return (sums[:, non_const] / counts[non_const]).mean(axis=1)
+
+    # Permutation test (upper tail), evaluated block by block
+    observed_stat, p_value, perm_stats, info = permutation_tests.monte_carlo(
+        mean_distance, codes, n_permutations, seed=random_state, block_size=block_size, alpha=alpha)
+
+    return p_value, observed_stat, perm_stats, info
+
+@profiling.profiled()
 def evaluate_model_performance(X_train, X_valid, y_train, y_valid, features=None):
     """
     Train and evaluate XGBoost classifier using given features.
     If features is None, use all features in X_train.
     Returns accuracy on validation set.
     """
-    
+    import xgboost as xgb
+    from sklearn.metrics import accuracy_score
+
     # Select features if specified
     if features is not None:
         X_train = X_train[features]
@@ -319,167 +444,21 @@ def get_dynamic_xgb_params(n_samples, n_features, num_classes, seed=0):
 
 
 # %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
-def if_stat_signif_features(dataframe,output_file,number,logger_functions,logger_stats):
-    """
-    Selects a minimum number of features using XGBoost-based RFE and 
-    evaluates their statistical significance with PERMANOVA.
-
-    Returns the PERMANOVA p-value and the list of selected features.
+def significance_test(dataframe, list_selectedFeat, logger_stats, previous_distances=None):
     """
-    # Ensure output directory exists
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    
-    # Create a working copy of the dataframe
-    X = dataframe.copy()
-    
-    # Encode diagnostic status as numeric values
-    X['Diagnostic_status'] = X['Diagnostic_status'].astype("category").cat.codes
-    y = X['Diagnostic_status']
-    X.drop(['Diagnostic_status'], axis=1, inplace=True)
-    
-    # Rows, columns, number of classes of initial dataset
-    rows, columns = X.shape
-    num_classes = len(np.unique(y))
-    print(f"Number of classes detected before XGBoost training: {num_classes}")
-    if num_classes < 1:
-        raise ValueError(f"Error: number of classes is less than 1: {num_classes}")
+    PERMDISP + PERMANOVA (or the permutation test against a constant group)
+    of the groups of dataframe on the selected features.
 
-    # Exit if fewer than 2 classes
-    if num_classes < 2:
-        raise ValueError(f"Error: insufficient number of classes for training (found {num_classes}). At least 2 classes are required.")
-    
-    # Get feature column names
-    list_columns = X.columns.values.tolist()
-    # Split data: 70% training, 30% validation
-    X_train_tmp,X_valid,y_train_tmp,y_valid = train_test_split(X, y,test_size=0.3,random_state=0, stratify=y)
-
-    class_counts = Counter(y_train_tmp)
-    minority_count = min(class_counts.values())
-    minority_ratio = minority_count / max(class_counts.values())
-
-    # Apply SMOTE only if the dataset is unbalanced
-    if  minority_ratio < 0.4:
-        # Not enough samples for SMOTE, use RandomOverSampler instead
-        from imblearn.over_sampling import RandomOverSampler
-        ros = RandomOverSampler(random_state=42)
-        X_train, y_train = ros.fit_resample(X_train_tmp, y_train_tmp)
-        print("Minority class too small, used RandomOverSampler:", Counter(y_train))
-    elif minority_ratio < 0.5:  # threshold, e.g., minority <50% of majority
-        k_neighbors = max(1, minority_count - 1)
-        smote = SMOTE(random_state=42, k_neighbors=k_neighbors)
-        X_train, y_train = smote.fit_resample(X_train_tmp, y_train_tmp)
-        print("After SMOTE resampling:", Counter(y_train))
-    else:
-        # If balanced enough, the analysis moves on
-        print("Dataset is balanced, SMOTE not applied")
-
-    # Train XGBoost classifier with BoostRFE
-    # Print info to debug XGBoost parameter error
-    logger_functions.info("The selected model is: BoostRFE")
-    print("The selected model is: BoostRFE")
-    
-    # Repetitions for stability
-    n_runs = 5  # number of repetitions
-    n_splits = 2
-    n_repeats = 3
-    
-    all_rankings = defaultdict(list)
-    all_importances = defaultdict(list)
-    
-    # Define cross-validation scheme: 2 splits, repeated 3 times, stratified by class
-    cv = RepeatedStratifiedKFold(n_splits=n_splits, n_repeats=n_repeats, random_state=123456)
-        
-
-    for seed in range(n_runs):
-        
-        for size in [4, 5, 6, 7]:
-            X_train,X_valid,y_train,y_valid = train_test_split(X, y,test_size=size/10,random_state=0, stratify=y)
-            
-            # print(f"x shape: {X.shape}")
-            # print(f"x_train shape: {X_train.shape}")
-    
-            # Update XGBoost random_state
-            params = get_dynamic_xgb_params(
-            n_samples=X_train.shape[0],
-            n_features=X_train.shape[1],
-            num_classes=num_classes,
-            seed=seed
-            )
-        
-            print("max_depth",params["max_depth"])
-            print("learning_rate",params["learning_rate"])
-            print("n_estimators",params["n_estimators"])
-            
-            xg_cl = xgb.XGBClassifier(**params)
-
-            # Limit number of features to available features
-            number = min(number, X_train.shape[1])
-            print(f"number of minimum features to train the model before rfe:{number}")
-    
-            #Apply recursive feature elimination
-            rfe = BoostRFE(estimator = xg_cl, min_features_to_select = number, step = 1)
-            # Fit model using BoostRFE
-            try:
-                rfe.fit(X_train, y_train, eval_set=[(X_valid, y_valid)], verbose=0)
-            except xgb.core.XGBoostError as e:
-                logger_functions.exception("XGBoost fitting failed")
-                raise
-    
-            # Collect feature rankings and importances
-            for feat, rank in zip(X_train.columns, rfe.ranking_):
-                all_rankings[feat].append(rank)
-            fitted_estimator = rfe.estimator_
-            # try:
-            #     print("Best iteration:", fitted_estimator.best_iteration)
-            # except Exception as e:
-            #     print("Error accessing best_iteration:", e)
-            #
-            # try:
-            #     print("Number of trees:", fitted_estimator.get_booster().num_boosted_rounds())
-            # except Exception as e:
-            #     print("Error accessing booster:", e)
-            #
-            # print("Selected features:", rfe.support_)
-            # print("Features importances:", fitted_estimator.feature_importances_)
-            
-            for feat, imp in zip(X_train.columns[rfe.support_], fitted_estimator.feature_importances_):
-                all_importances[feat].append(imp)
-                
-            print(f"Unique ranks for seed {seed}:", np.unique(rfe.ranking_))
-
-
-    # Aggregate rankings and importances across runs
-    final_rankings = {feat: np.mean(ranks) if ranks else 0.0
-                        for feat, ranks in all_rankings.items()}
-    final_importances = {feat: np.mean(imps) if imps else 0.0
-      for feat, imps in all_importances.items()}
-
-    # Sort features by aggregated final ranking
-    sorted_features = sorted(final_rankings.items(), key=lambda x: x[1])
-    # print("Final feature rankings:")
-    # for feat, avg_rank in sorted_features:
-    #     print(f"{feat}: {avg_rank:.2f}")
-
-    # Store selected features with ranks=1
-    list_selectedFeat = [feat for feat, rank in sorted_features if rank == 1]
-
-    # Print selected features
-    print(f"Number of selected features: {len(list_selectedFeat)}")
-    # print("Selected features:")
-    # for feat in list_selectedFeat:
-    #     print(f"selectedFeat: {feat}")
-
-    # dictionary of important features based on the aggregate final ranking scores during iterative XGBoost run
-    importances_dic = {feat: final_importances[feat] for feat in list_selectedFeat }
-    # print("Final feature importance scores:")
-    # for feat, avg_imp in importances_dic.items():
-    #     print(f"{feat}: {avg_imp:.2f}")
-    
-   # Validate that features were selected
-    if not list_selectedFeat:
-        logger_functions.error("No features were selected by RFE. PERMANOVA cannot be performed.")
-        raise ValueError("No features were selected by RFE. PERMANOVA requires at least one feature.")
+    previous_distances: optional (features, square distance matrix) of the first
+    samples of dataframe (incremental run); with the skbio engine and the same
+    features, only the distances of the new samples are computed.
 
+    Returns:
+    - test_result: dict with method, statistic and p_value (None if the test could not run);
+      PERMANOVA results also have permdisp_statistic, permdisp_p_value and permutations_used
+    - distances: skbio DistanceMatrix (before the jitter of zero distances) or
+      centered coordinates (native engine) used by the test
+    """
     # Prepare selected features
     X_selected = dataframe.loc[:, list_selectedFeat]
     
@@ -502,24 +481,41 @@ def if_stat_signif_features(dataframe,output_file,number,logger_functions,logger
     # Minimal data check
     if X_selected.shape[0] < 3 or len(groups.unique()) < 2:
         logger_stats.error("Too few samples or diagnostic groups to run PERMANOVA.")
-        return 1.0, [], {}
+        return None, None
 
     # NaN check
     if X_selected.isnull().values.any():
         logger_stats.error("NaN values detected in selected features. Cannot compute distance matrix.")
-        return 1.0, [], {}
+        return None, None
 
     try:
-        # Compute distance matrix (Euclidean by default, but can be 'braycurtis', 'jaccard', etc.)
-        distance_matrix = squareform(pdist(X_selected, metric='euclidean'))
-        # dm = DistanceMatrix(distance_matrix, ids=[str(i) for i in ids])
-        dm = DistanceMatrix(distance_matrix, ids=ids)
-
-        # Align indices safely
-        X_selected = X_selected.reindex(dm.ids)
-        groups = groups.reindex(dm.ids)
-        
-        dm = add_noise_to_zeros(dm)
+        with profiling.span("distances", engine=stats_engine, n_features=X_selected.shape[1]):
+            if stats_engine == "skbio":
+                from skbio.stats.distance import DistanceMatrix, permanova, permdisp
+                from scipy.spatial.distance import pdist, squareform
+
+                if previous_distances is not None and set(previous_distances[0]) == set(list_selectedFeat):
+                    # Samples of the previous run first: only the new rows/columns are computed
+                    distance_matrix = incremental.extend_distances(previous_distances[1],
+                                                                      X_selected[list(previous_distances[0])])
+                    logger_stats.info(f"Distance matrix extended from {previous_distances[1].shape[0]} "
+                                      f"to {distance_matrix.shape[0]} samples")
+                else:
+                    # Compute distance matrix (Euclidean by default, but can be 'braycurtis', 'jaccard', etc.)
+                    distance_matrix = squareform(pdist(X_selected, metric='euclidean'))
+                # dm = DistanceMatrix(distance_matrix, ids=[str(i) for i in ids])
+                dm = DistanceMatrix(distance_matrix, ids=ids)
+
+                # Align indices safely
+                X_selected = X_selected.reindex(dm.ids)
+                groups = groups.reindex(dm.ids)
+
+                exact_dm = dm
+                dm = add_noise_to_zeros(dm)
+            else:
+                # Centered coordinates replace the square distance matrix (Euclidean only)
+                coordinates = permutation_tests.euclidean_coordinates(X_selected)
+        distances = exact_dm if stats_engine == "skbio" else coordinates
 
         # If constant group(s) exist, run special test
         if constant_groups:
@@ -527,17 +523,21 @@ def if_stat_signif_features(dataframe,output_file,number,logger_functions,logger
             print(f"Constant or small groups detected: {constant_groups}. Using distance-to-fixed-point permutation test with {reference_group}")
             logger_stats.info(f"Detected constant/small group(s): {constant_groups}. Using distance-to-fixed-point permutation test.")
             
-            p_value, observed_stat, perm_dist = permutation_test_vs_constant(
+            p_value, observed_stat, perm_dist, perm_info = permutation_test_vs_constant(
                 X_selected,
                 groups,
                 reference_group,
-                n_permutations=999,
-                metric='euclidean'
+                n_permutations=n_permutations,
+                metric='euclidean',
+                random_state=permutation_seed,
+                alpha=pValue if sequential_permutations else None
             )
             
             logger_stats.info(
             f"Permutation test vs constant group ({reference_group}): "
-            f"observed_stat={observed_stat:.4f}, p={p_value:.4f}"
+            f"observed_stat={observed_stat:.4f}, p={p_value:.4f}, "
+            f"permutations used={perm_info['permutations used']}, "
+            f"p bounds=[{perm_info['p-value lower bound']:.4f}, {perm_info['p-value upper bound']:.4f}]"
             )
             test_result = {
                 "method": "perm_vs_constant",
@@ -548,7 +548,13 @@ def if_stat_signif_features(dataframe,output_file,number,logger_functions,logger
         else:
             # Check for Homogeneity of group dispersions
             print("no constant groups. Running PERMDISP + PERMANOVA")
-            disp_result = permdisp(dm, groups)
+            with profiling.span("permdisp", engine=stats_engine):
+                if stats_engine == "skbio":
+                    disp_result = permdisp(dm, groups, permutations=n_permutations, seed=permutation_seed)
+                else:
+                    disp_result = permutation_tests.permdisp(X_selected, groups.values, permutations=n_permutations,
+                                                             seed=permutation_seed, coordinates=coordinates,
+                                                             alpha=0.05 if sequential_permutations else None)
             logger_stats.info(f"PERMDISP result: {disp_result}")
 
             if disp_result['p-value'] < 0.05:
@@ -556,25 +562,268 @@ def if_stat_signif_features(dataframe,output_file,number,logger_functions,logger
 
             # Run PERMANOVA
             print("Run PERMANOVA")
-            permanova_result = permanova(dm, grouping=groups, permutations=999)
+            with profiling.span("permanova", engine=stats_engine):
+                if stats_engine == "skbio":
+                    permanova_result = permanova(dm, grouping=groups, permutations=n_permutations, seed=permutation_seed)
+                else:
+                    permanova_result = permutation_tests.permanova(X_selected, groups.values, permutations=n_permutations,
+                                                                   seed=permutation_seed, coordinates=coordinates,
+                                                                   alpha=pValue if sequential_permutations else None)
             p_value = permanova_result['p-value']
             logger_stats.info(f"PERMANOVA result: pseudo-F={permanova_result['test statistic']:.4f}, p={p_value:.4f}")
+            if 'permutations used' in permanova_result:
+                logger_stats.info(f"PERMANOVA permutations used: {permanova_result['permutations used']}/{n_permutations}, "
+                                  f"p bounds=[{permanova_result['p-value lower bound']:.4f}, "
+                                  f"{permanova_result['p-value upper bound']:.4f}]")
             test_result = {
                 "method": "permanova",
                 "statistic": permanova_result['test statistic'],
-                "p_value": p_value
+                "p_value": p_value,
+                "permdisp_statistic": disp_result['test statistic'],
+                "permdisp_p_value": disp_result['p-value'],
+                "permutations_used": int(permanova_result.get('permutations used', n_permutations))
             }
 
-        return test_result['p_value'], list_selectedFeat, importances_dic
+        return test_result, distances
 
 
     except Exception as e:
         logger_stats.exception(f"PERMANOVA or distance matrix computation failed: {e}")
+        return None, None # Reported as non-significant
+
+def adaptive_run_settings():
+    """RFEPathEngine arguments of the adaptive number of runs (empty if adaptive_runs is False)."""
+    if not adaptive_runs:
+        return {}
+    return dict(max_runs=adaptive_max_runs, min_runs=adaptive_min_runs, jaccard=convergence_jaccard,
+                correlation=convergence_correlation, patience=convergence_patience)
+
+
+def test_key(list_selectedFeat):
+    """Key of a significance test: the selected-feature set and the test parameters."""
+    return (frozenset(list_selectedFeat), stats_engine, n_permutations, permutation_seed,
+            sequential_permutations, pValue)
+
+
+def if_stat_signif_features(dataframe,output_file,number,logger_functions,logger_stats,rfe_engine=None,test_cache=None,
+                            previous_distances=None, test_results=None):
+    """
+    Selects a minimum number of features using XGBoost-based RFE and 
+    evaluates their statistical significance with PERMANOVA.
+
+    If an rfe_engine (rfe_path.RFEPathEngine) is given, its elimination paths
+    are reused, so repeated calls with a smaller number do not refit the
+    features already eliminated. If a test_cache (significance_cache.MemoryLRUCache)
+    is given, the test of a feature set already tested is not run again.
+    previous_distances is passed to significance_test (incremental runs).
+    test_results, if given, is a dict to which the test_result of significance_test
+    is added, keyed by number (result store).
+
+    Returns the PERMANOVA p-value and the list of selected features.
+    """
+    # Ensure output directory exists
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    
+    # Feature view (no copy of the matrix) and diagnostic status encoded as numeric values
+    X, y = split_features_labels(dataframe)
+    
+    # Rows, columns, number of classes of initial dataset
+    rows, columns = X.shape
+    num_classes = len(np.unique(y))
+    print(f"Number of classes detected before XGBoost training: {num_classes}")
+    if num_classes < 1:
+        raise ValueError(f"Error: number of classes is less than 1: {num_classes}")
+
+    # Exit if fewer than 2 classes
+    if num_classes < 2:
+        raise ValueError(f"Error: insufficient number of classes for training (found {num_classes}). At least 2 classes are required.")
+    
+    # Get feature column names
+    list_columns = X.columns.values.tolist()
+
+    # Train XGBoost classifier with BoostRFE
+    # Print info to debug XGBoost parameter error
+    logger_functions.info("The selected model is: BoostRFE")
+    print("The selected model is: BoostRFE")
+    
+    # Limit number of features to available features
+    requested = number
+    number = min(number, columns)
+    print(f"number of minimum features to train the model before rfe:{number}")
+
+    # Repetitions for stability: one step-1 elimination path per (seed, split),
+    # shared across attempts when the caller passes an engine
+    if rfe_engine is None:
+        rfe_engine = rfe_path.RFEPathEngine(X, y, num_classes, get_dynamic_xgb_params,
+                                            step=elimination_step, quantize=quantized_training,
+                                            resampling=resampling, logger=logger_functions,
+                                            **adaptive_run_settings())
+
+    with profiling.span("rfe", size=number):
+        all_rankings, all_importances = rfe_engine.select(number)
+
+    # Aggregate rankings and importances across runs
+    final_rankings = {feat: np.mean(ranks) if ranks else 0.0
+                        for feat, ranks in all_rankings.items()}
+    final_importances = {feat: np.mean(imps) if imps else 0.0
+      for feat, imps in all_importances.items()}
+
+    # Sort features by aggregated final ranking
+    sorted_features = sorted(final_rankings.items(), key=lambda x: x[1])
+    # print("Final feature rankings:")
+    # for feat, avg_rank in sorted_features:
+    #     print(f"{feat}: {avg_rank:.2f}")
+
+    # Store selected features with ranks=1
+    list_selectedFeat = [feat for feat, rank in sorted_features if rank == 1]
+
+    # Print selected features
+    print(f"Number of selected features: {len(list_selectedFeat)}")
+    # print("Selected features:")
+    # for feat in list_selectedFeat:
+    #     print(f"selectedFeat: {feat}")
+
+    # dictionary of important features based on the aggregate final ranking scores during iterative XGBoost run
+    importances_dic = {feat: final_importances[feat] for feat in list_selectedFeat }
+    # print("Final feature importance scores:")
+    # for feat, avg_imp in importances_dic.items():
+    #     print(f"{feat}: {avg_imp:.2f}")
+    
+   # Validate that features were selected
+    if not list_selectedFeat:
+        logger_functions.error("No features were selected by RFE. PERMANOVA cannot be performed.")
+        raise ValueError("No features were selected by RFE. PERMANOVA requires at least one feature.")
+
+    # The test only depends on the set of selected features: adjacent sizes often
+    # select the same set, whose result is then taken from the cache
+    key = test_key(list_selectedFeat)
+    cached = test_cache.get(key) if test_cache is not None else None
+    if cached is not None:
+        test_result = cached[0]
+        logger_stats.info(f"Significance test cache hit for {len(list_selectedFeat)} features "
+                          f"({test_cache.describe()}): p={test_result['p_value']:.4f}")
+    else:
+        test_result, distances = significance_test(dataframe, list_selectedFeat, logger_stats,
+                                                   previous_distances=previous_distances)
+        if test_cache is not None and test_result is not None:
+            test_cache.put(key, (test_result, distances), nbytes=significance_cache.nbytes(distances))
+            logger_stats.info(f"Significance test cache miss for {len(list_selectedFeat)} features "
+                              f"({test_cache.describe()})")
+
+    if test_results is not None:
+        test_results[requested] = test_result
+
+    if test_result is None:
         return 1.0, [], {} # Default to non-significant
+    return test_result['p_value'], list_selectedFeat, importances_dic
 
 
     
-def calc_stat_sign_feat(dataframe, outputfile, size, name_map,logger_functions, logger_write,logger_stats):
+def search_min_size(start, is_significant, strategy="linear", min_size=10):
+    """
+    Searches the largest minimum feature size in [min_size, start] whose
+    selected features are statistically significant.
+
+    Parameters:
+    - start: initial minimum number of features
+    - is_significant: callable(size) -> bool, expected to be memoized by the caller
+    - strategy: "linear" (start, start-1, ... as in the original loop),
+      "bisection" (start, then min_size, then halving the interval) or
+      "galloping" (start-1, start-2, start-4, ... until significant, then bisection).
+      bisection and galloping assume that once a size is significant, smaller sizes are too.
+    - min_size: smallest size that is evaluated (if start is larger)
+
+    Returns:
+    - (size, significant): the selected size, or the smallest evaluated size if none was significant
+    """
+    if strategy not in ("linear", "bisection", "galloping"):
+        raise ValueError(f"Unknown size search strategy: {strategy}")
+
+    if is_significant(start):
+        return start, True
+    if start <= min_size:
+        return start, False
+
+    if strategy == "linear":
+        size = start
+        while size > min_size:
+            size -= 1
+            if is_significant(size):
+                return size, True
+        return size, False
+
+    # Bracket the boundary: hi is not significant, lo is significant
+    hi = start
+    if strategy == "galloping":
+        step = 1
+        while True:
+            lo = max(min_size, hi - step)
+            if is_significant(lo):
+                break
+            if lo == min_size:
+                return min_size, False
+            hi = lo
+            step *= 2
+    else:
+        lo = min_size
+        if not is_significant(lo):
+            return min_size, False
+
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if is_significant(mid):
+            lo = mid
+        else:
+            hi = mid
+    return lo, True
+
+def prefilter_settings():
+    """Pre-filter parameters [top_k, variance, statistic, correlation], or None when it is disabled."""
+    if prefilter_top_k is None and prefilter_variance is None and prefilter_correlation is None:
+        return None
+    return [prefilter_top_k, prefilter_variance or 0.0, prefilter_statistic, prefilter_correlation]
+
+
+@profiling.profiled("prefilter")
+def apply_prefilter(dataframe, outputfile, logger=None):
+    """
+    Applies the univariate pre-filter (prefilter_* parameters) to the feature columns.
+
+    The per-column report (kept, reason, score) is written next to the output
+    as <outputfile stem>_prefilter.csv.
+
+    Returns:
+    - dataframe restricted to the kept columns and Diagnostic_status
+      (the input dataframe itself if the pre-filter is disabled)
+    """
+    settings = prefilter_settings()
+    if settings is None:
+        return dataframe
+
+    X, y = split_features_labels(dataframe)
+    kept_columns, report = prefilter.prefilter(X, y, top_k=prefilter_top_k,
+                                               variance_threshold=settings[1],
+                                               statistic=prefilter_statistic,
+                                               correlation_threshold=prefilter_correlation)
+
+    report_file = os.path.splitext(outputfile)[0] + "_prefilter.csv"
+    os.makedirs(os.path.dirname(os.path.abspath(report_file)), exist_ok=True)
+    report.to_csv(report_file, index=False)
+
+    if logger:
+        dropped = report.loc[~report["kept"], "reason"]
+        # Group the correlation reasons, which name the kept column
+        reasons = dropped.str.replace(r" with .*$", "", regex=True).value_counts()
+        logger.info(f"Pre-filter kept {len(kept_columns)} of {len(report)} columns "
+                    f"({prefilter_statistic}, top {prefilter_top_k or 'all'}); report written to {report_file}")
+        for reason, count in reasons.items():
+            logger.info(f"Pre-filter dropped {count} columns: {reason}")
+
+    return dataframe[kept_columns + ['Diagnostic_status']]
+
+
+def calc_stat_sign_feat(dataframe, outputfile, size, name_map,logger_functions, logger_write,logger_stats, search=None,
+                        checkpoint_dir=None, state_dir=None, incremental_run=False):
     """
     Iteratively performs feature selection and PERMANOVA analysis
     to identify statistically significant features. It evaluates the accuracy 
@@ -586,93 +835,352 @@ def calc_stat_sign_feat(dataframe, outputfile, size, name_map,logger_functions,
     - size: initial minimum number of features to select (used as 
             min_features_to_select in BoostRFE)
     - name_map: feature names that were modified (underscores to dashes)
+    - search: strategy over the minimum size, "linear", "bisection" or
+              "galloping" (see search_min_size); defaults to size_search
+    - checkpoint_dir: if given, RFE traces and per-size results are saved there
+                      and a restarted job with the same data and parameters resumes from them;
+                      they are removed once the run has completed
+    - state_dir: if given, the state of the run (sample hashes, elimination order,
+                 result and, with the skbio engine, the distance matrix of the selected
+                 features) is saved there for a later incremental run
+    - incremental_run: start from the state in state_dir if this input is its cohort
+                       with appended samples: the RFE is warm-started on the best features
+                       of the previous elimination order and the size search starts at the
+                       previous size; all features are refitted if the new ranks are not
+                       stable enough (incremental_min_stability)
 
     Returns:
     - Final number of selected features that were statistically significant
     """
+    from sklearn.model_selection import train_test_split
+
     logger_functions.info("Inside the " + name + " module.")
-    
-    times = 0
-    significant = False
-    selected_features = []
-    
-    while not significant:
-        try:
-            # Run the feature selection + PERMANOVA test, get p-value and features
-            times += 1
-            p_value, selected_features, importances_dic = if_stat_signif_features(dataframe,outputfile,size,logger_functions,logger_stats)
-            # for feat in selected_features:
-                # print(f"selected feature: {feat}")
-            print(f"PERMANOVA results: p_value {p_value}")
-            print(f"importance_values_list {importances_dic}")
-            logger_functions.info(f"Attempt #{times}: running feature selection + PERMANOVA for size = {size}")
-            logger_functions.info(f"this is the probability {p_value} for minimum feature size: {size}")
-        except Exception as e:
-            # Log and exit on error
-            logger_functions.error("An exception occurred: %s", e, exc_info=True)
-            sys.exit(3)
-    
-        if p_value is not None and not math.isnan(p_value) and p_value < pValue: # if p_value is a valid number and statistically significant
-            significant = True
-            # print(f"significant {significant}")
-            # for feat in selected_features:
-            #     print(f"selected feature: {feat}")
-            # print(f"Statistically significant features (p = {p_value:.4g}): {len(selected_features)} features")
-            logger_functions.info(f"Statistically significant features (p = {p_value:.4g}): {len(selected_features)} features")
-            logger_functions.info("Selected features: " + str(selected_features))
-            
-            logger_write.info("Inside the " + name + " module.")
-            
-            # Performance evaluation
-            X = dataframe.copy()
-            X['Diagnostic_status'] = X['Diagnostic_status'].astype("category").cat.codes
-            y = X['Diagnostic_status']
-            X.drop(['Diagnostic_status'], axis=1, inplace=True)
-            X_train, X_valid, y_train, y_valid = train_test_split(X, y, train_size=0.7, test_size=0.3, random_state=0)
-            # Evaluate performance BEFORE feature selection (all features)
-            acc_before = evaluate_model_performance(X_train, X_valid, y_train, y_valid, features=None)
-            logger_write.info(f"XGBoost accuracy before feature selection: {acc_before:.4f}")
-
-            # Evaluate performance AFTER feature selection (selected features)
-            acc_after = evaluate_model_performance(X_train, X_valid, y_train, y_valid, features=selected_features)
-            logger_write.info(f"XGBoost accuracy after feature selection: {acc_after:.4f}")
-            
-            write_features_and_importances(
-                filepath=outputfile,
-                selected_features=selected_features,
-                importances_dic=importances_dic,
-                all_columns=X_train.columns,
-                modified_col_map=name_map,
-                logger=logger_write
-            )
-    
+    search = search or size_search
+
+    # Results of every evaluated size: size -> (p_value, selected_features, importances_dic)
+    attempts = {}
+
+    # Features below which the RFE paths switch to step 1: every size tried by the
+    # search is at most the initial size, so they all fall in the step-1 region
+    switch_size = math.ceil(elimination_switch_factor * size) if elimination_step != 1 else None
+
+    # Parameters that affect the results: part of the checkpoint key, and compared by incremental runs
+    run_params = {
+        "pValue": pValue, "n_permutations": n_permutations, "permutation_seed": permutation_seed,
+        "stats_engine": stats_engine, "sequential_permutations": sequential_permutations,
+        "n_runs": rfe_path.N_RUNS, "split_sizes": rfe_path.SPLIT_SIZES,
+    }
+    if elimination_step != 1:
+        run_params["elimination"] = [elimination_step, switch_size]
+    if adaptive_runs:
+        run_params["adaptive_runs"] = adaptive_run_settings()
+    if resampling is not None:
+        run_params["resampling"] = [resampling, rebalance.RANDOM_STATE]
+    if prefilter_settings() is not None:
+        run_params["prefilter"] = prefilter_settings()
+
+    # Incremental run: state of the previous run, if this input appends samples to its cohort
+    X_all, y_all = split_features_labels(dataframe)
+    prior = None
+    if state_dir and incremental_run:
+        prior = incremental.load_state(state_dir)
+        if prior is None:
+            logger_functions.info(f"No previous state in {state_dir}: full run")
+        else:
+            n_new, reason = incremental.appended_samples(prior, X_all, y_all, run_params)
+            if reason is None and not prior["significant"]:
+                reason = "the previous run had no significant result"
+            if reason:
+                logger_functions.info(f"Incremental run not possible ({reason}): full run")
+                prior = None
+            else:
+                logger_functions.info(f"Incremental run: {n_new} samples appended to the "
+                                      f"{len(prior['digests'])} of the previous run")
+
+    # Significance tests by selected-feature set, shared by all attempts
+    test_cache = significance_cache.MemoryLRUCache(test_cache_mb * 2**20) if test_cache_mb else None
+    # Test result of every evaluated size, for the result store
+    test_results = {}
+    # Checkpoint stores of the run, removed once it has completed
+    stores = []
+
+    def build_engine(selection_df):
+        """
+        Checkpoint store (keyed by the input data and every parameter that affects
+        the results) and elimination paths of the columns of selection_df, shared by
+        all attempts, so that decreasing the size reuses the fits of the previous
+        attempts instead of refitting BoostRFE.
+        """
+        X_rfe, y_rfe = split_features_labels(selection_df)
+        store = None
+        attempts.clear()
+        if checkpoint_dir:
+            store = checkpoint.CheckpointStore(checkpoint_dir, checkpoint.data_fingerprint(X_rfe, y_rfe),
+                                               run_params, logger=logger_functions)
+            stores.append(store)
+            attempts.update(store.load_attempts())
+            if attempts:
+                logger_functions.info(f"Resumed {len(attempts)} size attempts from checkpoint {store.directory}")
+            store.register(lambda: {"attempts.pkl": dict(attempts)})
+            checkpoint.install_sigterm_handler(store, logger=logger_functions)
+
+        engine = rfe_path.RFEPathEngine(X_rfe, y_rfe, len(np.unique(y_rfe)), get_dynamic_xgb_params,
+                                        n_cores=parallel.available_cores(), checkpoint=store,
+                                        step=elimination_step, switch_size=switch_size,
+                                        quantize=quantized_training, resampling=resampling,
+                                        logger=logger_functions, **adaptive_run_settings())
+        return store, engine
+
+    previous_distances = None
+    if prior is not None:
+        # Warm start: the previous best features only, from the previous size
+        pool = incremental.warm_start_pool(prior["order"], prior["size"], incremental_pool_factor,
+                                              X_all.columns.tolist())
+        selection_df = dataframe[pool + ['Diagnostic_status']]
+        store, rfe_engine = build_engine(selection_df)
+        start = min(prior["size"], len(pool))
+        with profiling.span("warm_start", size=start, pool=len(pool)):
+            ranks = rfe_engine.elimination_ranks(start)
+        stability = incremental.ranking_stability(prior["ranks"], ranks)
+        if stability >= incremental_min_stability:
+            logger_functions.info(f"Warm start on {len(pool)} features of the previous elimination order: "
+                                  f"ranking stability {stability:.3f} >= {incremental_min_stability}, "
+                                  f"size search from {start}")
+            size = start
+            if prior["distances"] is not None:
+                previous_distances = (prior["selected"], prior["distances"])
         else:
+            logger_functions.warning(f"Ranking stability {stability:.3f} < {incremental_min_stability} "
+                                     f"after adding samples: refitting all features")
+            rfe_engine.close()
+            prior = None
+
+    if prior is None:
+        # Columns kept by the univariate pre-filter; the full dataframe is still used
+        # for the accuracy evaluation and the fallback output
+        selection_df = apply_prefilter(dataframe, outputfile, logger_functions)
+        store, rfe_engine = build_engine(selection_df)
+
+    def is_significant(size):
+        if size not in attempts:
+            try:
+                # Run the feature selection + PERMANOVA test, get p-value and features
+                times = len(attempts) + 1
+                with profiling.span("attempt", size=size):
+                    p_value, selected_features, importances_dic = if_stat_signif_features(selection_df,outputfile,size,logger_functions,logger_stats,rfe_engine=rfe_engine,test_cache=test_cache,
+                                                                                              previous_distances=previous_distances,
+                                                                                              test_results=test_results)
+                # for feat in selected_features:
+                    # print(f"selected feature: {feat}")
+                print(f"PERMANOVA results: p_value {p_value}")
+                print(f"importance_values_list {importances_dic}")
+                logger_functions.info(f"Attempt #{times}: running feature selection + PERMANOVA for size = {size} "
+                                      f"({rfe_engine.runs_used.get(size, rfe_engine.n_runs)} seeds x "
+                                      f"{len(rfe_engine.split_sizes)} splits)")
+                logger_functions.info(f"this is the probability {p_value} for minimum feature size: {size}")
+            except Exception as e:
+                # Log and exit on error
+                logger_functions.error("An exception occurred: %s", e, exc_info=True)
+                sys.exit(3)
+            attempts[size] = (p_value, selected_features, importances_dic)
+            if store is not None:
+                store.save_attempts(attempts)
+
             if p_value is None or math.isnan(p_value):# if p_value is not a valid number 
                 logger_functions.warning(f"Received NaN p-value — treating as non-significant for size: {size}")
-            else:# if p_value is a valid number but not statistically significant
-                print(f"significant {significant}")
+            elif p_value >= pValue:# if p_value is a valid number but not statistically significant
+                print(f"significant {False}")
                 logger_functions.warning(f"Not statistically significant result for PERMANOVA with {len(selected_features)} features (p = {p_value:.4g})")
-            # the minimum number of statistically significant features is reduced
-            if size > 10:
-                size -= 1
-            else:
-                logger_functions.warning("Minimum size reached with no statistically significant result")
-                finaldf = dataframe.copy()
-                finaldf.drop(['Diagnostic_status'], axis=1, inplace=True)
-                selected_features = finaldf.columns.values.tolist()
-                importances_dic = {feat: 0.0 for feat in selected_features}
-                all_columns = selected_features.copy()
-                
-                write_features_and_importances(
-                    filepath=outputfile,
-                    selected_features=selected_features,
-                    importances_dic=importances_dic,  # all zeroes if fallback
-                    all_columns=selected_features,
-                    modified_col_map=name_map,
-                    logger=logger_write
-                )
 
-                break
+        p_value = attempts[size][0]
+        return p_value is not None and not math.isnan(p_value) and p_value < pValue # if p_value is a valid number and statistically significant
+
+    initial_size = size
+    size, significant = search_min_size(size, is_significant, strategy=search, min_size=10)
+
+    # Full size -> p-value curve of the search
+    curve = ", ".join(f"{s}: {attempts[s][0]:.4g}" for s in sorted(attempts, reverse=True))
+    logger_functions.info(f"Size search ({search}), {len(attempts)} attempts, p-value by minimum size: {curve}")
+    if test_cache is not None:
+        logger_functions.info(f"Significance test cache: {test_cache.describe()}")
+
+    if significant:
+        p_value, selected_features, importances_dic = attempts[size]
+        # print(f"significant {significant}")
+        # for feat in selected_features:
+        #     print(f"selected feature: {feat}")
+        # print(f"Statistically significant features (p = {p_value:.4g}): {len(selected_features)} features")
+        logger_functions.info(f"Statistically significant features (p = {p_value:.4g}): {len(selected_features)} features")
+        logger_functions.info("Selected features: " + str(selected_features))
+        
+        logger_write.info("Inside the " + name + " module.")
+        
+        # Performance evaluation
+        X, y = split_features_labels(dataframe)
+        X_train, X_valid, y_train, y_valid = train_test_split(X, y, train_size=0.7, test_size=0.3, random_state=0)
+        # Evaluate performance BEFORE feature selection (all features)
+        acc_before = evaluate_model_performance(X_train, X_valid, y_train, y_valid, features=None)
+        logger_write.info(f"XGBoost accuracy before feature selection: {acc_before:.4f}")
+
+        # Evaluate performance AFTER feature selection (selected features)
+        acc_after = evaluate_model_performance(X_train, X_valid, y_train, y_valid, features=selected_features)
+        logger_write.info(f"XGBoost accuracy after feature selection: {acc_after:.4f}")
+        
+        write_features_and_importances(
+            filepath=outputfile,
+            selected_features=selected_features,
+            importances_dic=importances_dic,
+            all_columns=X_train.columns,
+            modified_col_map=name_map,
+            logger=logger_write
+        )
 
+    else:
+        logger_functions.warning("Minimum size reached with no statistically significant result")
+        selected_features = dataframe.columns.drop('Diagnostic_status').tolist()
+        importances_dic = {feat: 0.0 for feat in selected_features}
+        
+        write_features_and_importances(
+            filepath=outputfile,
+            selected_features=selected_features,
+            importances_dic=importances_dic,  # all zeroes if fallback
+            all_columns=selected_features,
+            modified_col_map=name_map,
+            logger=logger_write
+        )
+
+    if contrast_kind:
+        write_contrasts(dataframe, selected_features, outputfile, test_cache, logger_stats)
+
+    if sharded_permutations > 0 and significant:
+        plan_dir = os.path.splitext(outputfile)[0] + "_permutations"
+        spec = permutation_shards.write_plan(plan_dir, dataframe.loc[:, selected_features],
+                                             dataframe['Diagnostic_status'], sharded_permutations,
+                                             permutation_seed, permutation_shards_count)
+        logger_stats.info(f"Sharded PERMANOVA plan ({spec['permutations']} permutations, {spec['n_shards']} shards) "
+                          f"written to {plan_dir}: run sharded_permanova.py run {plan_dir} as array tasks "
+                          f"0-{spec['n_shards'] - 1}, then sharded_permanova.py merge {plan_dir}")
+
+    if store_results:
+        store_file = result_store_path or os.path.splitext(outputfile)[0] + "_results.sqlite"
+        # The selected features are already written: a store error must not lose the run
+        try:
+            with profiling.span("result_store"):
+                run_id = save_results(store_file, outputfile, run_params, dataframe, initial_size, size, significant,
+                                      attempts, test_results, selected_features if significant else [],
+                                      importances_dic, rfe_engine)
+            logger_functions.info(f"Run {run_id} added to the result store {store_file}")
+        except Exception as e:
+            logger_functions.error(f"Run not added to the result store {store_file}: {e}", exc_info=True)
+
+    if state_dir:
+        with profiling.span("save_state"):
+            save_run_state(state_dir, X_all, y_all, run_params, size, significant, selected_features,
+                           rfe_engine, prior["order"] if prior is not None else (),
+                           test_cache, previous_distances, dataframe)
+        logger_functions.info(f"Run state saved to {state_dir} for incremental runs")
+
+    rfe_engine.close()
+    # Completed: only preempted or failed runs keep their checkpoint
+    for store in stores:
+        store.remove()
     return size
 
+
+@profiling.profiled("contrasts")
+def write_contrasts(dataframe, selected_features, outputfile, test_cache=None, logger=None):
+    """
+    Runs the contrast_kind contrasts between the Diagnostic_status classes on
+    the selected features and writes their summary to <outputfile stem>_contrasts.csv.
+    The distances of the global test are reused from the test cache when
+    available; otherwise they are computed once for all contrasts.
+
+    Returns:
+    - the summary DataFrame (see contrasts.run_contrasts)
+    """
+    cached = test_cache.get(test_key(selected_features)) if test_cache is not None else None
+    distances = cached[1] if cached is not None else None
+    if distances is None:
+        X_selected = dataframe.loc[:, selected_features]
+        if stats_engine == "skbio":
+            from skbio.stats.distance import DistanceMatrix
+            from scipy.spatial.distance import pdist, squareform
+
+            distances = DistanceMatrix(squareform(pdist(X_selected, metric='euclidean')),
+                                       ids=X_selected.index.astype(str).tolist())
+        else:
+            distances = permutation_tests.euclidean_coordinates(X_selected)
+
+    summary = contrasts.run_contrasts(distances, dataframe['Diagnostic_status'].to_numpy(), kind=contrast_kind,
+                                      reference=contrast_reference, permutations=n_permutations,
+                                      seed=permutation_seed, correction=contrast_correction, alpha=pValue,
+                                      n_workers=parallel.available_cores())
+
+    contrasts_file = os.path.splitext(outputfile)[0] + "_contrasts.csv"
+    os.makedirs(os.path.dirname(os.path.abspath(contrasts_file)), exist_ok=True)
+    summary.to_csv(contrasts_file, index=False)
+    if logger:
+        logger.info(f"{len(summary)} {contrast_kind} contrasts on {len(selected_features)} features "
+                    f"({contrast_correction} correction), written to {contrasts_file}")
+        for row in summary.itertuples():
+            logger.info(f"Contrast {row.contrast} ({row.n_a} vs {row.n_b} samples): pseudo-F={row.pseudo_F:.4f}, "
+                        f"p={row.p_value:.4g}, adjusted p={row.p_adjusted:.4g}, PERMDISP p={row.permdisp_p:.4g}"
+                        + (f" [{row.note}]" if row.note else ""))
+    return summary
+
+
+def save_results(store_file, outputfile, run_params, dataframe, initial_size, size, significant, attempts,
+                 test_results, selected_features, importances_dic, rfe_engine):
+    """
+    Adds the run to the result store store_file (see result_store.write_run):
+    the cohort is the output file stem; the elimination ranks and the ranking of
+    every (seed, split) are those of the final size.
+
+    Returns:
+    - run_id of the run
+    """
+    return result_store.write_run(
+        store_file, cohort=os.path.splitext(os.path.basename(outputfile))[0], output=outputfile,
+        params=run_params, n_samples=dataframe.shape[0], n_features=dataframe.shape[1] - 1,
+        classes=dataframe['Diagnostic_status'].astype(str).value_counts().sort_index().to_dict(),
+        initial_size=initial_size, final_size=size, significant=significant, attempts=attempts,
+        test_results={s: test_results[s] for s in attempts if s in test_results},
+        seeds={s: rfe_engine.runs_used.get(s, rfe_engine.n_runs) for s in attempts},
+        selected={feat: importances_dic.get(feat) for feat in selected_features},
+        elimination_ranks=rfe_engine.elimination_ranks(size), unit_results=rfe_engine.unit_results(size))
+
+
+def save_run_state(state_dir, X, y, run_params, size, significant, selected_features, rfe_engine,
+                   previous_order, test_cache, previous_distances, dataframe):
+    """
+    Saves the state of a calc_stat_sign_feat run for a later incremental run
+    (see incremental.save_state): sample hashes, parameters, result, and the
+    elimination ranks and order at the final size (features outside the RFE, e.g. outside a
+    warm-start pool, follow in their previous order). With the skbio engine, the
+    distance matrix of the selected features is saved too, taken from the test
+    cache or extended from the previous one when possible.
+    """
+    ranks = rfe_engine.elimination_ranks(size)
+    distances = None
+    if stats_engine == "skbio" and significant:
+        cached = test_cache.get(test_key(selected_features)) if test_cache is not None else None
+        if cached is not None and cached[1] is not None:
+            distances = cached[1].data
+        elif previous_distances is not None and set(previous_distances[0]) == set(selected_features):
+            distances = incremental.extend_distances(previous_distances[1], dataframe[list(previous_distances[0])])
+        else:
+            from scipy.spatial.distance import pdist, squareform
+            distances = squareform(pdist(dataframe[selected_features], metric='euclidean'))
+
+    state = {
+        "params": run_params,
+        "columns": [str(c) for c in X.columns],
+        "digests": incremental.row_digests(X, y),
+        "size": size,
+        "significant": significant,
+        "selected": list(selected_features),
+        "ranks": ranks,
+        "order": incremental.elimination_order(ranks, previous_order),
+    }
+    incremental.save_state(state_dir, state, distances)
+
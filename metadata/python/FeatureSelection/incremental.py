@@ -0,0 +1,157 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+import os
+import pickle
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# Version of the state layout; states of another version are ignored
+STATE_VERSION = 1
+
+STATE_FILE = "state.pkl"
+DISTANCES_FILE = "distances.npy"
+
+
+def row_digests(X, y, chunk_rows=4096):
+    """
+    One 16-byte hash per sample, of its feature values (as float64) and its
+    label, so that a new input can be checked to start with the samples of a
+    previous run. Rows are hashed in chunks, so memory-mapped inputs are not loaded at once.
+    """
+    values = X.to_numpy()
+    labels = np.asarray(y).astype(str)
+    digests = np.empty(values.shape[0], dtype="S16")
+    for start in range(0, values.shape[0], chunk_rows):
+        chunk = np.ascontiguousarray(values[start:start + chunk_rows], dtype=np.float64)
+        for i, row in enumerate(chunk):
+            digest = hashlib.blake2b(row.tobytes(), digest_size=16)
+            digest.update(labels[start + i].encode())
+            digests[start + i] = digest.digest()
+    return digests
+
+
+def save_state(directory, state, distances=None):
+    """
+    Writes the state of a run (dict, see calc_stat_sign_feat) to
+    <directory>/state.pkl, and the square distance matrix of its selected
+    features, if any, to <directory>/distances.npy. Files are written
+    atomically (temporary file + rename).
+    """
+    os.makedirs(directory, exist_ok=True)
+    distances_file = os.path.join(directory, DISTANCES_FILE)
+    if distances is not None:
+        tmp = f"{distances_file}.tmp{os.getpid()}.npy"
+        np.save(tmp, np.asarray(distances, dtype=np.float64))
+        os.replace(tmp, distances_file)
+    elif os.path.exists(distances_file):
+        os.remove(distances_file)
+
+    target = os.path.join(directory, STATE_FILE)
+    tmp = f"{target}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        pickle.dump(dict(state, version=STATE_VERSION), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, target)
+
+
+def load_state(directory):
+    """
+    Reads the state saved by save_state, or None if there is none (or of
+    another version). The distance matrix, if saved, is memory-mapped as state["distances"].
+    """
+    target = os.path.join(directory, STATE_FILE)
+    if not os.path.exists(target):
+        return None
+    with open(target, "rb") as f:
+        state = pickle.load(f)
+    if state.get("version") != STATE_VERSION:
+        return None
+    distances_file = os.path.join(directory, DISTANCES_FILE)
+    state["distances"] = np.load(distances_file, mmap_mode='r') if os.path.exists(distances_file) else None
+    return state
+
+
+def appended_samples(state, X, y, params):
+    """
+    Checks that X, y are the samples of a previous run followed by new samples.
+
+    Parameters:
+    - state: state of the previous run (load_state)
+    - X, y: features and labels of the new input
+    - params: parameters that affect the results, compared to those of the previous run
+
+    Returns:
+    - (number of new samples, None), or (None, reason) if the input cannot be
+      analysed incrementally
+    """
+    if state.get("params") != params:
+        return None, "parameters changed"
+    if list(state["columns"]) != [str(c) for c in X.columns]:
+        return None, "regions changed"
+    n_old = len(state["digests"])
+    if X.shape[0] < n_old:
+        return None, f"fewer samples than the previous run ({X.shape[0]} < {n_old})"
+    if not np.array_equal(row_digests(X.iloc[:n_old], np.asarray(y)[:n_old]), state["digests"]):
+        return None, "previous samples changed (values, labels or order)"
+    return X.shape[0] - n_old, None
+
+
+def extend_distances(previous, points):
+    """
+    Euclidean distance matrix of points, reusing the distances of the first
+    previous.shape[0] points: only the rows and columns of the new points are
+    computed, O(new x all) instead of O(all^2).
+    """
+    from scipy.spatial.distance import cdist
+
+    points = np.asarray(points, dtype=np.float64)
+    n_old, n = previous.shape[0], points.shape[0]
+    distances = np.empty((n, n))
+    distances[:n_old, :n_old] = previous
+    block = cdist(points[n_old:], points, metric='euclidean')
+    distances[n_old:, :] = block
+    distances[:n_old, n_old:] = block[:, :n_old].T
+    # Same zero diagonal as squareform(pdist(...))
+    distances[np.arange(n_old, n), np.arange(n_old, n)] = 0.0
+    return distances
+
+
+def warm_start_pool(order, size, factor, columns):
+    """
+    Candidate features of a warm-started selection: the first
+    max(factor x size, size + 1) features of the previous elimination order (best first),
+    in the order of columns, as XGBoost breaks importance ties by column position.
+    """
+    n = max(int(np.ceil(factor * size)), size + 1)
+    pool = set(order[:n])
+    return [col for col in columns if col in pool]
+
+
+def elimination_order(ranks, previous_order=()):
+    """
+    Features ordered by rank (RFEPathEngine.elimination_ranks), best first
+    (ties in the order of ranks). Features of previous_order without a new rank
+    (outside a warm-start pool) follow, in their previous order.
+    """
+    order = pd.Series(ranks, dtype=np.float64).sort_values(kind="stable").index.tolist()
+    ranked = set(order)
+    return order + [feat for feat in previous_order if feat not in ranked]
+
+
+def ranking_stability(previous_ranks, ranks):
+    """
+    Spearman correlation between the previous and the new elimination ranks of
+    the features ranked by both runs (1: same order, 0: unrelated), ties averaged.
+    """
+    features = [feat for feat in ranks if feat in previous_ranks]
+    if len(features) < 2:
+        return 0.0
+    previous = pd.Series([previous_ranks[feat] for feat in features]).rank().to_numpy()
+    new = pd.Series([ranks[feat] for feat in features]).rank().to_numpy()
+    if np.ptp(previous) == 0 or np.ptp(new) == 0:
+        return 0.0
+    return float(np.corrcoef(previous, new)[0, 1])
@@ -0,0 +1,121 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+import os
+import multiprocessing
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+def available_cores(default=1):
+    """
+    Returns the number of cores allocated to the job.
+
+    Reads GALAXY_SLOTS first (set by Galaxy from the job destination), then
+    SLURM_CPUS_PER_TASK, and falls back to `default` when neither is set or valid.
+    """
+    for var in ("GALAXY_SLOTS", "SLURM_CPUS_PER_TASK"):
+        value = os.environ.get(var)
+        if value:
+            try:
+                cores = int(value)
+            except ValueError:
+                continue
+            if cores > 0:
+                return cores
+    return default
+
+
+def split_cores(n_units, n_cores):
+    """
+    Splits the available cores between worker processes and threads per worker.
+
+    Parameters:
+    - n_units: number of independent work units
+    - n_cores: number of cores available
+
+    Returns:
+    - (n_workers, threads_per_worker), with n_workers * threads_per_worker <= n_cores
+    """
+    n_cores = max(1, int(n_cores))
+    n_workers = max(1, min(n_units, n_cores))
+    return n_workers, max(1, n_cores // n_workers)
+
+
+class ProcessPool:
+    """
+    'spawn' process pool kept alive across map_units calls, so that repeated
+    small batches (e.g. one RFE seed at a time) do not start and import new
+    workers every time. Workers are started on first use; the pool grows if
+    a call needs more workers. Close it with close() (or use it as a context manager).
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._workers = 0
+
+    def executor(self, n_workers):
+        if self._executor is None or self._workers < n_workers:
+            self.close()
+            self._executor = ProcessPoolExecutor(max_workers=n_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            self._workers = n_workers
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor, self._workers = None, 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def map_units(func, units, n_workers, on_result=None, pool=None):
+    """
+    Applies func to every unit and returns the results in the order of `units`.
+
+    Runs serially in the calling process when n_workers <= 1 or there is a
+    single unit. Otherwise a process pool with the 'spawn' start method is used:
+    XGBoost and BLAS use OpenMP thread pools, which are not safe to fork.
+    func must be a module-level function so that it can be pickled.
+
+    on_result(index, result), if given, is called in the calling process as
+    soon as each result is available (in order), e.g. to checkpoint it.
+    pool, if given, is a ProcessPool reused instead of a new pool for this call.
+    """
+    units = list(units)
+    results = []
+    if n_workers <= 1 or len(units) <= 1:
+        for index, unit in enumerate(units):
+            results.append(func(unit))
+            if on_result:
+                on_result(index, results[-1])
+        return results
+
+    n_workers = min(n_workers, len(units))
+    with ProcessPool() if pool is None else nullcontext(pool) as active:
+        for index, result in enumerate(active.executor(n_workers).map(func, units)):
+            results.append(result)
+            if on_result:
+                on_result(index, result)
+    return results
+
+
+def map_threads(func, units, n_workers):
+    """
+    Applies func to every unit in a thread pool and returns the results in the
+    order of `units`. Threads share the memory of the calling process, so units
+    can be views of one large array; use it for NumPy-bound work (matrix
+    products release the GIL), and map_units for XGBoost fits.
+    """
+    units = list(units)
+    if n_workers <= 1 or len(units) <= 1:
+        return [func(unit) for unit in units]
+    with ThreadPoolExecutor(max_workers=min(n_workers, len(units))) as pool:
+        return list(pool.map(func, units))
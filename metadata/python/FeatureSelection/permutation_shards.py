@@ -0,0 +1,239 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+import os
+import json
+import glob
+import hashlib
+
+import numpy as np
+
+import permutation_tests
+
+# Permutations per chunk. Chunk k draws its permutations from its own generator,
+# seeded with (seed, k), so the permutations do not depend on the number of shards
+CHUNK_SIZE = 250
+
+SPEC_FILE = "spec.json"
+COORDINATES_FILE = "coordinates.npy"
+LABELS_FILE = "labels.txt"
+RESULT_FILE = "result.json"
+PARTIAL_PATTERN = "shard_*.json"
+
+
+def chunk_generator(seed, chunk):
+    """Generator of the permutations of a chunk, derived from the master seed."""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chunk,)))
+
+
+def n_chunks(permutations, chunk_size=CHUNK_SIZE):
+    return -(-permutations // chunk_size)
+
+
+def shard_chunks(n_total, shard, n_shards):
+    """Chunks of a shard: every n_shards-th chunk from chunk `shard`."""
+    return list(range(shard, n_total, n_shards))
+
+
+def count_exceedances(stat_fn, codes, permutations, seed, chunks, chunk_size=CHUNK_SIZE, block_size=256):
+    """
+    Permuted statistics of some chunks of a permutation test that are >= the observed one.
+
+    Parameters:
+    - stat_fn, codes: statistic and integer grouping (see permutation_tests.monte_carlo)
+    - permutations: total number of permutations of the test (all chunks)
+    - seed: master seed of the test
+    - chunks: chunks to run
+    - block_size: permutations per stat_fn call; the counts do not depend on it
+
+    Returns:
+    - (observed statistic, {chunk: number of exceedances})
+    """
+    stat = float(stat_fn(codes[None, :])[0])
+    counts = {}
+    for chunk in chunks:
+        start = chunk * chunk_size
+        n = min(chunk_size, permutations - start)
+        rng = chunk_generator(seed, chunk)
+        exceed = 0
+        for done in range(0, n, block_size):
+            n_block = min(block_size, n - done)
+            perm_codes = rng.permuted(np.broadcast_to(codes, (n_block, len(codes))), axis=1)
+            exceed += int(np.sum(stat_fn(perm_codes) >= stat))
+        counts[chunk] = exceed
+    return stat, counts
+
+
+def features_digest(features):
+    return hashlib.blake2b("\n".join(map(str, features)).encode(), digest_size=8).hexdigest()
+
+
+def _write_json(path, record):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(record, f, indent=1)
+    os.replace(tmp, path)
+
+
+def write_plan(directory, X_selected, labels, permutations, seed, n_shards, chunk_size=CHUNK_SIZE):
+    """
+    Prepares a sharded PERMANOVA of the selected features: writes the centered
+    coordinates of the samples (permutation_tests.euclidean_coordinates),
+    their labels and spec.json (test settings) to directory. Previous partial
+    and result files of the directory are removed.
+
+    Parameters:
+    - X_selected: DataFrame of the selected features
+    - labels: class label of every sample
+    - permutations, seed: permutation test settings
+    - n_shards: number of shards (SLURM array tasks)
+
+    Returns:
+    - the spec dict
+    """
+    if permutations < 1 or n_shards < 1:
+        raise ValueError(f"Sharded test needs permutations >= 1 and shards >= 1 ({permutations}, {n_shards})")
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, PARTIAL_PATTERN)) + [os.path.join(directory, RESULT_FILE)]:
+        if os.path.exists(path):
+            os.remove(path)
+
+    coordinates = permutation_tests.euclidean_coordinates(X_selected)
+    tmp = os.path.join(directory, f"{COORDINATES_FILE}.tmp{os.getpid()}.npy")
+    np.save(tmp, np.ascontiguousarray(coordinates, dtype=np.float64))
+    os.replace(tmp, os.path.join(directory, COORDINATES_FILE))
+    labels = [str(label) for label in labels]
+    with open(os.path.join(directory, LABELS_FILE), "w") as f:
+        f.write("\n".join(labels) + "\n")
+
+    features = [str(c) for c in X_selected.columns]
+    spec = {
+        "test": "PERMANOVA",
+        "permutations": int(permutations),
+        "seed": int(seed),
+        "chunk_size": int(chunk_size),
+        "n_chunks": n_chunks(permutations, chunk_size),
+        "n_shards": int(min(n_shards, n_chunks(permutations, chunk_size))),
+        "n_samples": len(labels),
+        "features": features,
+        "features_digest": features_digest(features),
+    }
+    _write_json(os.path.join(directory, SPEC_FILE), spec)
+    return spec
+
+
+def read_plan(directory):
+    """spec dict, memory-mapped coordinates and labels of a plan written by write_plan."""
+    with open(os.path.join(directory, SPEC_FILE)) as f:
+        spec = json.load(f)
+    coordinates = np.load(os.path.join(directory, COORDINATES_FILE), mmap_mode='r')
+    with open(os.path.join(directory, LABELS_FILE)) as f:
+        labels = np.array([line.rstrip("\n") for line in f if line.strip()])
+    if coordinates.shape[0] != spec["n_samples"] or len(labels) != spec["n_samples"]:
+        raise ValueError(f"{directory}: coordinates, labels and spec disagree on the number of samples")
+    return spec, coordinates, labels
+
+
+def run_shard(directory, shard, block_size=None):
+    """
+    Runs the chunks of one shard of the plan in directory and writes their
+    exceedance counts to <directory>/shard_<shard>.json (atomically).
+
+    Returns:
+    - the partial record (observed statistic, counts by chunk, test settings)
+    """
+    spec, coordinates, labels = read_plan(directory)
+    if not 0 <= shard < spec["n_shards"]:
+        raise ValueError(f"Shard {shard} out of range for {spec['n_shards']} shards")
+    stat_fn, codes, block_size = permutation_tests.permanova_statistic(np.asarray(coordinates), labels, block_size)
+    chunks = shard_chunks(spec["n_chunks"], shard, spec["n_shards"])
+    stat, counts = count_exceedances(stat_fn, codes, spec["permutations"], spec["seed"], chunks,
+                                     spec["chunk_size"], block_size)
+    record = {
+        "shard": shard,
+        "n_shards": spec["n_shards"],
+        "permutations": spec["permutations"],
+        "seed": spec["seed"],
+        "chunk_size": spec["chunk_size"],
+        "features_digest": spec["features_digest"],
+        # repr round-trips the float exactly, so that all shards can be checked to agree
+        "observed": repr(stat),
+        "counts": {str(chunk): count for chunk, count in counts.items()},
+    }
+    _write_json(os.path.join(directory, f"shard_{shard}.json"), record)
+    return record
+
+
+def _run_shard_entry(task):
+    """Pool entry point: runs one shard in a worker process."""
+    directory, shard = task
+    return run_shard(directory, shard)
+
+
+def merge(directory):
+    """
+    Combines the partial counts of all shards of the plan in directory into the
+    p-value of the full test, (exceedances + 1) / (permutations + 1), and writes
+    it to <directory>/result.json. It is the p-value of a single-process run of
+    the plan (any number of shards) with the same master seed.
+
+    Raises ValueError if partial files are missing, belong to another plan or
+    disagree on the observed statistic, or if a chunk is missing or counted twice.
+
+    Returns:
+    - result dict: test, statistic, p-value, permutations, exceedances, seed, shards
+    """
+    with open(os.path.join(directory, SPEC_FILE)) as f:
+        spec = json.load(f)
+    settings = ("permutations", "seed", "chunk_size", "features_digest", "n_shards")
+
+    partials = {}
+    for path in sorted(glob.glob(os.path.join(directory, PARTIAL_PATTERN))):
+        with open(path) as f:
+            record = json.load(f)
+        mismatched = [key for key in settings if record.get(key) != spec[key]]
+        if mismatched:
+            raise ValueError(f"{path} does not belong to the plan in {directory} ({', '.join(mismatched)} differ)")
+        partials[record["shard"]] = record
+    missing = sorted(set(range(spec["n_shards"])) - set(partials))
+    if missing:
+        raise ValueError(f"{directory}: missing shards {', '.join(map(str, missing))} of {spec['n_shards']}")
+
+    observed = {record["observed"] for record in partials.values()}
+    if len(observed) != 1:
+        raise ValueError(f"{directory}: shards disagree on the observed statistic ({', '.join(sorted(observed))})")
+    counts = {}
+    for record in partials.values():
+        for chunk, count in record["counts"].items():
+            if int(chunk) in counts:
+                raise ValueError(f"{directory}: chunk {chunk} counted by more than one shard")
+            counts[int(chunk)] = count
+    if sorted(counts) != list(range(spec["n_chunks"])):
+        raise ValueError(f"{directory}: shards do not cover chunks 0..{spec['n_chunks'] - 1}")
+
+    exceed = sum(counts.values())
+    result = {
+        "test": spec["test"],
+        "test statistic": float(observed.pop()),
+        "p-value": (exceed + 1) / (spec["permutations"] + 1),
+        "permutations": spec["permutations"],
+        "exceedances": exceed,
+        "seed": spec["seed"],
+        "shards": spec["n_shards"],
+        "sample size": spec["n_samples"],
+        "features": len(spec["features"]),
+    }
+    _write_json(os.path.join(directory, RESULT_FILE), result)
+    return result
+
+
+def run_local(directory, n_workers=1):
+    """Runs all shards of the plan in directory in a process pool, then merges them."""
+    import parallel
+
+    with open(os.path.join(directory, SPEC_FILE)) as f:
+        n_shards = json.load(f)["n_shards"]
+    parallel.map_units(_run_shard_entry, [(directory, shard) for shard in range(n_shards)], n_workers)
+    return merge(directory)
@@ -0,0 +1,330 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+
+import numpy as np
+import pandas as pd
+
+# Geometric median (modified Weiszfeld) settings, as in skbio/hdmedians
+GEOMEDIAN_EPS = 1e-7
+GEOMEDIAN_MAXITERS = 500
+
+# Upper bound on the number of floats of the temporary arrays of one permutation block
+BLOCK_BUDGET = 2**24
+
+
+def euclidean_coordinates(X, dtype=None):
+    """
+    Returns centered coordinates Z whose Gram matrix Z Z^T is the Gower-centered
+    matrix of the Euclidean distances between the rows of X.
+
+    Every Euclidean PERMANOVA/PERMDISP quantity is a function of Z, so the
+    n x n distance matrix is never built. When X has more columns than rows,
+    Z is reduced to at most n columns with an SVD (same Gram matrix).
+
+    Parameters:
+    - X: DataFrame or 2-D array (samples x features)
+    - dtype: np.float32 or np.float64; defaults to the dtype of X if it is float32, float64 otherwise
+    """
+    X = np.asarray(X)
+    if dtype is None:
+        dtype = np.float32 if X.dtype == np.float32 else np.float64
+    Z = np.asarray(X, dtype=dtype)
+    Z = Z - Z.mean(axis=0)
+    if Z.shape[1] > Z.shape[0]:
+        U, s, _ = np.linalg.svd(Z, full_matrices=False)
+        Z = (U * s).astype(dtype, copy=False)
+    return Z
+
+
+def principal_coordinates(Z, dimensions):
+    """
+    Returns the first `dimensions` principal coordinates of centered coordinates Z,
+    i.e. the PCoA ordination of the Euclidean distances truncated as skbio's pcoa does.
+    """
+    if Z.shape[1] <= dimensions:
+        return Z
+    U, s, _ = np.linalg.svd(Z, full_matrices=False)
+    return (U[:, :dimensions] * s[:dimensions]).astype(Z.dtype, copy=False)
+
+
+def encode_groups(groups):
+    """Returns (group names, integer codes) for a vector of group labels."""
+    names, codes = np.unique(np.asarray(groups), return_inverse=True)
+    return names, codes.astype(np.intp)
+
+
+def _block_size(n_samples, n_groups, n_dims, block_size=None):
+    if block_size:
+        return int(block_size)
+    return int(max(1, min(1024, BLOCK_BUDGET // max(1, n_samples * n_groups * max(1, n_dims)))))
+
+
+def _group_sums(Z, perm_codes, n_groups):
+    """Per-permutation group sums of Z: array (B, n_groups, n_dims)."""
+    onehot = (perm_codes[:, None, :] == np.arange(n_groups)[None, :, None]).astype(Z.dtype)
+    return onehot @ Z
+
+
+def _permanova_f(Z, total_ss, counts, perm_codes):
+    """Pseudo-F for a block of groupings (one per row of perm_codes)."""
+    n_groups = len(counts)
+    n_samples = Z.shape[0]
+    sums = _group_sums(Z, perm_codes, n_groups).astype(np.float64)
+    between = (np.einsum('bgk,bgk->bg', sums, sums) / counts).sum(axis=1)
+    # Z is centered, so the grand mean term vanishes
+    s_A = between
+    s_W = total_ss - between
+    return (s_A / (n_groups - 1)) / (s_W / (n_samples - n_groups))
+
+
+def _anova_f(dists, perm_codes, counts):
+    """One-way ANOVA F of per-sample values dists (B, n) grouped by perm_codes (B, n)."""
+    n_block, n_samples = dists.shape
+    n_groups = len(counts)
+    offsets = (np.arange(n_block) * n_groups)[:, None]
+    flat = (perm_codes + offsets).ravel()
+    sums = np.bincount(flat, weights=dists.ravel(), minlength=n_block * n_groups).reshape(n_block, n_groups)
+    means = sums / counts
+    grand = dists.mean(axis=1, keepdims=True)
+    between = (counts * (means - grand) ** 2).sum(axis=1)
+    within = ((dists - np.take_along_axis(means, perm_codes, axis=1)) ** 2).sum(axis=1)
+    return (between / (n_groups - 1)) / (within / (n_samples - n_groups))
+
+
+def _geometric_medians(Z, members):
+    """
+    Batched modified Weiszfeld iteration (Vardi & Zhang), matching skbio's
+    geomedian_axis_one: starts at the group mean and stops each group
+    independently when the update is shorter than GEOMEDIAN_EPS.
+
+    Parameters:
+    - Z: coordinates (n, k)
+    - members: boolean membership (m, n), one row per group and permutation
+
+    Returns:
+    - medians (m, k)
+    """
+    members_f = members.astype(np.float64)
+    sizes = members_f.sum(axis=1)
+    Z64 = Z.astype(np.float64, copy=False)
+    y = (members_f @ Z64) / sizes[:, None]
+    active = sizes > 1
+    eps = GEOMEDIAN_EPS
+
+    for _ in range(GEOMEDIAN_MAXITERS):
+        idx = np.flatnonzero(active)
+        if not len(idx):
+            break
+        yi = y[idx]
+        D = np.sqrt(((Z64[None, :, :] - yi[:, None, :]) ** 2).sum(axis=2))
+        mem = members[idx]
+        nonzero = mem & (np.abs(D) > eps)
+        Dinv = np.where(nonzero, 1.0 / np.where(nonzero, D, 1.0), 0.0)
+        nzeros = mem.sum(axis=1) - nonzero.sum(axis=1)
+
+        # Every sample sits on the estimate: it is the median
+        done = nzeros == mem.sum(axis=1)
+        Dinvs = Dinv.sum(axis=1)
+        safe = np.where(done, 1.0, Dinvs)
+        T = (Dinv / safe[:, None]) @ Z64
+
+        R = (T - yi) * Dinvs[:, None]
+        r = np.sqrt((R ** 2).sum(axis=1))
+        rinv = np.where(r > eps, nzeros / np.where(r > eps, r, 1.0), 0.0)
+        y1 = np.where((nzeros == 0)[:, None], T,
+                      np.maximum(0.0, 1 - rinv)[:, None] * T + np.minimum(1.0, rinv)[:, None] * yi)
+
+        converged = done | (np.sqrt(((yi - y1) ** 2).sum(axis=1)) < eps)
+        update = ~converged
+        y[idx[update]] = y1[update]
+        active[idx[converged]] = False
+
+    return y
+
+
+def _permdisp_f(Z, counts, perm_codes, test):
+    """PERMDISP F statistic for a block of groupings."""
+    n_block, n_samples = perm_codes.shape
+    n_groups = len(counts)
+    if test == 'centroid':
+        centers = _group_sums(Z, perm_codes, n_groups).astype(np.float64) / counts[None, :, None]
+    else:
+        members = (perm_codes[:, None, :] == np.arange(n_groups)[None, :, None]).reshape(n_block * n_groups, n_samples)
+        centers = _geometric_medians(Z, members).reshape(n_block, n_groups, -1)
+
+    own_center = np.take_along_axis(centers, perm_codes[:, :, None], axis=1)
+    dists = np.sqrt(((Z[None, :, :].astype(np.float64) - own_center) ** 2).sum(axis=2))
+    return _anova_f(dists, perm_codes, counts)
+
+
+def monte_carlo(stat_fn, codes, permutations, seed=None, block_size=256, alpha=None):
+    """
+    Observed statistic and permutation p-value (upper tail) of stat_fn, which
+    takes a (B, n) array of integer groupings and returns B statistics.
+
+    Permutations are drawn in blocks of block_size rows from a generator seeded
+    with `seed`; the rows are the same permutations as drawing them one by one.
+
+    With alpha set, the test is sequential (Besag & Clifford, 1991): it stops
+    as soon as the decision "p < alpha" of the full run is settled, i.e. when
+    enough permuted statistics exceed the observed one to make the full-run
+    p-value >= alpha, or when too few permutations remain to reach alpha.
+    The decision is the same as running all permutations.
+
+    Returns:
+    - stat: observed statistic
+    - p_value: (exceedances + 1) / (permutations used + 1)
+    - perm_stats: permuted statistics that were computed
+    - info: dict with 'permutations used', 'stopped early' and the bounds
+      'p-value lower bound'/'p-value upper bound' of the full-run p-value
+    """
+    rng = np.random.default_rng(seed)
+    stat = float(stat_fn(codes[None, :])[0])
+    if permutations <= 0:
+        info = {'permutations used': 0, 'stopped early': False,
+                'p-value lower bound': np.nan, 'p-value upper bound': np.nan}
+        return stat, np.nan, np.empty(0), info
+
+    n_samples = len(codes)
+    perm_stats = np.empty(permutations)
+    exceed = 0
+    used = 0
+    stopped = False
+    # Sequential runs start with small blocks, so that clear cases stop after a few dozen permutations
+    n_block = min(block_size, 32) if alpha is not None else block_size
+    while used < permutations and not stopped:
+        n_block = min(n_block, permutations - used)
+        perm_codes = rng.permuted(np.broadcast_to(codes, (n_block, n_samples)), axis=1)
+        block_stats = stat_fn(perm_codes)
+        perm_stats[used:used + n_block] = block_stats
+
+        if alpha is None:
+            exceed += int(np.sum(block_stats >= stat))
+            used += n_block
+        else:
+            counts = exceed + np.cumsum(block_stats >= stat)
+            done = used + np.arange(1, n_block + 1)
+            # Full-run p-value is at least (counts + 1) / (N + 1) and at most (counts + N - done + 1) / (N + 1)
+            not_significant = (counts + 1) / (permutations + 1) >= alpha
+            significant = (counts + permutations - done + 1) / (permutations + 1) < alpha
+            settled = np.flatnonzero(not_significant | significant)
+            stop = settled[0] if len(settled) else n_block - 1
+            exceed = int(counts[stop])
+            used = int(done[stop])
+            stopped = len(settled) > 0 and used < permutations
+            n_block = min(2 * n_block, block_size)
+
+    info = {
+        'permutations used': used,
+        'stopped early': stopped,
+        'p-value lower bound': (exceed + 1) / (permutations + 1),
+        'p-value upper bound': (exceed + permutations - used + 1) / (permutations + 1),
+    }
+    return stat, (exceed + 1) / (used + 1), perm_stats[:used], info
+
+
+def _check_grouping(Z, codes, names):
+    if Z.shape[0] != len(codes):
+        raise ValueError(f"Grouping has {len(codes)} labels for {Z.shape[0]} samples.")
+    if len(names) < 2:
+        raise ValueError("At least two groups are required.")
+    if len(names) == len(codes):
+        raise ValueError("All values in the grouping vector are unique.")
+
+
+def _build_results(method, stat_name, n_samples, n_groups, stat, p_value, permutations, info):
+    # Same layout as the pandas.Series returned by skbio, plus the sequential test fields
+    return pd.Series(
+        data=[method, stat_name, n_samples, n_groups, stat, p_value, permutations,
+              info['permutations used'], info['p-value lower bound'], info['p-value upper bound']],
+        index=['method name', 'test statistic name', 'sample size', 'number of groups',
+               'test statistic', 'p-value', 'number of permutations',
+               'permutations used', 'p-value lower bound', 'p-value upper bound'],
+        name=f'{method} results')
+
+
+def permanova_statistic(Z, grouping, block_size=None):
+    """
+    Pseudo-F of the groupings of centered coordinates Z.
+
+    Returns:
+    - (stat_fn, codes, block_size): stat_fn takes a (B, n) array of integer
+      groupings and returns B pseudo-F values (see monte_carlo); codes are
+      the integer labels of grouping; block_size is sized from BLOCK_BUDGET if not given
+    """
+    names, codes = encode_groups(grouping)
+    _check_grouping(Z, codes, names)
+
+    counts = np.bincount(codes, minlength=len(names)).astype(np.float64)
+    total_ss = float(np.einsum('ik,ik->', Z, Z, dtype=np.float64))
+    block_size = _block_size(Z.shape[0], len(names), Z.shape[1], block_size)
+    return (lambda perm_codes: _permanova_f(Z, total_ss, counts, perm_codes)), codes, block_size
+
+
+def permanova(X, grouping, permutations=999, seed=None, block_size=None, coordinates=None, alpha=None):
+    """
+    PERMANOVA with Euclidean distance between the rows of X.
+
+    Equivalent to skbio.stats.distance.permanova on the Euclidean distance
+    matrix of X (same pseudo-F; p-value up to Monte Carlo error), computed
+    from the centered coordinates so that no n x n matrix is built and
+    permutations are evaluated in vectorized blocks.
+
+    Parameters:
+    - X: DataFrame or 2-D array (samples x features), float32 or float64
+    - grouping: group labels aligned with the rows of X
+    - permutations: number of permutations
+    - seed: seed of the permutation generator
+    - block_size: permutations per block (default: sized from BLOCK_BUDGET)
+    - coordinates: optional precomputed euclidean_coordinates(X)
+    - alpha: significance level for a sequential test that stops once the
+      decision is settled (see monte_carlo); None runs all permutations
+
+    Returns:
+    - pandas.Series with the skbio result fields ('test statistic', 'p-value', ...)
+    """
+    Z = euclidean_coordinates(X) if coordinates is None else coordinates
+    stat_fn, codes, block_size = permanova_statistic(Z, grouping, block_size)
+
+    stat, p_value, _, info = monte_carlo(stat_fn, codes, permutations, seed, block_size, alpha)
+    return _build_results('PERMANOVA', 'pseudo-F', Z.shape[0], int(codes.max()) + 1, stat, p_value, permutations, info)
+
+
+def permdisp(X, grouping, test='median', permutations=999, seed=None, block_size=None, coordinates=None,
+             dimensions=10, alpha=None):
+    """
+    PERMDISP (homogeneity of multivariate dispersions) with Euclidean distance.
+
+    Equivalent to skbio.stats.distance.permdisp on the Euclidean distance
+    matrix of X: the PCoA of a Euclidean distance matrix is a rotation of the
+    centered data, and both group centroids and geometric medians follow the
+    rotation, so distances to group centers are computed from the leading
+    principal coordinates of the centered data.
+
+    Parameters:
+    - X: DataFrame or 2-D array (samples x features), float32 or float64
+    - grouping: group labels aligned with the rows of X
+    - test: 'median' (spatial median, skbio default) or 'centroid'
+    - permutations, seed, block_size, coordinates, alpha: as in permanova
+    - dimensions: number of principal coordinates kept (skbio default: 10)
+
+    Returns:
+    - pandas.Series with the skbio result fields ('test statistic', 'p-value', ...)
+    """
+    if test not in ('centroid', 'median'):
+        raise ValueError(f"Test must be centroid or median, not {test}.")
+    Z = euclidean_coordinates(X) if coordinates is None else coordinates
+    Z = principal_coordinates(Z, dimensions)
+    names, codes = encode_groups(grouping)
+    _check_grouping(Z, codes, names)
+
+    counts = np.bincount(codes, minlength=len(names)).astype(np.float64)
+    block_size = _block_size(Z.shape[0], len(names), Z.shape[1], block_size)
+
+    stat, p_value, _, info = monte_carlo(
+        lambda perm_codes: _permdisp_f(Z, counts, perm_codes, test),
+        codes, permutations, seed, block_size, alpha)
+    return _build_results('PERMDISP', 'F-value', Z.shape[0], len(names), stat, p_value, permutations, info)
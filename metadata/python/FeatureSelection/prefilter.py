@@ -0,0 +1,213 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+
+import numpy as np
+import pandas as pd
+
+# Columns processed at once by the per-column statistics (bounds temporary memory)
+COLUMN_BLOCK = 2048
+
+
+def _column_blocks(n_columns, block=COLUMN_BLOCK):
+    for start in range(0, n_columns, block):
+        yield slice(start, min(start + block, n_columns))
+
+
+def column_variance(X):
+    """Variance of every column of X (float64 accumulation), computed in column blocks."""
+    values = np.asarray(X)
+    out = np.empty(values.shape[1])
+    for cols in _column_blocks(values.shape[1]):
+        out[cols] = np.var(values[:, cols], axis=0, dtype=np.float64)
+    return out
+
+
+def anova_f(X, codes):
+    """
+    One-way ANOVA F statistic of every column of X across the classes in codes.
+    Columns with no within-class variance get F = 0 if they are also constant
+    across classes, +inf otherwise.
+    """
+    values = np.asarray(X)
+    codes = np.asarray(codes)
+    n_samples = len(codes)
+    n_groups = int(codes.max()) + 1
+    onehot = (np.arange(n_groups)[:, None] == codes[None, :]).astype(np.float64)
+    counts = onehot.sum(axis=1)[:, None]
+
+    out = np.empty(values.shape[1])
+    for cols in _column_blocks(values.shape[1]):
+        block = values[:, cols].astype(np.float64)
+        sums = onehot @ block
+        grand = block.mean(axis=0)
+        between = (counts * (sums / counts - grand) ** 2).sum(axis=0)
+        within = (block ** 2).sum(axis=0) - (sums ** 2 / counts).sum(axis=0)
+        within = np.maximum(within, 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            f = (between / (n_groups - 1)) / (within / (n_samples - n_groups))
+        f[(within == 0) & (between <= 0)] = 0.0
+        out[cols] = f
+    return out
+
+
+def _average_ranks(block):
+    """Average ranks (1-based, ties averaged) of every column, and the tie term sum(t^3 - t)."""
+    n_rows, n_cols = block.shape
+    order = np.argsort(block, axis=0, kind='mergesort')
+    sorted_values = np.take_along_axis(block, order, axis=0)
+
+    # Runs of equal values in every sorted column
+    new_run = np.ones((n_rows, n_cols), dtype=bool)
+    new_run[1:] = sorted_values[1:] != sorted_values[:-1]
+    run_id = np.cumsum(new_run, axis=0) - 1
+    n_runs = run_id[-1] + 1
+    offsets = np.concatenate(([0], np.cumsum(n_runs)[:-1]))
+    flat = (run_id + offsets[None, :]).ravel(order='F')
+
+    positions = np.broadcast_to(np.arange(1, n_rows + 1, dtype=np.float64)[:, None], (n_rows, n_cols))
+    run_sizes = np.bincount(flat)
+    run_means = np.bincount(flat, weights=positions.ravel(order='F')) / run_sizes
+
+    ranks = np.empty((n_rows, n_cols))
+    np.put_along_axis(ranks, order, run_means[flat].reshape((n_rows, n_cols), order='F'), axis=0)
+
+    run_column = np.repeat(np.arange(n_cols), n_runs)
+    ties = np.bincount(run_column, weights=run_sizes.astype(np.float64) ** 3 - run_sizes, minlength=n_cols)
+    return ranks, ties
+
+
+def kruskal_h(X, codes):
+    """
+    Kruskal-Wallis H statistic (with tie correction, as scipy.stats.kruskal)
+    of every column of X across the classes in codes.
+    """
+    values = np.asarray(X)
+    codes = np.asarray(codes)
+    n_samples = len(codes)
+    n_groups = int(codes.max()) + 1
+    onehot = (np.arange(n_groups)[:, None] == codes[None, :]).astype(np.float64)
+    counts = onehot.sum(axis=1)[:, None]
+
+    out = np.empty(values.shape[1])
+    for cols in _column_blocks(values.shape[1]):
+        ranks, ties = _average_ranks(values[:, cols])
+        rank_sums = onehot @ ranks
+        h = 12.0 / (n_samples * (n_samples + 1)) * (rank_sums ** 2 / counts).sum(axis=0) - 3 * (n_samples + 1)
+        correction = 1.0 - ties / (n_samples ** 3 - n_samples)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            h = np.where(correction > 0, h / correction, 0.0)
+        out[cols] = h
+    return out
+
+
+def _standardize(block):
+    block = block.astype(np.float64)
+    block = block - block.mean(axis=0)
+    norms = np.sqrt((block ** 2).sum(axis=0))
+    norms[norms == 0] = 1.0
+    return block / norms
+
+
+def correlation_dedup(X, order, threshold, max_kept=None, block=256):
+    """
+    Greedy correlation-cluster deduplication: walks the columns in `order`
+    (best first) and keeps a column only if its absolute Pearson correlation
+    with every column kept so far is at most `threshold`.
+
+    Returns:
+    - kept: list of kept column indices, in order
+    - dropped: dict {dropped column index: index of the kept column it correlates with}
+    """
+    values = np.asarray(X)
+    kept = []
+    kept_z = np.empty((values.shape[0], 0))
+    dropped = {}
+
+    for start in range(0, len(order), block):
+        if max_kept is not None and len(kept) >= max_kept:
+            break
+        candidates = np.asarray(order[start:start + block])
+        z = _standardize(values[:, candidates])
+        # Correlations with the columns already kept, then within the block
+        with_kept = np.abs(kept_z.T @ z) if kept else np.zeros((0, len(candidates)))
+        within = np.abs(z.T @ z)
+
+        block_kept = []
+        for j, column in enumerate(candidates):
+            if max_kept is not None and len(kept) + len(block_kept) >= max_kept:
+                break
+            if with_kept.shape[0] and with_kept[:, j].max() > threshold:
+                dropped[int(column)] = kept[int(np.argmax(with_kept[:, j]))]
+                continue
+            if block_kept:
+                corr = within[block_kept, j]
+                if corr.max() > threshold:
+                    dropped[int(column)] = int(candidates[block_kept[int(np.argmax(corr))]])
+                    continue
+            block_kept.append(j)
+
+        kept.extend(int(c) for c in candidates[block_kept])
+        kept_z = np.hstack([kept_z, z[:, block_kept]])
+
+    return kept, dropped
+
+
+def prefilter(X, y, top_k=None, variance_threshold=0.0, statistic="kruskal", correlation_threshold=None):
+    """
+    Univariate pre-filter applied before the BoostRFE feature selection.
+
+    Stages, in order:
+    1. variance: drops columns with variance <= variance_threshold
+    2. statistic: scores the remaining columns by class separation
+       ("kruskal": Kruskal-Wallis H, "anova": one-way ANOVA F)
+    3. correlation: if correlation_threshold is set, drops columns whose
+       |Pearson r| with a better-scoring kept column exceeds it
+    4. top_k: keeps the top_k best-scoring columns (None keeps all)
+
+    Parameters:
+    - X: DataFrame of features
+    - y: encoded class labels aligned with X
+
+    Returns:
+    - kept_columns: list of column names, in the original column order
+    - report: DataFrame with one row per column: feature, kept, reason, score
+    """
+    if statistic not in ("kruskal", "anova"):
+        raise ValueError(f"Unknown pre-filter statistic: {statistic}")
+
+    columns = X.columns
+    codes = np.unique(np.asarray(y), return_inverse=True)[1]
+    n_columns = len(columns)
+    reason = np.array(["kept"] * n_columns, dtype=object)
+    score = np.full(n_columns, np.nan)
+
+    variance = column_variance(X)
+    candidates = np.flatnonzero(variance > variance_threshold)
+    reason[variance <= variance_threshold] = f"variance <= {variance_threshold:g}"
+
+    values = np.asarray(X)
+    stat_fn = kruskal_h if statistic == "kruskal" else anova_f
+    score[candidates] = stat_fn(values[:, candidates], codes)
+
+    # Best first; ties keep the original column order
+    order = candidates[np.argsort(-score[candidates], kind='mergesort')]
+
+    if correlation_threshold is not None:
+        kept, dropped = correlation_dedup(values, order, correlation_threshold, max_kept=top_k)
+        for column, kept_column in dropped.items():
+            reason[column] = f"|r| > {correlation_threshold:g} with {columns[kept_column]}"
+    else:
+        kept = list(order if top_k is None else order[:top_k])
+
+    kept_set = set(kept)
+    for column in order:
+        if column not in kept_set and reason[column] == "kept":
+            reason[column] = f"not in top {top_k} by {statistic}"
+
+    kept_mask = np.zeros(n_columns, dtype=bool)
+    kept_mask[kept] = True
+    report = pd.DataFrame({"feature": columns, "kept": kept_mask, "reason": reason, "score": score})
+    return list(columns[kept_mask]), report
@@ -0,0 +1,127 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+import numpy as np
+import pandas as pd
+
+# Seed of the resampling, as used by the former rebalancing step of if_stat_signif_features
+RANDOM_STATE = 42
+
+# Rows of a class processed at once by the SMOTE neighbour search (bounds the distance block)
+NEIGHBOR_BLOCK = 1024
+
+
+def choose_method(y):
+    """
+    Rebalancing rule of the feature selection, from the class counts of a training split:
+    - "ros" (random oversampling) if the minority class has < 40% of the majority's samples
+    - "smote" if it has < 50%
+    - None if the classes are balanced enough
+    """
+    counts = np.unique(np.asarray(y), return_counts=True)[1]
+    ratio = counts.min() / counts.max()
+    if ratio < 0.4:
+        return "ros"
+    if ratio < 0.5:
+        return "smote"
+    return None
+
+
+def _targets(y):
+    """Class labels and number of samples to add so every class reaches the majority count."""
+    classes, counts = np.unique(y, return_counts=True)
+    return classes, counts.max() - counts
+
+
+def random_oversample(X, y, random_state=RANDOM_STATE):
+    """
+    Random oversampling: duplicates random samples of every class until all
+    classes have as many samples as the majority class. The original rows come
+    first, followed by the added ones.
+    """
+    values, y = np.asarray(X), np.asarray(y)
+    rng = np.random.default_rng(random_state)
+    picked = [rng.choice(np.flatnonzero(y == label), size=n_new, replace=True)
+              for label, n_new in zip(*_targets(y)) if n_new > 0]
+    rows = np.concatenate(picked) if picked else np.empty(0, dtype=int)
+    return np.vstack([values, values[rows]]), np.concatenate([y, y[rows]])
+
+
+def nearest_neighbors(points, k, block=NEIGHBOR_BLOCK):
+    """
+    Indices of the k nearest neighbours (Euclidean, excluding the point itself)
+    of every row of points, computed block by block with one matrix product.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    sq_norms = (points ** 2).sum(axis=1)
+    neighbors = np.empty((points.shape[0], k), dtype=np.intp)
+    for start in range(0, points.shape[0], block):
+        stop = min(start + block, points.shape[0])
+        d2 = sq_norms[start:stop, None] + sq_norms[None, :] - 2.0 * points[start:stop] @ points.T
+        d2[np.arange(stop - start), np.arange(start, stop)] = np.inf
+        neighbors[start:stop] = np.argpartition(d2, k - 1, axis=1)[:, :k]
+    return neighbors
+
+
+def smote(X, y, k_neighbors=None, random_state=RANDOM_STATE):
+    """
+    SMOTE oversampling of every class up to the majority count. Each synthetic
+    sample lies at a uniform random position between a random sample of the
+    class and one of its k nearest neighbours in the class. The original rows come
+    first, followed by the synthetic ones.
+
+    k_neighbors defaults to (minority count - 1), as in the former rebalancing
+    step; it is capped at (class size - 1) for every class.
+    """
+    values, y = np.asarray(X), np.asarray(y)
+    rng = np.random.default_rng(random_state)
+    classes, n_new = _targets(y)
+    if k_neighbors is None:
+        k_neighbors = max(1, np.unique(y, return_counts=True)[1].min() - 1)
+
+    new_values, new_labels = [values], [y]
+    for label, count in zip(classes, n_new):
+        if count <= 0:
+            continue
+        members = values[y == label]
+        k = min(k_neighbors, len(members) - 1)
+        if k < 1:
+            # A single sample cannot be interpolated: duplicate it
+            new_values.append(np.repeat(members, count, axis=0))
+        else:
+            neighbors = nearest_neighbors(members, k)
+            base = rng.integers(0, len(members), size=count)
+            partner = neighbors[base, rng.integers(0, k, size=count)]
+            gap = rng.uniform(size=(count, 1))
+            new_values.append((members[base] + gap * (members[partner] - members[base])).astype(values.dtype))
+        new_labels.append(np.full(count, label, dtype=y.dtype))
+    return np.vstack(new_values), np.concatenate(new_labels)
+
+
+def rebalance(X_train, y_train, method="auto", random_state=RANDOM_STATE):
+    """
+    Rebalances a training split.
+
+    Parameters:
+    - X_train: DataFrame of the training split
+    - y_train: encoded labels
+    - method: "auto" (choose_method), "ros", "smote" or None
+    - random_state: seed of the resampling
+
+    Returns:
+    - (X_train, y_train, method used): a DataFrame with the same columns (and a
+      fresh index) and the labels, unchanged if no rebalancing is needed
+    """
+    if method == "auto":
+        method = choose_method(y_train)
+    if method is None:
+        return X_train, y_train, None
+    if method == "ros":
+        values, labels = random_oversample(X_train, y_train, random_state)
+    elif method == "smote":
+        values, labels = smote(X_train, y_train, random_state=random_state)
+    else:
+        raise ValueError(f"Unknown rebalancing method: {method}")
+    return pd.DataFrame(values, columns=X_train.columns), labels, method
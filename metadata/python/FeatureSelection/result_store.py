@@ -0,0 +1,234 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+import json
+import time
+import uuid
+import sqlite3
+import datetime
+
+import numpy as np
+
+# Version of the tables; stored in the SQLite user_version
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    cohort TEXT NOT NULL,
+    output TEXT,
+    created TEXT NOT NULL,
+    params TEXT NOT NULL,
+    n_samples INTEGER,
+    n_features INTEGER,
+    classes TEXT,
+    initial_size INTEGER,
+    final_size INTEGER,
+    significant INTEGER,
+    p_value REAL,
+    n_selected INTEGER
+);
+CREATE TABLE IF NOT EXISTS attempts (
+    run_id TEXT NOT NULL REFERENCES runs(run_id),
+    size INTEGER NOT NULL,
+    p_value REAL,
+    n_selected INTEGER,
+    n_seeds INTEGER,
+    method TEXT,
+    statistic REAL,
+    permdisp_statistic REAL,
+    permdisp_p_value REAL,
+    permutations_used INTEGER,
+    PRIMARY KEY (run_id, size)
+);
+CREATE TABLE IF NOT EXISTS attempt_features (
+    run_id TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    feature TEXT NOT NULL,
+    importance REAL,
+    PRIMARY KEY (run_id, size, feature)
+);
+CREATE TABLE IF NOT EXISTS features (
+    run_id TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    selected INTEGER NOT NULL,
+    importance REAL,
+    elimination_rank REAL,
+    PRIMARY KEY (run_id, feature)
+);
+CREATE TABLE IF NOT EXISTS rankings (
+    run_id TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    split INTEGER NOT NULL,
+    feature TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    importance REAL
+);
+CREATE INDEX IF NOT EXISTS runs_cohort ON runs (cohort);
+CREATE INDEX IF NOT EXISTS attempt_features_feature ON attempt_features (feature, run_id);
+CREATE INDEX IF NOT EXISTS features_feature ON features (feature, run_id);
+CREATE INDEX IF NOT EXISTS rankings_run ON rankings (run_id, seed, split);
+CREATE INDEX IF NOT EXISTS rankings_feature ON rankings (feature, run_id);
+"""
+
+# Tables copied by merge, in dependency order
+TABLES = ("runs", "attempts", "attempt_features", "features", "rankings")
+
+# A shared store is written by concurrent jobs (array tasks, batch cohorts): a connection
+# waits LOCK_TIMEOUT seconds for the lock of another writer, and a transaction still
+# locked out is retried LOCK_RETRIES times
+LOCK_TIMEOUT = 300
+LOCK_RETRIES = 3
+
+
+def connect(path):
+    """Opens (and creates if needed) a result store."""
+    connection = sqlite3.connect(path, timeout=LOCK_TIMEOUT)
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    if version not in (0, SCHEMA_VERSION):
+        connection.close()
+        raise ValueError(f"{path}: result store version {version}, expected {SCHEMA_VERSION}")
+    connection.executescript(SCHEMA)
+    connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return connection
+
+
+def _locked(error):
+    return isinstance(error, sqlite3.OperationalError) and "locked" in str(error)
+
+
+def _with_retries(path, write):
+    """
+    Runs write(connection) in one transaction on the store at path, retrying
+    (after 1, 2, 4... s) while the store is locked by another writer.
+    """
+    for attempt in range(LOCK_RETRIES + 1):
+        try:
+            connection = connect(path)
+            try:
+                with connection:
+                    return write(connection)
+            finally:
+                connection.close()
+        except sqlite3.OperationalError as e:
+            if not _locked(e) or attempt == LOCK_RETRIES:
+                raise
+            time.sleep(2 ** attempt)
+
+
+def _float(value):
+    return None if value is None or (isinstance(value, float) and np.isnan(value)) else float(value)
+
+
+def write_run(path, cohort, output, params, n_samples, n_features, classes, initial_size, final_size,
+              significant, attempts, test_results=None, seeds=None, selected=None, elimination_ranks=None,
+              unit_results=()):
+    """
+    Adds a feature selection run to the store at path, in one transaction
+    (retried while another job holds the lock, see LOCK_TIMEOUT).
+
+    Parameters:
+    - cohort: cohort name (e.g. the output file stem)
+    - output: output file of the selected features
+    - params: parameters of the run (JSON-serializable dict)
+    - n_samples, n_features, classes: input shape and {class: count}
+    - initial_size, final_size, significant: size search and its outcome
+    - attempts: {size: (p_value, selected_features, importances_dic)} of every evaluated size
+    - test_results: {size: test_result of significance_test} (missing sizes, e.g.
+      resumed from a checkpoint, only have their p-value)
+    - seeds: {size: number of RFE seeds aggregated}
+    - selected: {feature: importance} of the final features
+    - elimination_ranks: {feature: mean elimination rank} at the final size
+    - unit_results: (seed, split size, columns, ranking, support, importances) of
+      every RFE run at the final size (see RFEPathEngine.unit_results)
+
+    Returns:
+    - run_id of the new run
+    """
+    run_id = uuid.uuid4().hex
+    test_results = test_results or {}
+    seeds = seeds or {}
+    selected = selected or {}
+    elimination_ranks = elimination_ranks or {}
+    # Read again if the transaction is retried
+    unit_results = list(unit_results)
+    final = attempts.get(final_size)
+
+    def write(connection):
+        connection.execute(
+            "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (run_id, cohort, output, datetime.datetime.now().isoformat(timespec="seconds"),
+             json.dumps(params, default=str), n_samples, n_features, json.dumps(classes, default=str),
+             initial_size, final_size, int(bool(significant)),
+             _float(final[0]) if final else None, len(selected)))
+
+        for size, (p_value, features, importances) in sorted(attempts.items()):
+            test = test_results.get(size) or {}
+            connection.execute(
+                "INSERT INTO attempts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, size, _float(p_value), len(features), seeds.get(size), test.get("method"),
+                 _float(test.get("statistic")), _float(test.get("permdisp_statistic")),
+                 _float(test.get("permdisp_p_value")), test.get("permutations_used")))
+            connection.executemany(
+                "INSERT INTO attempt_features VALUES (?, ?, ?, ?)",
+                ((run_id, size, str(feat), _float(importances.get(feat))) for feat in features))
+
+        features = list(elimination_ranks) + [feat for feat in selected if feat not in elimination_ranks]
+        connection.executemany(
+            "INSERT INTO features VALUES (?, ?, ?, ?, ?)",
+            ((run_id, str(feat), int(feat in selected), _float(selected.get(feat)),
+              _float(elimination_ranks.get(feat))) for feat in features))
+
+        for seed, split, columns, ranking, support, importances in unit_results:
+            unit_importances = np.full(len(columns), np.nan)
+            unit_importances[np.flatnonzero(support)] = importances
+            connection.executemany(
+                "INSERT INTO rankings VALUES (?, ?, ?, ?, ?, ?)",
+                ((run_id, int(seed), int(split), str(feat), int(rank), _float(imp))
+                 for feat, rank, imp in zip(columns, ranking, unit_importances)))
+
+    _with_retries(path, write)
+    return run_id
+
+
+def merge(target, sources):
+    """
+    Copies the runs of the source stores (e.g. one per cohort of a batch) into
+    the target store, for cross-cohort queries. Runs already in the target are skipped.
+    Returns the number of runs added.
+    """
+    connection = connect(target)
+    added = 0
+    try:
+        for source in sources:
+            connect(source).close()
+            connection.execute("ATTACH DATABASE ? AS source", (source,))
+            try:
+                with connection:
+                    new = [row[0] for row in connection.execute(
+                        "SELECT run_id FROM source.runs WHERE run_id NOT IN (SELECT run_id FROM main.runs)")]
+                    connection.execute("CREATE TEMP TABLE new_runs (run_id TEXT PRIMARY KEY)")
+                    connection.executemany("INSERT INTO new_runs VALUES (?)", ((run_id,) for run_id in new))
+                    for table in TABLES:
+                        connection.execute(f"INSERT INTO main.{table} SELECT * FROM source.{table} "
+                                           f"WHERE run_id IN (SELECT run_id FROM new_runs)")
+                    connection.execute("DROP TABLE new_runs")
+                added += len(new)
+            finally:
+                connection.execute("DETACH DATABASE source")
+    finally:
+        connection.close()
+    return added
+
+
+def query(path, sql, params=()):
+    """Runs a query on the store at path and returns a DataFrame."""
+    import pandas as pd
+
+    connection = connect(path)
+    try:
+        return pd.read_sql_query(sql, connection, params=params)
+    finally:
+        connection.close()
@@ -0,0 +1,590 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+
+from collections import defaultdict
+
+import numpy as np
+
+import parallel
+import rebalance
+import shared_data
+
+# sklearn and xgboost are imported where they are used, so that importing this
+# module (and features_selection) does not load them
+
+# Repetitions for stability, as used by if_stat_signif_features
+N_RUNS = 5
+SPLIT_SIZES = (4, 5, 6, 7)
+
+
+class QuantizedSplit:
+    """
+    Train/validation split quantized once and shared by every seed and
+    elimination step of the same split size.
+
+    XGBoost's hist method only sees the bin of each value. The cut points of
+    the training split are computed once with a QuantileDMatrix, and both
+    subsets are stored as bin codes (uint8/uint16). An elimination step then
+    trains on a column subset of the codes: every code column has at most
+    max_bin distinct values, so XGBoost's sketch keeps one bin per code and
+    builds the same trees as on the raw values, without converting and
+    re-sketching a float DataFrame at every step. Validation values are binned
+    with the training cuts, as the eval_set of XGBClassifier is.
+
+    Parameters:
+    - X_train, y_train, X_valid, y_valid: split, without missing values
+    - max_bin: number of bins per feature (XGBoost default: 256)
+    """
+
+    def __init__(self, X_train, y_train, X_valid, y_valid, max_bin=256):
+        self.columns = X_train.columns
+        self.y_train = np.asarray(y_train)
+        self.y_valid = np.asarray(y_valid)
+
+        import xgboost as xgb
+
+        indptr, cuts = xgb.QuantileDMatrix(X_train, max_bin=max_bin).get_quantile_cut()
+        n_bins = int(np.diff(indptr).max()) if len(indptr) > 1 else 1
+        dtype = np.uint8 if n_bins <= 256 else np.uint16
+        # XGBoost compares float32 values to float32 cuts
+        self.X_train = self._encode(np.asarray(X_train, dtype=np.float32), indptr, cuts, dtype)
+        self.X_valid = self._encode(np.asarray(X_valid, dtype=np.float32), indptr, cuts, dtype)
+
+    @staticmethod
+    def _encode(values, indptr, cuts, dtype):
+        # Same bin search as XGBoost: first cut greater than the value, last bin for values above all cuts
+        codes = np.empty(values.shape, dtype=dtype)
+        for j in range(values.shape[1]):
+            feature_cuts = cuts[indptr[j]:indptr[j + 1]]
+            codes[:, j] = np.minimum(np.searchsorted(feature_cuts, values[:, j], side='right'), len(feature_cuts) - 1)
+        return codes
+
+    @staticmethod
+    def supported(X, chunk_rows=4096):
+        """
+        Bin codes cannot represent missing values: those inputs are trained on the raw values.
+        X is checked in row chunks, so a memory-mapped input is not copied at once.
+        """
+        for start in range(0, X.shape[0], chunk_rows):
+            if isinstance(X, np.ndarray):
+                missing = np.isnan(X[start:start + chunk_rows]).any()
+            else:
+                missing = X.iloc[start:start + chunk_rows].isna().to_numpy().any()
+            if missing:
+                return False
+        return True
+
+
+class EliminationPath:
+    """
+    Recursive feature elimination trace for a single (seed, split).
+
+    Reproduces BoostRFE with an eval_set: at every elimination step the
+    estimator is fitted on the surviving features, its validation score and
+    feature importances are stored, and the least important features are removed.
+    Because the elimination order does not depend on min_features_to_select,
+    the BoostRFE result for any minimum size can be read off the trace. The
+    trace is extended lazily, so each step is fitted only once.
+
+    With the default step=1 one feature is removed per step (BoostRFE(step=1)).
+    A fractional step removes that fraction of the surviving features per step
+    (at least one), as long as more than switch_size features survive; from
+    switch_size down, features are removed one at a time. Features removed in
+    the same step share their rank, as with RFE(step>1). The number of
+    surviving features at every step is available as `schedule`.
+
+    Parameters:
+    - estimator: unfitted XGBoost classifier (cloned at every step)
+    - X_train, y_train: training split (DataFrame, or array with `columns`)
+    - X_valid, y_valid: validation split used for early stopping and scoring
+    - greater_is_better: whether a higher validation score is better (BoostRFE default: False)
+    - step: 1, or a fraction in (0, 1) of the surviving features removed per step
+    - switch_size: number of surviving features below which step 1 is used
+      (None: the size requested in extend_to, as RFE does)
+    - columns: feature names when X_train and X_valid are arrays (e.g. QuantizedSplit codes)
+    """
+
+    def __init__(self, estimator, X_train, y_train, X_valid, y_valid, greater_is_better=False,
+                 step=1, switch_size=None, columns=None):
+        if not (step == 1 or 0 < step < 1):
+            raise ValueError(f"Elimination step must be 1 or a fraction in (0, 1), got {step}")
+        self.estimator = estimator
+        self.X_train = X_train
+        self.y_train = y_train
+        self.X_valid = X_valid
+        self.y_valid = y_valid
+        self.greater_is_better = greater_is_better
+        self.step = step
+        self.switch_size = switch_size
+
+        self.columns = X_train.columns if columns is None else columns
+        self.n_features = X_train.shape[1]
+
+        # Elimination state
+        self._support = np.ones(self.n_features, dtype=bool)
+        # Step at which each feature was eliminated (-1 while still selected)
+        self.elimination_step = np.full(self.n_features, -1, dtype=int)
+        # Per-step records: support mask, validation score, importances of surviving features
+        self.supports = []
+        self.scores = []
+        self.importances = []
+
+    @property
+    def n_fits(self):
+        return len(self.scores)
+
+    @property
+    def smallest_size(self):
+        """Number of features used by the last fitted step (n_features if nothing is fitted yet)."""
+        if not self.supports:
+            return self.n_features
+        return int(self.supports[-1].sum())
+
+    @property
+    def schedule(self):
+        """Number of surviving features at every fitted step."""
+        return [int(support.sum()) for support in self.supports]
+
+    def _n_removed(self, n_surviving, size):
+        """Number of features removed after a step with n_surviving features, towards `size`."""
+        floor = size if self.switch_size is None else max(size, self.switch_size)
+        if self.step == 1 or n_surviving <= floor:
+            return 1
+        return min(max(1, int(self.step * n_surviving)), n_surviving - floor)
+
+    def _columns(self, X):
+        if isinstance(X, np.ndarray):
+            return X[:, self._support]
+        return X.loc[:, self.columns[self._support]]
+
+    def _fit_step(self):
+        from sklearn.base import clone
+
+        estimator = clone(self.estimator)
+        estimator.fit(
+            self._columns(self.X_train), self.y_train,
+            eval_set=[(self._columns(self.X_valid), self.y_valid)],
+            verbose=0
+        )
+        self.supports.append(self._support.copy())
+        self.scores.append(self._step_score(estimator))
+        self.importances.append(np.asarray(estimator.feature_importances_))
+        return estimator
+
+    @staticmethod
+    def _step_score(estimator):
+        # Same score BoostRFE uses: best_score with early stopping, last eval value otherwise
+        if hasattr(estimator, 'best_score'):
+            return estimator.best_score
+        valid_id = list(estimator.evals_result_.keys())[-1]
+        eval_metric = list(estimator.evals_result_[valid_id])[-1]
+        return estimator.evals_result_[valid_id][eval_metric][-1]
+
+    def extend_to(self, size):
+        """Fit elimination steps until a step with `size` surviving features has been recorded."""
+        size = max(1, min(size, self.n_features))
+        if not self.supports:
+            self._fit_step()
+        while self.smallest_size > size:
+            step = len(self.supports) - 1
+            features = np.flatnonzero(self._support)
+            n_removed = self._n_removed(len(features), size)
+            worst = features[np.argsort(self.importances[-1])[:n_removed]]
+            self._support[worst] = False
+            self.elimination_step[worst] = step
+            self._fit_step()
+
+    def state(self):
+        """
+        Returns the recorded trace as a picklable dict (without the data).
+        Only complete steps are included, so the state is consistent even if
+        taken while a step is being fitted. The support masks are not stored:
+        restore() rebuilds them from the elimination steps.
+        """
+        n_steps = min(len(self.supports), len(self.scores), len(self.importances))
+        elimination_step = np.where(self.elimination_step < n_steps - 1, self.elimination_step, -1)
+        return {
+            "n_features": self.n_features,
+            "scores": self.scores[:n_steps],
+            "importances": self.importances[:n_steps],
+            "elimination_step": elimination_step,
+        }
+
+    def restore(self, state):
+        """Restores a trace saved with state() for the same data and estimator."""
+        if state["n_features"] != self.n_features:
+            raise ValueError(f"Checkpointed trace has {state['n_features']} features, expected {self.n_features}")
+        self.scores = list(state["scores"])
+        self.importances = list(state["importances"])
+        self.elimination_step = np.array(state["elimination_step"], dtype=int)
+        # A feature eliminated after step k is still in the support of step k
+        surviving = np.where(self.elimination_step < 0, len(self.scores), self.elimination_step)
+        self.supports = [surviving >= k for k in range(len(self.scores))]
+        self._support = self.supports[-1].copy() if self.supports else np.ones(self.n_features, dtype=bool)
+
+    def select(self, min_features_to_select):
+        """
+        Returns the BoostRFE result for the given minimum number of features.
+
+        Returns:
+        - ranking: array of ranks (1 = selected), aligned with the training columns
+        - support: boolean mask of the selected features
+        - importances: importances of the selected features (same order as the mask)
+        """
+        size = max(1, min(min_features_to_select, self.n_features))
+        self.extend_to(size)
+        # Last step with at least `size` features (with step 1, the step with exactly `size`)
+        last = int(np.flatnonzero(np.asarray(self.schedule) >= size)[-1])
+
+        # BoostRFE keeps the first step with the best score; later steps replace it only if strictly better
+        scores = np.asarray(self.scores[:last + 1], dtype=float)
+        best = int(np.argmax(scores) if self.greater_is_better else np.argmin(scores))
+
+        eliminated = (self.elimination_step >= 0) & (self.elimination_step < best)
+        ranking = np.ones(self.n_features, dtype=int)
+        ranking[eliminated] = best - self.elimination_step[eliminated] + 1
+        return ranking, self.supports[best].copy(), self.importances[best]
+
+    def elimination_ranks(self):
+        """
+        Position of every feature in the elimination order of the fitted trace
+        (1: most important feature of the last step, n_features: first eliminated),
+        independent of the best-scoring step used by select. Features removed in
+        the same step are ordered by column.
+        """
+        last = len(self.supports) - 1
+        survivors = self.supports[last]
+        score = self.elimination_step.astype(float)
+        # Survivors of the last step come first, by their importance in that step
+        importance_order = np.argsort(np.argsort(self.importances[last], kind="stable"), kind="stable")
+        score[survivors] = last + 1 + importance_order / survivors.sum()
+        ranks = np.empty(self.n_features, dtype=int)
+        ranks[np.argsort(-score, kind="stable")] = np.arange(1, self.n_features + 1)
+        return ranks
+
+
+def _mean_ranks(all_rankings):
+    return {feat: float(np.mean(ranks)) for feat, ranks in all_rankings.items()}
+
+
+def _selected(mean_ranks):
+    # Features kept by every run, as selected by if_stat_signif_features
+    return {feat for feat, rank in mean_ranks.items() if rank == 1}
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+def _rank_correlation(previous, current):
+    """Spearman correlation of two mean-rank dicts over their common features (1.0 if identical)."""
+    features = [feat for feat in current if feat in previous]
+    a = np.array([previous[feat] for feat in features])
+    b = np.array([current[feat] for feat in features])
+    if np.array_equal(a, b):
+        return 1.0
+    if len(features) < 2 or np.ptp(a) == 0 or np.ptp(b) == 0:
+        return 0.0
+    from scipy.stats import spearmanr
+
+    return float(spearmanr(a, b)[0])
+
+
+def _extend_path(task):
+    """Worker entry point: extends a path to the requested size and returns it."""
+    path, size = task
+    path.extend_to(size)
+    return path
+
+
+class RFEPathEngine:
+    """
+    Holds one EliminationPath per (seed, split size) of the stability loop in
+    if_stat_signif_features, so that repeated attempts with a decreasing
+    minimum feature size reuse the same fits instead of refitting BoostRFE.
+
+    Parameters:
+    - X: feature dataframe (without the label column)
+    - y: encoded class labels aligned with X
+    - num_classes: number of classes in y
+    - params_fn: callable(n_samples, n_features, num_classes, seed) returning XGBClassifier parameters
+    - n_runs: number of seeds
+    - split_sizes: validation sizes in tenths of the dataset
+    - n_cores: cores available for fitting. With more than one core, the paths
+      that need new fits are extended in a process pool and the cores are split
+      between workers and XGBoost n_jobs (see parallel.split_cores). Results are
+      collected in (seed, split) order, so they do not depend on the number of workers.
+      The split matrices are then memory-mapped from a shared_data.SharedDataset, so
+      that workers map them instead of receiving a copy with every path.
+    - checkpoint: optional checkpoint.CheckpointStore; traces are restored from it
+      and saved after every extension, and flushed on SIGTERM
+    - step, switch_size: elimination schedule of every path (see EliminationPath)
+    - quantize: train on the bin codes of a QuantizedSplit built once per split size
+      (inputs with missing values are trained on the raw values)
+    - resampling: rebalancing of the training part of every split ("auto", "ros",
+      "smote" or None, see rebalance.rebalance); the validation part is not resampled
+    - resampling_seed: random_state of the resampling
+    - max_runs: if set, the number of seeds is adaptive: select starts with min_runs
+      seeds and adds one seed (with every split size) at a time until the aggregate
+      has converged or max_runs seeds are used (n_runs is then ignored)
+    - min_runs: initial number of seeds of the adaptive mode
+    - jaccard, correlation, patience: convergence of the adaptive mode: the Jaccard
+      index of the selected sets (mean rank 1) and the Spearman correlation of the
+      mean ranks of successive aggregates reach jaccard and correlation for
+      `patience` seeds in a row
+    - logger: optional logger
+    """
+
+    def __init__(self, X, y, num_classes, params_fn, n_runs=N_RUNS, split_sizes=SPLIT_SIZES, n_cores=1,
+                 checkpoint=None, step=1, switch_size=None, quantize=True, resampling="auto",
+                 resampling_seed=rebalance.RANDOM_STATE, max_runs=None, min_runs=2, jaccard=1.0,
+                 correlation=0.95, patience=2, logger=None):
+        self.X = X
+        self.y = y
+        self.num_classes = num_classes
+        self.params_fn = params_fn
+        self.n_runs = n_runs
+        self.split_sizes = tuple(split_sizes)
+        self.n_cores = max(1, int(n_cores))
+        self.step = step
+        self.switch_size = switch_size
+        self.resampling = resampling
+        self.resampling_seed = resampling_seed
+        self.max_runs = max_runs
+        self.min_runs = max(1, min(min_runs, max_runs)) if max_runs else min_runs
+        self.jaccard = jaccard
+        self.correlation = correlation
+        self.patience = patience
+        # Number of seeds aggregated by select, per minimum size
+        self.runs_used = {}
+        # Workers kept across extensions (see close)
+        self._pool = parallel.ProcessPool() if self.n_cores > 1 else None
+        # Split matrices shared with the workers (see _split)
+        self._shared = shared_data.SharedDataset() if self._pool is not None else None
+        self.logger = logger
+        self.paths = {}
+        self.quantize = quantize and QuantizedSplit.supported(X)
+        # Splits do not depend on the seed (random_state=0): built, rebalanced and
+        # quantized once per (split size, resampling method, resampling seed)
+        self._splits = {}
+        self.checkpoint = checkpoint
+        if checkpoint is not None:
+            checkpoint.register(self._checkpoint_states)
+
+    def units(self, n_runs=None, first=0):
+        """
+        (seed, split size) pairs of seeds first..n_runs-1 (default: all n_runs seeds),
+        in the order the rankings are aggregated.
+        """
+        n_runs = self.n_runs if n_runs is None else n_runs
+        return [(seed, size) for seed in range(first, n_runs) for size in self.split_sizes]
+
+    def _default_runs(self, number):
+        """Seeds aggregated for a minimum size: those used by select, or the initial number."""
+        if number in self.runs_used:
+            return self.runs_used[number]
+        return self.n_runs if self.max_runs is None else self.min_runs
+
+    def _split(self, size):
+        """(X_train, y_train, X_valid, y_valid) of a split size, rebalanced and quantized if enabled."""
+        key = (size, self.resampling, self.resampling_seed)
+        if key not in self._splits:
+            from sklearn.model_selection import train_test_split
+
+            X_train, X_valid, y_train, y_valid = train_test_split(
+                self.X, self.y, test_size=size/10, random_state=0, stratify=self.y)
+            n_train = len(y_train)
+            X_train, y_train, method = rebalance.rebalance(X_train, y_train, self.resampling, self.resampling_seed)
+            if method and self.logger:
+                self.logger.info(f"Split {size}: training part rebalanced with {method} "
+                                 f"({n_train} -> {len(y_train)} samples)")
+            if self.quantize:
+                split = QuantizedSplit(X_train, y_train, X_valid, y_valid)
+                if self._shared is not None:
+                    name = f"split{len(self._splits)}"
+                    for part in ("X_train", "y_train", "X_valid", "y_valid"):
+                        setattr(split, part, self._shared.share(f"{name}_{part}", getattr(split, part)))
+            elif self._shared is not None:
+                # Arrays (with columns passed to the paths) instead of DataFrames, so they can be shared
+                name = f"split{len(self._splits)}"
+                split = tuple(self._shared.share(f"{name}_{part}", np.asarray(values))
+                              for part, values in zip(("X_train", "y_train", "X_valid", "y_valid"),
+                                                      (X_train, y_train, X_valid, y_valid)))
+            else:
+                split = (X_train, y_train, X_valid, y_valid)
+            self._splits[key] = split
+            if self._shared is not None and self.logger:
+                self.logger.info(f"Split {size}: {self._shared.nbytes / 2**20:.1f} MB shared with the workers "
+                                 f"in {self._shared.directory}")
+        return self._splits[key]
+
+    def _path(self, seed, size):
+        key = (seed, size)
+        if key not in self.paths:
+            split = self._split(size)
+            if self.quantize:
+                X_train, y_train, X_valid, y_valid = split.X_train, split.y_train, split.X_valid, split.y_valid
+            else:
+                X_train, y_train, X_valid, y_valid = split
+            params = self.params_fn(
+                n_samples=X_train.shape[0],
+                n_features=X_train.shape[1],
+                num_classes=self.num_classes,
+                seed=seed
+            )
+            import xgboost as xgb
+
+            path = EliminationPath(xgb.XGBClassifier(**params), X_train, y_train, X_valid, y_valid,
+                                   step=self.step, switch_size=self.switch_size, columns=self.X.columns)
+            state = self.checkpoint.load_path(seed, size) if self.checkpoint is not None else None
+            if state:
+                path.restore(state)
+                if self.logger:
+                    self.logger.info(f"Resumed RFE path (seed {seed}, split {size}) with {path.n_fits} fits from checkpoint")
+            self.paths[key] = path
+        return self.paths[key]
+
+    def _checkpoint_states(self):
+        return {self.checkpoint.path_name(seed, size): path.state()
+                for (seed, size), path in self.paths.items()}
+
+    def _save_path(self, key):
+        if self.checkpoint is not None:
+            self.checkpoint.save_path(*key, self.paths[key].state())
+
+    @property
+    def n_fits(self):
+        return sum(path.n_fits for path in self.paths.values())
+
+    def _extend_all(self, number, units=None):
+        """Extends the (seed, split) paths of units (default: all) to `number` features, in parallel when cores allow."""
+        pending = [key for key in (self.units() if units is None else units)
+                   if not self._path(*key).n_fits or self._path(*key).smallest_size > number]
+        if not pending:
+            return
+
+        n_workers, threads = parallel.split_cores(len(pending), self.n_cores)
+        if n_workers > 1 and self.logger:
+            self.logger.info(f"Extending {len(pending)} RFE paths with {n_workers} workers x {threads} XGBoost threads")
+        for key in pending:
+            self.paths[key].estimator.set_params(n_jobs=threads)
+
+        def completed(index, path):
+            # Each (seed, split) is stored as soon as it is done
+            self.paths[pending[index]] = path
+            self._save_path(pending[index])
+
+        parallel.map_units(_extend_path, [(self.paths[key], number) for key in pending], n_workers,
+                           on_result=completed, pool=self._pool)
+
+    def close(self):
+        """
+        Stops the worker processes of the engine and removes its shared files
+        (a later extension starts new workers and sends them copies of the splits).
+        """
+        if self._pool is not None:
+            self._pool.close()
+        if self._shared is not None:
+            self._shared.close()
+
+    def elimination_ranks(self, number):
+        """
+        Mean position of every feature in the elimination orders of the
+        (seed, split) paths extended to `number` features (see
+        EliminationPath.elimination_ranks): a full ordering, unlike the rankings of select.
+        """
+        units = self.units(self._default_runs(number))
+        self._extend_all(number, units)
+        ranks = defaultdict(list)
+        for seed, size in units:
+            path = self._path(seed, size)
+            for feat, rank in zip(path.columns, path.elimination_ranks()):
+                ranks[feat].append(rank)
+        return {feat: float(np.mean(values)) for feat, values in ranks.items()}
+
+    def unit_results(self, number):
+        """
+        BoostRFE result of every (seed, split) aggregated for `number` features:
+        list of (seed, split size, columns, ranking, support, importances) (see EliminationPath.select).
+        """
+        units = self.units(self._default_runs(number))
+        self._extend_all(number, units)
+        return [(seed, size, self._path(seed, size).columns) + tuple(self._path(seed, size).select(number))
+                for seed, size in units]
+
+    def _extend_checked(self, number, units):
+        try:
+            self._extend_all(number, units)
+        except Exception as e:
+            import xgboost as xgb
+
+            if isinstance(e, xgb.core.XGBoostError) and self.logger:
+                self.logger.exception("XGBoost fitting failed")
+            raise
+
+    def _add_runs(self, number, units, all_rankings, all_importances):
+        """Adds the BoostRFE result of every (seed, split) of units to the aggregates."""
+        for seed, size in units:
+            path = self._path(seed, size)
+            ranking, support, importances = path.select(number)
+
+            for feat, rank in zip(path.columns, ranking):
+                all_rankings[feat].append(rank)
+            for feat, imp in zip(path.columns[support], importances):
+                all_importances[feat].append(imp)
+            print(f"Unique ranks for seed {seed}:", np.unique(ranking))
+
+    def _converge(self, number, n_seeds, all_rankings, all_importances):
+        """Adds seeds until the aggregate has converged or max_runs seeds are used; returns the number of seeds."""
+        previous = _mean_ranks(all_rankings)
+        stable = 0
+        while n_seeds < self.max_runs and stable < self.patience:
+            units = self.units(n_seeds + 1, first=n_seeds)
+            self._extend_checked(number, units)
+            self._add_runs(number, units, all_rankings, all_importances)
+            n_seeds += 1
+            current = _mean_ranks(all_rankings)
+            jaccard = _jaccard(_selected(previous), _selected(current))
+            correlation = _rank_correlation(previous, current)
+            stable = stable + 1 if jaccard >= self.jaccard and correlation >= self.correlation else 0
+            if self.logger:
+                self.logger.info(f"Seed {n_seeds - 1} added for minimum size {number}: Jaccard {jaccard:.3f}, "
+                                 f"rank correlation {correlation:.3f} ({stable}/{self.patience} stable)")
+            previous = current
+        return n_seeds
+
+    def select(self, number):
+        """
+        Returns (all_rankings, all_importances) for the given minimum number of
+        features, with the same content and ordering as refitting BoostRFE for
+        every (seed, split). In the adaptive mode (max_runs), seeds are added
+        until convergence; the number used is stored in runs_used[number].
+        """
+        all_rankings = defaultdict(list)
+        all_importances = defaultdict(list)
+        fits_before = self.n_fits
+
+        n_seeds = self.n_runs if self.max_runs is None else self.min_runs
+        units = self.units(n_seeds)
+        self._extend_checked(number, units)
+        self._add_runs(number, units, all_rankings, all_importances)
+        if self.max_runs is not None:
+            n_seeds = self._converge(number, n_seeds, all_rankings, all_importances)
+        self.runs_used[number] = n_seeds
+
+        if self.logger:
+            if self.max_runs is not None:
+                self.logger.info(f"RFE aggregation for minimum size {number}: {n_seeds} seeds x "
+                                 f"{len(self.split_sizes)} splits = {n_seeds * len(self.split_sizes)} runs "
+                                 f"({'maximum reached' if n_seeds >= self.max_runs else 'converged'})")
+            self.logger.info(f"RFE path engine: {self.n_fits - fits_before} new fits for minimum size {number} "
+                             f"({self.n_fits} fits in total)")
+            if self.step != 1:
+                # Same schedule for every (seed, split): the ranks count these steps
+                schedule = self._path(*self.units()[0]).schedule
+                self.logger.info(f"Elimination schedule (step {self.step}, step 1 from {self.switch_size} features), "
+                                 f"features per step: {' > '.join(map(str, schedule))}")
+        return all_rankings, all_importances
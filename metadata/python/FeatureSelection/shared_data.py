@@ -0,0 +1,127 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+import os
+import uuid
+import shutil
+import socket
+import weakref
+import tempfile
+
+import numpy as np
+
+# Directory of the shared files (default: /dev/shm, i.e. memory, else the temporary directory).
+# Set it to node-local disk (e.g. $TMPDIR) to keep very large matrices in the page cache instead
+SHARED_DIR_ENV = "SHARED_DATA_DIR"
+DIR_PREFIX = "featsel_shared_"
+
+
+def base_directory():
+    base = os.environ.get(SHARED_DIR_ENV)
+    if base:
+        return base
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def remove_stale(base=None):
+    """
+    Removes the shared directories left on this host by processes that no
+    longer run (killed, out of memory). Returns the number of directories removed.
+    """
+    base = base or base_directory()
+    prefix = f"{DIR_PREFIX}{socket.gethostname()}_"
+    removed = 0
+    try:
+        entries = os.listdir(base)
+    except OSError:
+        return 0
+    for entry in entries:
+        if not entry.startswith(prefix):
+            continue
+        try:
+            pid = int(entry[len(prefix):].split("_")[0])
+        except ValueError:
+            continue
+        if not _alive(pid):
+            shutil.rmtree(os.path.join(base, entry), ignore_errors=True)
+            removed += 1
+    return removed
+
+
+class SharedArray(np.ndarray):
+    """
+    Read-only array memory-mapped from a .npy file of a SharedDataset. It is
+    pickled as its file path, so a worker process maps the same pages
+    (zero-copy) instead of receiving a copy. Views, slices and results of
+    operations are ordinary in-memory arrays when pickled, as is the array
+    itself once its file is removed.
+    """
+
+    def __new__(cls, path):
+        array = np.asarray(np.load(path, mmap_mode='r')).view(cls)
+        array._path = path
+        return array
+
+    def __array_finalize__(self, obj):
+        self._path = None
+
+    def __reduce__(self):
+        if self._path is None or not os.path.exists(self._path):
+            return np.array(self).__reduce__()
+        return SharedArray, (self._path,)
+
+
+class SharedDataset:
+    """
+    Directory of memory-mapped arrays shared with worker processes, under
+    base_directory() (one directory per dataset, named after the host and the pid
+    of its owner). The directory is removed by close(), when the dataset is
+    garbage-collected, or at interpreter exit (also after SIGTERM with the
+    checkpoint handler). Directories left by a crashed owner are removed by
+    the next dataset created on the same host (see remove_stale).
+
+    Files in /dev/shm are memory: they are counted once for the job however
+    many workers map them, instead of once per worker with pickled copies.
+    """
+
+    def __init__(self, base_dir=None):
+        base_dir = base_dir or base_directory()
+        remove_stale(base_dir)
+        self.directory = os.path.join(base_dir, f"{DIR_PREFIX}{socket.gethostname()}_{os.getpid()}_{uuid.uuid4().hex[:8]}")
+        os.makedirs(self.directory)
+        self.nbytes = 0
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.directory, True)
+
+    def share(self, name, array):
+        """Writes array to <directory>/<name>.npy and returns it memory-mapped as a SharedArray."""
+        array = np.asarray(array)
+        if array.dtype == object:
+            raise ValueError(f"{name}: object arrays cannot be shared (convert the values first)")
+        path = os.path.join(self.directory, f"{name}.npy")
+        np.save(path, np.ascontiguousarray(array))
+        self.nbytes += array.nbytes
+        return SharedArray(path)
+
+    def close(self):
+        """Removes the shared files (arrays already mapped stay valid)."""
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
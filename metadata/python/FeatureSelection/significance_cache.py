@@ -0,0 +1,81 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+import sys
+from collections import OrderedDict
+
+import numpy as np
+
+
+def nbytes(obj):
+    """Approximate memory of a cached object: numpy buffers (also inside DistanceMatrix/DataFrame and containers)."""
+    if obj is None:
+        return 0
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if hasattr(obj, "data") and isinstance(obj.data, np.ndarray):
+        # skbio DistanceMatrix
+        return obj.data.nbytes
+    if hasattr(obj, "memory_usage"):
+        # pandas objects
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+    if isinstance(obj, (tuple, list)):
+        return sum(nbytes(item) for item in obj)
+    if isinstance(obj, dict):
+        return sum(nbytes(item) for item in obj.values())
+    return sys.getsizeof(obj)
+
+
+class MemoryLRUCache:
+    """
+    Least-recently-used cache bounded by the memory of its entries.
+
+    Entries are evicted, least recently used first, until the total size is
+    at most max_bytes. An entry larger than max_bytes is not stored.
+
+    Parameters:
+    - max_bytes: memory budget of the cached values
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = int(max_bytes)
+        self._entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Returns the cached value (and marks it as recently used), or default."""
+        if key not in self._entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key, value, nbytes=0):
+        """Stores value, counted as nbytes against the budget."""
+        if key in self._entries:
+            self.current_bytes -= self._entries.pop(key)[1]
+        if nbytes > self.max_bytes:
+            return
+        self._entries[key] = (value, nbytes)
+        self.current_bytes += nbytes
+        while self.current_bytes > self.max_bytes:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
+
+    def describe(self):
+        return (f"{self.hits} hits, {self.misses} misses, {len(self)} entries, "
+                f"{self.current_bytes / 2**20:.1f}/{self.max_bytes / 2**20:.0f} MB")
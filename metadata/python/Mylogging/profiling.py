@@ -0,0 +1,238 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+import os
+import sys
+import json
+import time
+import atexit
+import resource
+import threading
+import functools
+from contextlib import contextmanager
+from datetime import datetime
+
+# %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+# Interval of the RSS sampler (seconds)
+SAMPLE_INTERVAL = 0.05
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (Linux /proc; falls back to the peak RSS elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 2**20
+    except (OSError, IndexError, ValueError):
+        return max_rss_mb()
+
+
+def max_rss_mb(who=resource.RUSAGE_SELF):
+    """Peak RSS in MB since the start of the process (or of its waited-for children)."""
+    # ru_maxrss is in KB on Linux, in bytes on macOS
+    scale = 2**20 if sys.platform == "darwin" else 2**10
+    return resource.getrusage(who).ru_maxrss / scale
+
+
+class _RSSSampler(threading.Thread):
+    """Background thread updating the peak RSS of every open span."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.interval = interval
+        self.peaks = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def open(self, span_id):
+        with self.lock:
+            self.peaks[span_id] = current_rss_mb()
+
+    def close(self, span_id):
+        rss = current_rss_mb()
+        with self.lock:
+            return max(self.peaks.pop(span_id, rss), rss)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                if not self.peaks:
+                    continue
+                rss = current_rss_mb()
+                for span_id, peak in self.peaks.items():
+                    if rss > peak:
+                        self.peaks[span_id] = rss
+
+
+class Profiler:
+    """
+    Records stage spans (wall time, CPU time, peak RSS) as JSON lines.
+
+    Every span closed writes one record to metrics_file:
+    - span, path (enclosing spans, e.g. "attempt/rfe"), tags (e.g. size)
+    - start (ISO time), wall_s, cpu_s (this process, all threads),
+      cpu_children_s (finished child processes, e.g. worker pools)
+    - rss_start_mb, peak_rss_mb (sampled during the span), max_rss_mb
+      (process high-water mark at the end of the span)
+    - status: "ok" or the exception class raised inside the span
+
+    Parameters:
+    - metrics_file: JSON-lines output, e.g. logs/ML/<job>_<task>/metrics.jsonl
+    - logger: optional logger receiving the summary table
+    - summary_file: summary table output (default: <metrics_file stem>_summary.txt)
+    """
+
+    def __init__(self, metrics_file, logger=None, summary_file=None):
+        os.makedirs(os.path.dirname(os.path.abspath(metrics_file)), exist_ok=True)
+        self.metrics_file = metrics_file
+        self.logger = logger
+        self.summary_file = summary_file or os.path.splitext(metrics_file)[0] + "_summary.txt"
+        self.records = []
+        self._stack = threading.local()
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._sampler = _RSSSampler()
+        self._sampler.start()
+
+    def _path(self):
+        if not hasattr(self._stack, "names"):
+            self._stack.names = []
+        return self._stack.names
+
+    @contextmanager
+    def span(self, name, **tags):
+        with self._lock:
+            span_id = self._next_id
+            self._next_id += 1
+        path = self._path()
+        path.append(name)
+        self._sampler.open(span_id)
+
+        start = datetime.now().isoformat(timespec="seconds")
+        rss_start = current_rss_mb()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        status = "ok"
+        try:
+            yield
+        except BaseException as e:
+            status = type(e).__name__
+            raise
+        finally:
+            children_end = resource.getrusage(resource.RUSAGE_CHILDREN)
+            record = {
+                "span": name,
+                "path": "/".join(path),
+                "tags": tags,
+                "start": start,
+                "wall_s": round(time.perf_counter() - wall, 4),
+                "cpu_s": round(time.process_time() - cpu, 4),
+                "cpu_children_s": round(children_end.ru_utime + children_end.ru_stime
+                                        - children.ru_utime - children.ru_stime, 4),
+                "rss_start_mb": round(rss_start, 1),
+                "peak_rss_mb": round(self._sampler.close(span_id), 1),
+                "max_rss_mb": round(max_rss_mb(), 1),
+                "status": status,
+                "pid": os.getpid(),
+            }
+            path.pop()
+            self._write(record)
+
+    def _write(self, record):
+        with self._lock:
+            self.records.append(record)
+            with open(self.metrics_file, "a") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+
+    def summary(self):
+        """
+        Returns a text table with one row per span path: count, total and
+        mean wall time, total CPU time (own + children) and the largest peak RSS.
+        """
+        rows = {}
+        for record in self.records:
+            row = rows.setdefault(record["path"], {"count": 0, "wall": 0.0, "cpu": 0.0, "peak": 0.0})
+            row["count"] += 1
+            row["wall"] += record["wall_s"]
+            row["cpu"] += record["cpu_s"] + record["cpu_children_s"]
+            row["peak"] = max(row["peak"], record["peak_rss_mb"])
+
+        width = max([len("span")] + [len(path) for path in rows])
+        lines = [f"{'span':<{width}}  {'count':>5}  {'wall_s':>10}  {'mean_s':>9}  {'cpu_s':>10}  {'peak_rss_mb':>11}"]
+        for path, row in rows.items():
+            lines.append(f"{path:<{width}}  {row['count']:>5}  {row['wall']:>10.2f}  "
+                         f"{row['wall'] / row['count']:>9.2f}  {row['cpu']:>10.2f}  {row['peak']:>11.1f}")
+        lines.append(f"Process peak RSS: {max_rss_mb():.1f} MB "
+                     f"(children: {max_rss_mb(resource.RUSAGE_CHILDREN):.1f} MB)")
+        return "\n".join(lines)
+
+    def write_summary(self):
+        """Writes the summary table to summary_file and the logger (nothing if no span was recorded)."""
+        if not self.records:
+            return
+        table = self.summary()
+        with open(self.summary_file, "w") as f:
+            f.write(table + "\n")
+        if self.logger:
+            self.logger.info("Stage timings and memory:\n" + table)
+
+    def close(self):
+        """Writes the summary and stops the RSS sampler."""
+        self.write_summary()
+        self._sampler.stopped.set()
+
+
+# %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+# Process-wide profiler used by span() and profiled(); spans are no-ops until setup_profiler is called
+
+_profiler = None
+
+
+def setup_profiler(metrics_file, logger=None, summary_file=None, at_exit=True):
+    """
+    Sets up the process-wide profiler writing to metrics_file, replacing
+    (and closing) the previous one.
+
+    The summary table is written to the logger (if given) and to summary_file
+    (default: <metrics_file stem>_summary.txt) at exit, or by close() when
+    at_exit is False (e.g. one profiler per job of a resident worker).
+    """
+    global _profiler
+    if _profiler is not None:
+        _profiler.close()
+    _profiler = Profiler(metrics_file, logger=logger, summary_file=summary_file)
+    if at_exit:
+        atexit.register(_profiler.write_summary)
+    return _profiler
+
+
+def get_profiler():
+    return _profiler
+
+
+@contextmanager
+def span(name, **tags):
+    """Context manager recording a span with the process-wide profiler (no-op if not set up)."""
+    if _profiler is None:
+        yield
+    else:
+        with _profiler.span(name, **tags):
+            yield
+
+
+def profiled(name=None):
+    """Decorator recording every call of the function as a span (named after the function by default)."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
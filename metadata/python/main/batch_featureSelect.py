@@ -0,0 +1,255 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+import sys
+import os
+# Get the directory where the current script is located
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+# Add custom module folders relative to the script location
+sys.path.insert(0, os.path.join(parent_dir, 'Mylogging'))
+sys.path.insert(0, os.path.join(parent_dir, 'FeatureSelection'))
+
+import csv
+import json
+import glob
+import shlex
+import argparse
+
+#Logging module
+import mylogging
+
+# Input shapes, to estimate the cost of every cohort
+import data_loading
+
+# Cores of the job, worker pool
+import parallel
+
+# Log directory of the job, and the runner of a single input
+import jcna_featureSelect
+import ml_worker
+
+# %%%%%%%%%%%%%
+name = "Batch"
+# %%%%%%%%%%%%%
+
+# Columns of a status report
+REPORT_FIELDS = ("shard", "name", "input", "output", "size", "samples", "regions", "cost",
+                 "status", "final_size", "wall_s", "error", "log_dir")
+
+
+def read_manifest(path):
+    """
+    Reads a batch manifest: a CSV file with a header and the columns
+    - input: regions matrix (any format of data_loading.load_dataset)
+    - output: output file of the selected features
+    - size: initial minimum number of features
+    - name (optional): job name, used for the log directory (default: output file stem)
+    - options (optional): extra jcna_featureSelect options, e.g. "--float32 --size-search bisection"
+
+    Returns a list of job dicts (input, output, size, name, args).
+    """
+    jobs = []
+    with open(path, newline='') as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            missing = [key for key in ("input", "output", "size") if not (row.get(key) or "").strip()]
+            if missing:
+                raise ValueError(f"{path}, line {line}: missing {', '.join(missing)}")
+            output = row["output"].strip()
+            jobs.append({
+                "input": row["input"].strip(),
+                "output": output,
+                "size": int(row["size"]),
+                "name": (row.get("name") or "").strip() or os.path.splitext(os.path.basename(output))[0],
+                "args": shlex.split(row.get("options") or ""),
+            })
+    names = [job["name"] for job in jobs]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise ValueError(f"{path}: duplicate job names {', '.join(duplicates)} (set the name column)")
+    return jobs
+
+
+def estimate_costs(jobs):
+    """Adds samples, regions and cost (samples x regions) to every job; unreadable inputs cost 0."""
+    for job in jobs:
+        try:
+            job["samples"], job["regions"] = data_loading.estimate_shape(job["input"])
+        except (OSError, ValueError):
+            job["samples"], job["regions"] = 0, 0
+        job["cost"] = job["samples"] * job["regions"]
+    return jobs
+
+
+def assign_shards(jobs, n_shards):
+    """
+    Balances the jobs between shards by cost: longest job first, each to the
+    least loaded shard (ties: lowest shard, then manifest order). The
+    assignment only depends on the manifest, so every array task computes the same one.
+
+    Returns a list of n_shards lists of jobs, costliest first.
+    """
+    shards = [[] for _ in range(n_shards)]
+    loads = [0] * n_shards
+    order = sorted(range(len(jobs)), key=lambda i: (-jobs[i]["cost"], i))
+    for i in order:
+        shard = min(range(n_shards), key=lambda s: (loads[s], s))
+        shards[shard].append(jobs[i])
+        # Empty or unreadable inputs still take a slot
+        loads[shard] += max(jobs[i]["cost"], 1)
+    return shards
+
+
+def current_shard():
+    """
+    (shard index, number of shards) of this SLURM array task, from
+    SLURM_ARRAY_TASK_ID, SLURM_ARRAY_TASK_MIN and SLURM_ARRAY_TASK_COUNT; (0, 1) outside an array.
+    """
+    task_id = os.environ.get("SLURM_ARRAY_TASK_ID")
+    if task_id is None:
+        return 0, 1
+    task_min = int(os.environ.get("SLURM_ARRAY_TASK_MIN", 0))
+    count = int(os.environ.get("SLURM_ARRAY_TASK_COUNT", 1))
+    return int(task_id) - task_min, count
+
+
+def _run_entry(task):
+    """Pool entry point: runs one job in a worker process with its share of the cores."""
+    job, log_root, threads = task
+    # Read by parallel.available_cores in the FeatureSelection module
+    os.environ["GALAXY_SLOTS"] = str(threads)
+    logger = mylogging.setup_logger(f"ML.Batch.{job['name']}", f"{log_root}/{job['name']}/__Batch__.log")
+    return ml_worker.run_job(job, log_root, logger)
+
+
+def run_shard(jobs, log_root, n_cores, logger, on_status=None):
+    """
+    Runs the jobs of a shard in a shared process pool. Cores are split between
+    concurrent cohorts and the threads of each (see parallel.split_cores).
+    Returns the status records, in the order of jobs.
+    """
+    if not jobs:
+        return []
+    n_workers, threads = parallel.split_cores(len(jobs), n_cores)
+    logger.info(f"Running {len(jobs)} cohorts with {n_workers} workers x {threads} cores")
+
+    def completed(index, status):
+        if on_status:
+            on_status(jobs[index], status)
+
+    return parallel.map_units(_run_entry, [(job, log_root, threads) for job in jobs], n_workers,
+                              on_result=completed)
+
+
+def status_row(shard, job, status):
+    row = {key: job.get(key) for key in ("name", "input", "output", "size", "samples", "regions", "cost")}
+    row.update({key: status.get(key) for key in ("status", "final_size", "wall_s", "error", "log_dir")})
+    row["shard"] = shard
+    return row
+
+
+def write_report(report_dir, logger=None):
+    """
+    Combines the status files of all shards (shard_<k>.jsonl) into
+    <report_dir>/status.tsv and returns the rows. Inputs of the manifest
+    not yet reported by their shard are listed as pending.
+    """
+    rows = []
+    for path in sorted(glob.glob(os.path.join(report_dir, "shard_*.jsonl"))):
+        with open(path) as f:
+            rows.extend(json.loads(line) for line in f if line.strip())
+
+    # Latest status of every job (a rerun shard appends new lines)
+    latest = {}
+    for row in rows:
+        latest[row["name"]] = row
+    manifest_file = os.path.join(report_dir, "manifest.json")
+    if os.path.exists(manifest_file):
+        with open(manifest_file) as f:
+            for shard, jobs in enumerate(json.load(f)):
+                for job in jobs:
+                    latest.setdefault(job["name"], status_row(shard, job, {"status": "pending"}))
+
+    report = sorted(latest.values(), key=lambda row: (row["shard"], row["name"]))
+    tmp = os.path.join(report_dir, f"status.tsv.tmp{os.getpid()}")
+    with open(tmp, "w", newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS, delimiter='\t', extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(report)
+    os.replace(tmp, os.path.join(report_dir, "status.tsv"))
+
+    if logger:
+        counts = {}
+        for row in report:
+            counts[row["status"]] = counts.get(row["status"], 0) + 1
+        logger.info(f"Status report {report_dir}/status.tsv: " + ", ".join(f"{v} {k}" for k, v in sorted(counts.items())))
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Feature selection of many importantRegions inputs, "
+                                                 "sharded over the tasks of a SLURM array")
+    parser.add_argument("manifest", help="CSV manifest: input,output,size[,name][,options]")
+    parser.add_argument("--report-dir", default=None,
+                        help="directory of the shard status files and the combined status.tsv "
+                             "(default: <manifest stem>_status)")
+    parser.add_argument("--log-dir", default=None, help="root of the per-input log directories "
+                                                         "(default: logs/ML/<job>_<task>)")
+    parser.add_argument("--shard", type=int, default=None, help="shard to run (default: from SLURM_ARRAY_TASK_ID)")
+    parser.add_argument("--n-shards", type=int, default=None, help="number of shards (default: SLURM_ARRAY_TASK_COUNT)")
+    parser.add_argument("--report-only", action="store_true", help="only rebuild the combined status report")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    report_dir = args.report_dir or os.path.splitext(args.manifest)[0] + "_status"
+    os.makedirs(report_dir, exist_ok=True)
+
+    log_root = args.log_dir or jcna_featureSelect.default_log_dir()
+    logger = mylogging.setup_logger("ML.Batch", f"{log_root}/__Batch__.log")
+    logger.info("Inside the " + name + " module")
+
+    if args.report_only:
+        write_report(report_dir, logger)
+        return
+
+    shard, n_shards = current_shard()
+    shard = shard if args.shard is None else args.shard
+    n_shards = n_shards if args.n_shards is None else args.n_shards
+    if not 0 <= shard < n_shards:
+        logger.error(f"Shard {shard} out of range for {n_shards} shards")
+        sys.exit(2)
+
+    jobs = estimate_costs(read_manifest(args.manifest))
+    shards = assign_shards(jobs, n_shards)
+    # Assignment of every shard, so that the report lists the inputs not yet run
+    manifest_file = os.path.join(report_dir, "manifest.json")
+    tmp = f"{manifest_file}.tmp{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(shards, f)
+    os.replace(tmp, manifest_file)
+    logger.info(f"Manifest {args.manifest}: {len(jobs)} inputs, shard {shard}/{n_shards} has "
+                f"{len(shards[shard])} inputs (cost {sum(j['cost'] for j in shards[shard])} of "
+                f"{sum(j['cost'] for j in jobs)} cells)")
+
+    shard_file = os.path.join(report_dir, f"shard_{shard}.jsonl")
+
+    def record(job, status):
+        with open(shard_file, "a") as f:
+            f.write(json.dumps(status_row(shard, job, status), default=str) + "\n")
+
+    statuses = run_shard(shards[shard], log_root, parallel.available_cores(), logger, on_status=record)
+    write_report(report_dir, logger)
+
+    failed = [s["name"] for s in statuses if s["status"] != "done"]
+    if failed:
+        logger.error(f"{len(failed)} inputs failed: {', '.join(failed)}")
+        sys.exit(3)
+
+
+# Guard needed by the process pools ('spawn' start method)
+if __name__ == "__main__":
+    main()
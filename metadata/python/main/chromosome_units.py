@@ -0,0 +1,163 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+import os
+import sys
+import csv
+import json
+import math
+import argparse
+
+# Chromosomes skipped by run_pipeline_module2to6.sh (names containing Y or M)
+EXCLUDED = ("Y", "M")
+
+# JVM heap per Mb of the largest chromosome of a unit: the default heap of run_pipeline_module2to6.sh
+# (9/10 of 32000 MB, i.e. 28 GB) for chr1 (249 Mb)
+HEAP_GB_PER_MB = 0.1124
+MIN_HEAP_GB = 4
+# Share of the job memory given to the heap (HEAP_MEM_GB = 9/10 of GALAXY_MEMORY_MB in the script)
+HEAP_SHARE = 0.9
+
+MANIFEST_FIELDS = ("task", "unit", "chromosomes", "n_chromosomes", "total_length", "largest_length",
+                   "heap_mem_gb", "mem_mb")
+
+
+def read_genome(path):
+    """
+    Reads genome.csv (chromosome,length,fasta path; no header) and returns
+    [(chromosome, length)], without the excluded chromosomes.
+    """
+    chromosomes = []
+    with open(path, newline='') as f:
+        for line, row in enumerate(csv.reader(f), start=1):
+            if not row or not row[0].strip():
+                continue
+            chrom = row[0].strip()
+            if any(tag in chrom for tag in EXCLUDED):
+                continue
+            try:
+                length = int(row[1])
+            except (IndexError, ValueError):
+                raise ValueError(f"{path}, line {line}: no chromosome length for {chrom}")
+            chromosomes.append((chrom, length))
+    return chromosomes
+
+
+def heap_gb(largest_length):
+    """JVM heap (GB) of a unit whose largest chromosome has largest_length bases."""
+    return max(MIN_HEAP_GB, math.ceil(HEAP_GB_PER_MB * largest_length / 1e6))
+
+
+def plan_units(chromosomes, n_units, mem_budget_gb=None):
+    """
+    Balances the chromosomes between n_units work units by genome length:
+    longest chromosome first, each to the unit with the smallest total length
+    (ties: lowest unit). A unit runs its chromosomes one after another, so its
+    wall-time grows with its total length and its heap with its largest chromosome.
+
+    Parameters:
+    - chromosomes: [(chromosome, length)]
+    - n_units: target number of units (at most one per chromosome)
+    - mem_budget_gb: memory of a task; a ValueError is raised if a unit needs more
+
+    Returns:
+    - list of unit dicts (unit, chromosomes, total_length, largest_length,
+      heap_mem_gb, mem_mb), largest total length first; the chromosomes of a
+      unit are in the order of genome.csv
+    """
+    if not chromosomes:
+        raise ValueError("No chromosomes to plan")
+    n_units = max(1, min(n_units, len(chromosomes)))
+    position = {chrom: i for i, (chrom, _) in enumerate(chromosomes)}
+    members = [[] for _ in range(n_units)]
+    loads = [0] * n_units
+    for chrom, length in sorted(chromosomes, key=lambda c: (-c[1], position[c[0]])):
+        unit = min(range(n_units), key=lambda u: (loads[u], u))
+        members[unit].append((chrom, length))
+        loads[unit] += length
+
+    units = []
+    for assigned in members:
+        assigned.sort(key=lambda c: position[c[0]])
+        largest = max(length for _, length in assigned)
+        heap = heap_gb(largest)
+        units.append({
+            "chromosomes": [chrom for chrom, _ in assigned],
+            "total_length": sum(length for _, length in assigned),
+            "largest_length": largest,
+            "heap_mem_gb": heap,
+            "mem_mb": math.ceil(heap * 1024 / HEAP_SHARE),
+        })
+    units.sort(key=lambda u: (-u["total_length"], position[u["chromosomes"][0]]))
+    for i, unit in enumerate(units):
+        unit["unit"] = f"unit_{i}"
+        if mem_budget_gb is not None and unit["mem_mb"] > mem_budget_gb * 1024:
+            raise ValueError(f"{unit['unit']} ({', '.join(unit['chromosomes'])}) needs {unit['mem_mb']} MB, "
+                             f"more than the {mem_budget_gb} GB budget of a task")
+    return units
+
+
+def write_plan(units, output_dir):
+    """
+    Writes to output_dir:
+    - units/<unit>.txt: the chromosomes of a unit, comma-separated on one line
+      (the Chromosome_job input of the mod2to6 tool, passed as --chromosome)
+    - chromosomes_collection.json: Galaxy collection of the unit files
+    - manifest.tsv: SLURM array manifest, row k for SLURM_ARRAY_TASK_ID k
+
+    Returns the paths of the collection and the manifest.
+    """
+    units_dir = os.path.join(output_dir, "units")
+    os.makedirs(units_dir, exist_ok=True)
+    for unit in units:
+        with open(os.path.join(units_dir, f"{unit['unit']}.txt"), "w") as f:
+            f.write(",".join(unit["chromosomes"]) + "\n")
+
+    collection = {
+        "name": "chromosomes",
+        "elements": [{"src": "hda", "name": unit["unit"]} for unit in units]
+    }
+    collection_file = os.path.join(output_dir, "chromosomes_collection.json")
+    with open(collection_file, "w") as out:
+        json.dump(collection, out, indent=2)
+
+    manifest_file = os.path.join(output_dir, "manifest.tsv")
+    with open(manifest_file, "w", newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=MANIFEST_FIELDS, delimiter='\t', extrasaction='ignore')
+        writer.writeheader()
+        for task, unit in enumerate(units):
+            writer.writerow(dict(unit, task=task, chromosomes=",".join(unit["chromosomes"]),
+                                 n_chromosomes=len(unit["chromosomes"])))
+    return collection_file, manifest_file
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Balances the chromosomes of genome.csv between work units "
+                                                 "of run_pipeline_module2to6.sh (Galaxy collection + SLURM array manifest)")
+    parser.add_argument("genome", help="genome.csv: chromosome,length,fasta path")
+    parser.add_argument("output_dir", help="directory of the unit files, collection JSON and manifest")
+    parser.add_argument("--tasks", type=int, required=True, help="target number of work units (array tasks)")
+    parser.add_argument("--mem-budget-gb", type=float, default=None,
+                        help="memory of a task; fails if a unit needs more")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    try:
+        units = plan_units(read_genome(args.genome), args.tasks, args.mem_budget_gb)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    collection_file, manifest_file = write_plan(units, args.output_dir)
+    for unit in units:
+        print(f"{unit['unit']}: {','.join(unit['chromosomes'])} ({unit['total_length'] / 1e6:.1f} Mb, "
+              f"heap {unit['heap_mem_gb']} GB, --mem={unit['mem_mb']}M)")
+    print(f"Galaxy collection JSON saved to {collection_file}")
+    print(f"SLURM array manifest saved to {manifest_file} (--array=0-{len(units) - 1})")
+
+
+if __name__ == "__main__":
+    main()
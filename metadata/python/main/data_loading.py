@@ -0,0 +1,169 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+import os
+
+import numpy as np
+import pandas as pd
+
+# Label column expected by the FeatureSelection module
+LABEL_COLUMN = 'Diagnostic_status'
+
+CSV_EXTENSIONS = ('.csv',)
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+ARROW_EXTENSIONS = ('.feather', '.arrow', '.ipc')
+NPY_EXTENSIONS = ('.npy',)
+
+
+def sidecar_paths(npy_file):
+    """
+    Default sidecar files of a .npy feature matrix:
+    <stem>.labels.txt (one Diagnostic_status per row) and <stem>.columns.txt (one region name per column).
+    """
+    stem = os.path.splitext(npy_file)[0]
+    return f"{stem}.labels.txt", f"{stem}.columns.txt"
+
+
+def _read_lines(path):
+    with open(path) as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def _read_csv(path, float32):
+    dtype = None
+    if float32:
+        # Read the header only, to type every feature column as float32
+        header = pd.read_csv(path, sep=',', header=0, index_col=False, nrows=0).columns
+        dtype = {col: np.float32 for col in header if col != LABEL_COLUMN}
+    return pd.read_csv(path, sep=',', header=0, index_col=False, dtype=dtype)
+
+
+def _read_arrow(path, float32):
+    import pyarrow as pa
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext in PARQUET_EXTENSIONS:
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, memory_map=True)
+    else:
+        import pyarrow.feather as feather
+        table = feather.read_table(path, memory_map=True)
+
+    if float32:
+        # Cast in Arrow, before conversion, so that no float64 frame is materialized
+        schema = pa.schema([field.with_type(pa.float32()) if pa.types.is_float64(field.type) else field
+                            for field in table.schema])
+        table = table.cast(schema)
+
+    return table.to_pandas(self_destruct=True)
+
+
+def _read_npy(path, float32, labels_path=None, columns_path=None):
+    default_labels, default_columns = sidecar_paths(path)
+    labels_path = labels_path or default_labels
+    columns_path = columns_path or default_columns
+
+    # Memory-mapped, read-only: pages are loaded on demand and shared by every view of the matrix
+    values = np.load(path, mmap_mode='r')
+    if values.ndim != 2:
+        raise ValueError(f"Expected a 2-D feature matrix in {path}, found {values.ndim} dimensions")
+    if float32 and values.dtype != np.float32:
+        # Conversion needs an in-memory copy; store the .npy as float32 to keep it memory-mapped
+        values = values.astype(np.float32)
+
+    labels = _read_lines(labels_path)
+    if len(labels) != values.shape[0]:
+        raise ValueError(f"{labels_path} has {len(labels)} labels for {values.shape[0]} rows")
+    if os.path.exists(columns_path):
+        columns = _read_lines(columns_path)
+        if len(columns) != values.shape[1]:
+            raise ValueError(f"{columns_path} has {len(columns)} names for {values.shape[1]} columns")
+    else:
+        columns = [f"region_{i}" for i in range(values.shape[1])]
+
+    # One float block backed by the memory map; the label column is a separate block,
+    # so features can be sliced back out (dataframe.iloc[:, :-1]) without copying
+    dataframe = pd.DataFrame(values, columns=columns, copy=False)
+    dataframe[LABEL_COLUMN] = labels
+    return dataframe
+
+
+def load_dataset(path, float32=False, labels_path=None, columns_path=None):
+    """
+    Loads a regions matrix with a Diagnostic_status column as a DataFrame.
+
+    Supported inputs:
+    - .csv: comma-separated, header row, label column Diagnostic_status
+    - .parquet/.pq, .feather/.arrow/.ipc: columnar files with the same columns (needs pyarrow)
+    - .npy: 2-D numeric matrix, memory-mapped read-only, with sidecar label and
+      column-name files (see sidecar_paths)
+
+    Parameters:
+    - path: input file
+    - float32: type the feature columns as float32 (half the memory of float64;
+      XGBoost trains on float32 internally)
+    - labels_path, columns_path: sidecar files of a .npy input, if not at the default location
+
+    Returns:
+    - pandas DataFrame with the feature columns followed by Diagnostic_status
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in CSV_EXTENSIONS:
+        dataframe = _read_csv(path, float32)
+    elif ext in PARQUET_EXTENSIONS or ext in ARROW_EXTENSIONS:
+        dataframe = _read_arrow(path, float32)
+    elif ext in NPY_EXTENSIONS:
+        return _read_npy(path, float32, labels_path, columns_path)
+    else:
+        raise ValueError(f"Unsupported input format '{ext}' for {path}")
+
+    if LABEL_COLUMN not in dataframe.columns:
+        raise ValueError(f"Column {LABEL_COLUMN} not found in {path}")
+    # Keep the label column last, as in the CSV exports of the Java modules
+    if dataframe.columns[-1] != LABEL_COLUMN:
+        dataframe = dataframe[[col for col in dataframe.columns if col != LABEL_COLUMN] + [LABEL_COLUMN]]
+    return dataframe
+
+
+def estimate_shape(path):
+    """
+    (samples, regions) of an input without loading it: CSV header and line
+    count, Parquet/Arrow metadata, or the .npy header. Used to balance batches.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in NPY_EXTENSIONS:
+        rows, cols = np.load(path, mmap_mode='r').shape
+        return rows, cols
+    if ext in PARQUET_EXTENSIONS:
+        import pyarrow.parquet as pq
+        metadata = pq.read_metadata(path)
+        return metadata.num_rows, metadata.num_columns - 1
+    if ext in ARROW_EXTENSIONS:
+        import pyarrow.feather as feather
+        table = feather.read_table(path, memory_map=True)
+        return table.num_rows, table.num_columns - 1
+    if ext in CSV_EXTENSIONS:
+        with open(path, 'rb') as f:
+            header = f.readline()
+            rows = sum(1 for line in f if line.strip())
+        return rows, header.count(b',')
+    raise ValueError(f"Unsupported input format '{ext}' for {path}")
+
+
+def save_npy(dataframe, path, float32=True):
+    """
+    Writes a regions DataFrame as a .npy matrix plus its sidecar label and column
+    files, so that later runs can memory-map it with load_dataset.
+    """
+    features = dataframe.drop(columns=[LABEL_COLUMN])
+    values = features.to_numpy(dtype=np.float32 if float32 else np.float64)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    np.save(path, values)
+
+    labels_path, columns_path = sidecar_paths(path)
+    with open(labels_path, 'w') as f:
+        f.write("\n".join(dataframe[LABEL_COLUMN].astype(str)) + "\n")
+    with open(columns_path, 'w') as f:
+        f.write("\n".join(features.columns.astype(str)) + "\n")
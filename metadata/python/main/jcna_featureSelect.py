@@ -15,10 +15,16 @@ sys.path.insert(0, os.path.join(parent_dir, 'StatisticalValidation'))
 
 #Logging module
 import mylogging
+# Stage timings and memory (JSON-lines metrics)
+import profiling
 
 ##Libraries for data manipulation
+import argparse
 import pandas as pd
 
+# Input loading (CSV, Parquet/Arrow, memory-mapped .npy)
+import data_loading
+
 # Module for important features selection
 import features_selection
 
@@ -28,65 +34,208 @@ name = "Main"
 
 ##Data prep
 
-# Get SLURM environment variables
-job_id = os.environ.get("SLURM_JOB_ID", "default")
-task_id = os.environ.get("SLURM_ARRAY_TASK_ID")
-
-# Build the log subfolder name
-if task_id:
-    log_subdir = f"{job_id}_{task_id}"
-else:
-    log_subdir = job_id
-
-# Define the full log path
-log_dir = f"logs/ML/{log_subdir}"
-
-# Setup separate loggers for your different tasks
-logger_functions = mylogging.setup_logger("ML.Functions", f"{log_dir}/__Functions__.log")
-logger_write = mylogging.setup_logger("ML.WriteToFile", f"{log_dir}/__WriteToFile__.log")
-logger_upload = mylogging.setup_logger("ML.UploadFile",f"{log_dir}/__uploadFile__.log")
-logger_dfChecks = mylogging.setup_logger("ML.dfChecks",f"{log_dir}/__DataFrameChecks__.log")
-logger_stats = mylogging.setup_logger("ML.Statistics",f"{log_dir}/__Stats__.log")
-
-# the train/validation data contains only numerical entries and 1 categorical #entry for the Diagnostic_status
-dataframe = pd.DataFrame()
-
-logger_upload.info("Inside the "+name+" module")
-try:
-    pd.options.display.float_format = '{:.6f}'.format
-    csv_file = sys.argv[1]
-    if not os.path.exists(csv_file):
-        logger_upload.error(f"File does not exist: {csv_file}")
-        sys.exit(2)
-    # csv_file = "/Users/avo/Eclipse/workspace/cfDNA-Biomarkers/CNA_compositions/2025-05-19_19-35/importantRegions_disease-severe.csv"
-    print("CSV path:", csv_file)
-    dataframe = pd.read_csv(csv_file,sep=',',header=0,index_col=False)
-    # print("Columns:", dataframe.columns)
-except Exception as e:
-    logger_upload.error("An exception occurred:", exc_info=True)
-
-n_col = len(dataframe.columns)
-
-dataframe.head()
-
-#dropping any column with null values
-logger_dfChecks.info("Inside the "+name+" module")
-try:
-    if sum(dataframe.iloc[:,0:(n_col-1)].isnull().any()) != 0:
-        df = (dataframe.iloc[:,0:(n_col-1)]).dropna(axis=1)
-        df['Diagnostic_status'] = dataframe['Diagnostic_status']
-    elif sum(dataframe.iloc[:,0:(n_col-1)].isnull().any()) == 0 :
-        df = dataframe
-except Exception as e:
-    logger_dfChecks.error("An exception occurred:", exc_info=True)
-
-# Save the original column names
-original_columns = df.columns.astype(str)
-
-# Save mapping before renaming
-name_map = dict(zip(original_columns.str.replace("-", "_"), original_columns))
-
-# %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
-features_selection.calc_stat_sign_feat(df,sys.argv[2],int(sys.argv[3]),name_map,logger_functions, logger_write,logger_stats)
-
-
+def elimination_step(value):
+    """argparse type of --elimination-step: 1, or a fraction in (0, 1)."""
+    try:
+        step = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid number: {value}")
+    if not (step == 1 or 0 < step < 1):
+        raise argparse.ArgumentTypeError(f"must be 1 or a fraction in (0, 1), got {value}")
+    return step
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Feature selection + PERMANOVA on an importantRegions matrix")
+    parser.add_argument("input", help="regions matrix: .csv, .parquet, .feather/.arrow or .npy (+ sidecar files)")
+    parser.add_argument("output", help="output file for the selected features and importances")
+    parser.add_argument("size", type=int, help="initial minimum number of features to select")
+    parser.add_argument("--float32", action="store_true", help="load the feature columns as float32")
+    parser.add_argument("--labels", default=None, help="Diagnostic_status sidecar of a .npy input")
+    parser.add_argument("--columns", default=None, help="column-name sidecar of a .npy input")
+    parser.add_argument("--checkpoint-dir", default=None,
+                        help="checkpoint directory (default: <log dir>/checkpoint); a requeued job resumes from it, "
+                             "a completed run removes its checkpoint")
+    parser.add_argument("--no-checkpoint", action="store_true", help="do not save or resume checkpoints")
+    parser.add_argument("--size-search", choices=["linear", "bisection", "galloping"], default=None,
+                        help="search over the minimum feature size (default: features_selection.size_search)")
+    parser.add_argument("--elimination-step", type=elimination_step, default=None,
+                        help="share of the surviving features removed per RFE refit (default: 1 feature per refit)")
+    parser.add_argument("--adaptive-runs", type=int, default=None, metavar="MAX_SEEDS",
+                        help="add RFE seeds until the aggregated ranking converges, up to MAX_SEEDS "
+                             "(default: a fixed number of seeds)")
+    parser.add_argument("--prefilter-top-k", type=int, default=None,
+                        help="keep the K best columns of a univariate pre-filter before BoostRFE (default: no pre-filter)")
+    parser.add_argument("--prefilter-stat", choices=["kruskal", "anova"], default="kruskal",
+                        help="pre-filter class-separation statistic")
+    parser.add_argument("--prefilter-variance", type=float, default=None,
+                        help="pre-filter: drop columns with variance <= this threshold (0 with the other options)")
+    parser.add_argument("--prefilter-corr", type=float, default=None,
+                        help="pre-filter: drop columns with |r| above this threshold with a better column")
+    parser.add_argument("--contrasts", choices=["pairwise", "one-vs-rest", "both"], default=None,
+                        help="also test contrasts between the classes on the final features "
+                             "(summary: <output stem>_contrasts.csv)")
+    parser.add_argument("--contrast-reference", default=None,
+                        help="pairwise contrasts of this class against every other class (default: every pair)")
+    parser.add_argument("--contrast-correction", choices=["holm", "bonferroni", "fdr_bh"], default="holm",
+                        help="multiple-testing correction of the contrast p-values")
+    parser.add_argument("--sharded-permutations", type=int, default=None, metavar="N",
+                        help="write a plan of N permutations of the final PERMANOVA, split into shards for "
+                             "sharded_permanova.py (<output stem>_permutations)")
+    parser.add_argument("--permutation-shards", type=int, default=10,
+                        help="number of shards (SLURM array tasks) of --sharded-permutations")
+    parser.add_argument("--result-store", default=None, metavar="SQLITE",
+                        help="add the run to this SQLite result store (default: <output stem>_results.sqlite)")
+    parser.add_argument("--no-result-store", action="store_true", help="do not write the result store")
+    parser.add_argument("--state-dir", default=None,
+                        help="save the run state there for later incremental runs "
+                             "(default with --incremental: <output stem>_state)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="the input is the cohort of the saved state with appended samples: "
+                             "warm-start from that state (full run if it does not match)")
+    return parser.parse_args(argv)
+
+
+def default_log_dir():
+    """logs/ML/<job>_<task> of the current SLURM job (logs/ML/default outside SLURM)."""
+    # Get SLURM environment variables
+    job_id = os.environ.get("SLURM_JOB_ID", "default")
+    task_id = os.environ.get("SLURM_ARRAY_TASK_ID")
+
+    # Build the log subfolder name
+    if task_id:
+        log_subdir = f"{job_id}_{task_id}"
+    else:
+        log_subdir = job_id
+
+    # Define the full log path
+    return f"logs/ML/{log_subdir}"
+
+
+def selection_settings(args):
+    """features_selection parameters set by the command-line options of args."""
+    settings = {}
+    # RFE elimination schedule
+    if args.elimination_step is not None:
+        settings["elimination_step"] = args.elimination_step
+
+    # Stability-driven number of RFE runs
+    if args.adaptive_runs is not None:
+        settings.update(adaptive_runs=True, adaptive_max_runs=args.adaptive_runs)
+
+    # Univariate pre-filter before BoostRFE, when any of its stages is set
+    if any(option is not None for option in (args.prefilter_top_k, args.prefilter_variance, args.prefilter_corr)):
+        settings.update(prefilter_top_k=args.prefilter_top_k, prefilter_statistic=args.prefilter_stat,
+                        prefilter_variance=args.prefilter_variance, prefilter_correlation=args.prefilter_corr)
+
+    # Per-contrast tests on the final features
+    if args.contrasts is not None:
+        settings.update(contrast_kind=args.contrasts, contrast_reference=args.contrast_reference,
+                        contrast_correction=args.contrast_correction)
+
+    # Sharded permutation test of the final features
+    if args.sharded_permutations is not None:
+        settings.update(sharded_permutations=args.sharded_permutations,
+                        permutation_shards_count=args.permutation_shards)
+
+    # Result store
+    if args.no_result_store:
+        settings["store_results"] = False
+    elif args.result_store is not None:
+        settings["result_store_path"] = args.result_store
+    return settings
+
+
+def run(args, log_dir, at_exit=True):
+    """
+    Runs the feature selection of one input, logging to log_dir.
+
+    The features_selection parameters set by the options are restored
+    afterwards, so that a resident worker can run several jobs in one process.
+    at_exit=False writes the profiling summary at the end of the run instead of
+    at process exit.
+    """
+    # Setup separate loggers for your different tasks
+    logger_functions = mylogging.setup_logger("ML.Functions", f"{log_dir}/__Functions__.log")
+    logger_write = mylogging.setup_logger("ML.WriteToFile", f"{log_dir}/__WriteToFile__.log")
+    logger_upload = mylogging.setup_logger("ML.UploadFile",f"{log_dir}/__uploadFile__.log")
+    logger_dfChecks = mylogging.setup_logger("ML.dfChecks",f"{log_dir}/__DataFrameChecks__.log")
+    logger_stats = mylogging.setup_logger("ML.Statistics",f"{log_dir}/__Stats__.log")
+    logger_metrics = mylogging.setup_logger("ML.Metrics",f"{log_dir}/__Metrics__.log")
+
+    # Spans of every stage go to metrics.jsonl; the summary table is written at exit
+    profiler = profiling.setup_profiler(f"{log_dir}/metrics.jsonl", logger=logger_metrics, at_exit=at_exit)
+
+    # the train/validation data contains only numerical entries and 1 categorical #entry for the Diagnostic_status
+    dataframe = pd.DataFrame()
+
+    logger_upload.info("Inside the "+name+" module")
+    try:
+        pd.options.display.float_format = '{:.6f}'.format
+        csv_file = args.input
+        if not os.path.exists(csv_file):
+            logger_upload.error(f"File does not exist: {csv_file}")
+            sys.exit(2)
+        # csv_file = "/Users/avo/Eclipse/workspace/cfDNA-Biomarkers/CNA_compositions/2025-05-19_19-35/importantRegions_disease-severe.csv"
+        print("CSV path:", csv_file)
+        with profiling.span("load_dataset"):
+            dataframe = data_loading.load_dataset(csv_file, float32=args.float32,
+                                                  labels_path=args.labels, columns_path=args.columns)
+        logger_upload.info(f"Loaded {dataframe.shape[0]} samples x {dataframe.shape[1] - 1} regions from {csv_file}")
+        # print("Columns:", dataframe.columns)
+    except Exception as e:
+        logger_upload.error("An exception occurred:", exc_info=True)
+
+    n_col = len(dataframe.columns)
+
+    dataframe.head()
+
+    #dropping any column with null values
+    logger_dfChecks.info("Inside the "+name+" module")
+    try:
+        if sum(dataframe.iloc[:,0:(n_col-1)].isnull().any()) != 0:
+            df = (dataframe.iloc[:,0:(n_col-1)]).dropna(axis=1)
+            df['Diagnostic_status'] = dataframe['Diagnostic_status']
+        elif sum(dataframe.iloc[:,0:(n_col-1)].isnull().any()) == 0 :
+            df = dataframe
+    except Exception as e:
+        logger_dfChecks.error("An exception occurred:", exc_info=True)
+
+    # Save the original column names
+    original_columns = df.columns.astype(str)
+
+    # Save mapping before renaming
+    name_map = dict(zip(original_columns.str.replace("-", "_"), original_columns))
+
+    settings = selection_settings(args)
+    previous = {key: getattr(features_selection, key) for key in settings}
+    for key, value in settings.items():
+        setattr(features_selection, key, value)
+
+    state_dir = args.state_dir
+    if args.incremental and not state_dir:
+        state_dir = os.path.splitext(args.output)[0] + "_state"
+
+    # %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+    try:
+        with profiling.span("calc_stat_sign_feat", size=args.size):
+            return features_selection.calc_stat_sign_feat(df,args.output,args.size,name_map,logger_functions, logger_write,logger_stats,
+                                                          search=args.size_search,
+                                                          checkpoint_dir=None if args.no_checkpoint else (args.checkpoint_dir or f"{log_dir}/checkpoint"),
+                                                          state_dir=state_dir, incremental_run=args.incremental)
+    finally:
+        for key, value in previous.items():
+            setattr(features_selection, key, value)
+        if not at_exit:
+            profiler.close()
+
+
+def main():
+    args = parse_args()
+    run(args, default_log_dir())
+
+
+# Guard needed by the process pools of the FeatureSelection module, which
+# use the 'spawn' start method and re-import this script in every worker
+if __name__ == "__main__":
+    main()
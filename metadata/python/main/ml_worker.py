@@ -0,0 +1,308 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+import sys
+import os
+# Get the directory where the current script is located
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+# Add custom module folders relative to the script location
+sys.path.insert(0, os.path.join(parent_dir, 'Mylogging'))
+sys.path.insert(0, os.path.join(parent_dir, 'FeatureSelection'))
+
+import json
+import time
+import socket
+import argparse
+import platform
+import socketserver
+
+#Logging module
+import mylogging
+
+# Entry point of a single feature selection (argument parsing and run)
+import jcna_featureSelect
+
+# %%%%%%%%%%%%%
+name = "Worker"
+# %%%%%%%%%%%%%
+
+# Sub-directories of a queue directory
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+# A worker exits when this file appears in the queue directory
+STOP_FILE = "STOP"
+
+
+def warm_up(logger=None):
+    """
+    Loads the heavy dependencies and runs a tiny XGBoost fit, so that imports,
+    OpenMP thread pools and BLAS are initialised once for all the jobs.
+    """
+    start = time.perf_counter()
+    import numpy as np
+    import xgboost as xgb
+    import sklearn.model_selection  # noqa: F401
+    import sklearn.metrics  # noqa: F401
+    import scipy.spatial.distance  # noqa: F401
+
+    rng = np.random.default_rng(0)
+    X = rng.standard_normal((40, 5))
+    y = np.arange(40) % 2
+    xgb.XGBClassifier(n_estimators=2, max_depth=2).fit(X, y)
+    if logger:
+        logger.info(f"Worker warmed up in {time.perf_counter() - start:.2f} s")
+
+
+def job_name(job):
+    return job.get("name") or os.path.splitext(os.path.basename(job["output"]))[0]
+
+
+def run_job(job, log_root, logger):
+    """
+    Runs one job in this process and returns its status record.
+
+    A job is a dict with the jcna_featureSelect arguments: input, output, size
+    and optionally args (list of extra command-line options) and name (log
+    sub-directory, default: output file stem).
+    """
+    jname = job_name(job)
+    log_dir = os.path.join(log_root, jname)
+    status = {"name": jname, "input": job.get("input"), "output": job.get("output"), "log_dir": log_dir}
+    start = time.perf_counter()
+    try:
+        argv = [job["input"], job["output"], str(job["size"])] + [str(a) for a in job.get("args", [])]
+        args = jcna_featureSelect.parse_args(argv)
+        status["final_size"] = jcna_featureSelect.run(args, log_dir, at_exit=False)
+        status["status"] = "done"
+    except SystemExit as e:
+        # The feature selection exits with a status code on errors (see its logs)
+        status.update(status="failed", error=f"exit status {e.code}")
+    except Exception as e:
+        logger.exception(f"Job {jname} failed")
+        status.update(status="failed", error=repr(e))
+    status["wall_s"] = round(time.perf_counter() - start, 3)
+    logger.info(f"Job {jname}: {status['status']} in {status['wall_s']:.2f} s")
+    return status
+
+
+# %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+# Queue directory: <queue>/pending/*.json -> running/ -> done/ or failed/
+
+def _write_json(path, obj):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(obj, f, indent=1, default=str)
+    os.replace(tmp, path)
+
+
+def submit_to_queue(queue_dir, job):
+    """Adds a job to the pending queue (atomic write); returns its file name."""
+    os.makedirs(os.path.join(queue_dir, PENDING), exist_ok=True)
+    file_name = f"{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{job_name(job)}.json"
+    _write_json(os.path.join(queue_dir, PENDING, file_name), job)
+    return file_name
+
+
+def _running_name(file_name):
+    # Host and pid of the worker running the job, to recover it if the worker dies
+    return f"{file_name[:-len('.json')]}@{platform.node()}.{os.getpid()}.json"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def recover_stale_jobs(queue_dir, logger):
+    """Moves back to pending the jobs left running by dead workers of this host."""
+    running_dir = os.path.join(queue_dir, RUNNING)
+    for running in os.listdir(running_dir):
+        stem, _, owner = running[:-len(".json")].rpartition("@")
+        host, _, pid = owner.rpartition(".")
+        if host != platform.node() or not pid.isdigit() or _pid_alive(int(pid)):
+            continue
+        try:
+            os.replace(os.path.join(running_dir, running), os.path.join(queue_dir, PENDING, f"{stem}.json"))
+            logger.warning(f"Requeued job {stem} of dead worker {owner}")
+        except FileNotFoundError:
+            pass
+
+
+def claim_job(queue_dir):
+    """
+    Takes the oldest pending job by renaming it into running/ (atomic, so
+    several workers can share a queue). Returns (file name, running path, job) or None.
+    """
+    for file_name in sorted(os.listdir(os.path.join(queue_dir, PENDING))):
+        if not file_name.endswith(".json"):
+            continue
+        running = os.path.join(queue_dir, RUNNING, _running_name(file_name))
+        try:
+            os.rename(os.path.join(queue_dir, PENDING, file_name), running)
+        except FileNotFoundError:
+            # Claimed by another worker
+            continue
+        with open(running) as f:
+            return file_name, running, json.load(f)
+    return None
+
+
+def serve_queue(queue_dir, log_root, logger, poll=1.0, idle_timeout=600.0):
+    """
+    Runs the jobs of a queue directory until it has been idle for idle_timeout
+    seconds (0: never) or <queue>/STOP exists. Returns the number of jobs run.
+    """
+    for sub in (PENDING, RUNNING, DONE, FAILED):
+        os.makedirs(os.path.join(queue_dir, sub), exist_ok=True)
+    recover_stale_jobs(queue_dir, logger)
+    logger.info(f"Serving queue {queue_dir}")
+
+    n_jobs = 0
+    idle_since = time.monotonic()
+    while not os.path.exists(os.path.join(queue_dir, STOP_FILE)):
+        claimed = claim_job(queue_dir)
+        if claimed is None:
+            if idle_timeout and time.monotonic() - idle_since > idle_timeout:
+                logger.info(f"Queue idle for {idle_timeout:.0f} s, stopping")
+                break
+            time.sleep(poll)
+            continue
+
+        file_name, running, job = claimed
+        status = run_job(job, log_root, logger)
+        _write_json(os.path.join(queue_dir, DONE if status["status"] == "done" else FAILED, file_name),
+                    {"job": job, "result": status})
+        os.remove(running)
+        n_jobs += 1
+        idle_since = time.monotonic()
+
+    logger.info(f"Worker stopping after {n_jobs} jobs")
+    return n_jobs
+
+
+# %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+# Unix socket: one JSON job per line, answered with one JSON status line
+
+class _JobHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            reply = {"status": "failed", "error": f"invalid request: {e}"}
+        else:
+            command = request.get("command", "run")
+            if command == "ping":
+                reply = {"status": "ok", "pid": os.getpid(), "jobs": self.server.n_jobs}
+            elif command == "shutdown":
+                self.server.stopping = True
+                reply = {"status": "ok"}
+            else:
+                reply = run_job(request, self.server.log_root, self.server.logger)
+                self.server.n_jobs += 1
+        self.wfile.write((json.dumps(reply, default=str) + "\n").encode())
+
+
+def serve_socket(socket_path, log_root, logger, idle_timeout=600.0):
+    """
+    Runs the jobs sent to a Unix socket, one at a time, until a shutdown
+    command or idle_timeout seconds without requests (0: never).
+    Returns the number of jobs run.
+    """
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = socketserver.UnixStreamServer(socket_path, _JobHandler)
+    server.log_root, server.logger = log_root, logger
+    server.n_jobs, server.stopping = 0, False
+    server.timeout = 1.0
+    logger.info(f"Serving socket {socket_path}")
+
+    idle_since = time.monotonic()
+    try:
+        while not server.stopping:
+            jobs_before = server.n_jobs
+            server.handle_request()
+            if server.n_jobs != jobs_before:
+                idle_since = time.monotonic()
+            elif idle_timeout and time.monotonic() - idle_since > idle_timeout:
+                logger.info(f"Socket idle for {idle_timeout:.0f} s, stopping")
+                break
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+    logger.info(f"Worker stopping after {server.n_jobs} jobs")
+    return server.n_jobs
+
+
+def send_to_socket(socket_path, request):
+    """Sends a request to a worker socket and returns its reply (waits for the job to finish)."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall((json.dumps(request) + "\n").encode())
+        with client.makefile("r") as reply:
+            return json.loads(reply.readline())
+
+
+# %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Resident feature-selection worker: runs many "
+                                                 "(input, output, size) jobs in one warm process")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="run jobs from a queue directory or a Unix socket")
+    source = serve.add_mutually_exclusive_group(required=True)
+    source.add_argument("--queue-dir", help="queue directory (pending/, running/, done/, failed/)")
+    source.add_argument("--socket", help="Unix socket path")
+    serve.add_argument("--log-dir", default=None,
+                       help="root of the per-job log directories (default: logs/ML/<job>_<task>)")
+    serve.add_argument("--idle-timeout", type=float, default=600.0, help="seconds without jobs before exiting (0: never)")
+    serve.add_argument("--poll", type=float, default=1.0, help="queue polling interval in seconds")
+
+    submit = commands.add_parser("submit", help="submit a job; options after size are passed to jcna_featureSelect")
+    target = submit.add_mutually_exclusive_group(required=True)
+    target.add_argument("--queue-dir", help="queue directory")
+    target.add_argument("--socket", help="Unix socket path (waits for the result)")
+    submit.add_argument("--name", default=None, help="job name (default: output file stem)")
+    submit.add_argument("input")
+    submit.add_argument("output")
+    submit.add_argument("size", type=int)
+    submit.add_argument("options", nargs=argparse.REMAINDER)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+
+    if args.command == "submit":
+        job = {"input": args.input, "output": args.output, "size": args.size, "args": args.options}
+        if args.name:
+            job["name"] = args.name
+        if args.queue_dir:
+            print(submit_to_queue(args.queue_dir, job))
+            return
+        reply = send_to_socket(args.socket, job)
+        print(json.dumps(reply))
+        sys.exit(0 if reply.get("status") == "done" else 1)
+
+    log_root = args.log_dir or jcna_featureSelect.default_log_dir()
+    logger = mylogging.setup_logger("ML.Worker", f"{log_root}/__Worker__.log")
+    logger.info("Inside the " + name + " module")
+    warm_up(logger)
+    if args.queue_dir:
+        serve_queue(args.queue_dir, log_root, logger, poll=args.poll, idle_timeout=args.idle_timeout)
+    else:
+        serve_socket(args.socket, log_root, logger, idle_timeout=args.idle_timeout)
+
+
+# Guard needed by the process pools of the FeatureSelection module ('spawn' start method)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,635 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+import sys
+import os
+# Get the directory where the current script is located
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+# Add custom module folders relative to the script location
+sys.path.insert(0, os.path.join(parent_dir, 'Mylogging'))
+sys.path.insert(0, os.path.join(parent_dir, 'FeatureSelection'))
+
+import glob
+import json
+import time
+import queue
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+
+#Logging module
+import mylogging
+
+# Cores of the job
+import parallel
+
+# %%%%%%%%%%%%%
+name = "Preprocessing"
+# %%%%%%%%%%%%%
+
+TOOLS = ("fastqc", "trimmomatic", "bowtie2", "samtools", "multiqc")
+
+# Memory of the job when neither GALAXY_MEMORY_MB nor --mem-mb is set (as run_pipeline_module2to6.sh)
+DEFAULT_MEM_MB = 32000
+
+# Resources of the stages: (min, max) threads and memory (MB). fastqc runs one thread per
+# file, so it gets at most one core per input file
+FASTQC_MEM_MB_PER_THREAD = 512
+TRIMMOMATIC_THREADS = (1, 4)
+TRIMMOMATIC_MEM_MB = 2048
+ALIGN_MIN_THREADS = 2
+# samtools sort of the bowtie2 stream: extra threads and memory per thread (-@, -m)
+SORT_THREADS = 2
+SORT_MEM_MB_PER_THREAD = 768
+MULTIQC_MEM_MB = 1024
+
+# Launch order among the stages ready to run: the stages of the critical path
+# (trimming, then alignment) first, fastqc and multiqc in the remaining cores
+PRIORITY = {"copy": 5, "align": 4, "trimmomatic": 3, "fastqc_raw": 2, "fastqc_trimmed": 2,
+            "fastqc_bam": 2, "multiqc": 1}
+
+TRIMMOMATIC_STEPS = ("ILLUMINACLIP:{adapter}:2:30:10", "SLIDINGWINDOW:4:20", "MAXINFO:25:0.2", "MINLEN:60")
+
+
+class Stage:
+    """
+    One step of the preprocessing DAG.
+
+    Parameters:
+    - key: unique name, "<subfolder>/<sample>/<kind>" (or "<subfolder>/<kind>_<set>" for multiqc)
+    - kind: stage kind (see PRIORITY)
+    - deps: keys of the stages that must have succeeded first
+    - after: keys of the stages that must have finished first, whatever their status
+    - threads: (min, max) cores
+    - mem_mb: memory estimate
+    - commands: callable(threads) -> list of (argv, stderr file) run as a pipeline, the
+      standard output of each command feeding the next; None for a Python action
+    - action: callable() run instead of commands (e.g. copying the final BAM)
+    - skip_if: callable() -> reason not to run the stage (checked at launch), or None
+    - outputs: files (or glob patterns) removed if the stage fails, so that a truncated
+      output (e.g. a BAM sorted from an interrupted alignment) is never taken for a complete one
+    - log: file receiving the standard output of the last command
+    - order: position of the sample, earlier samples first among equal priorities
+    """
+
+    def __init__(self, key, kind, deps=(), after=(), threads=(1, 1), mem_mb=0, commands=None, action=None,
+                 skip_if=None, outputs=(), log=None, order=0):
+        self.key = key
+        self.kind = kind
+        self.deps = list(deps)
+        self.after = list(after)
+        self.threads = threads
+        self.mem_mb = mem_mb
+        self.commands = commands
+        self.action = action
+        self.skip_if = skip_if
+        self.outputs = list(outputs)
+        self.log = log
+        self.order = order
+
+
+def run_pipeline(commands, stdout_file):
+    """
+    Runs commands [(argv, stderr file)] as a shell pipeline (argv1 | argv2 | ...),
+    without intermediate files. The standard output of the last command goes to
+    stdout_file. Returns the first non-zero exit status (pipefail), or 0.
+    """
+    procs = []
+    handles = []
+    try:
+        stdin = None
+        for i, (argv, stderr_file) in enumerate(commands):
+            last = i == len(commands) - 1
+            err = open(stderr_file, "ab")
+            handles.append(err)
+            if last:
+                out = open(stdout_file, "ab") if stdout_file != stderr_file else err
+                handles.append(out)
+            else:
+                out = subprocess.PIPE
+            proc = subprocess.Popen(argv, stdin=stdin, stdout=out, stderr=err)
+            if stdin is not None:
+                # Only the next command reads the pipe, so that an early exit reaches the writer
+                stdin.close()
+            stdin = proc.stdout
+            procs.append(proc)
+        codes = [proc.wait() for proc in procs]
+    except BaseException:
+        for proc in procs:
+            proc.kill()
+        raise
+    finally:
+        for handle in handles:
+            handle.close()
+    return next((code for code in codes if code != 0), 0)
+
+
+class Scheduler:
+    """
+    Runs the stages of a DAG concurrently under a shared budget of cores and
+    memory. At every completion, the ready stages (all dependencies succeeded)
+    are launched by priority, then sample order. A stage gets a share of the free
+    cores between its min and max threads. If the first ready stage does not fit,
+    its cores and memory are reserved and only smaller stages are backfilled
+    into the rest, so that the alignments are not starved by short fastqc runs.
+    The dependents of a failed stage are skipped and its outputs removed;
+    other samples continue.
+
+    Every finished stage writes one JSON line to timings_file: sample stage key,
+    kind, start, wall_s, threads, mem_mb, status ("done", "failed", "skipped"),
+    returncode and error.
+    """
+
+    def __init__(self, stages, cores, mem_mb, logger, timings_file):
+        self.stages = {stage.key: stage for stage in stages}
+        self.cores = max(1, int(cores))
+        self.mem_mb = mem_mb
+        self.logger = logger
+        self.timings_file = timings_file
+        self.status = {}
+        self.records = []
+        # Largest number of cores and memory in use at once
+        self.peak_cores = 0
+        self.peak_mem_mb = 0
+
+    def _record(self, stage, status, start=None, wall=0.0, threads=0, returncode=None, error=None):
+        record = {
+            "stage": stage.key,
+            "kind": stage.kind,
+            "start": start,
+            "wall_s": round(wall, 3),
+            "threads": threads,
+            "mem_mb": stage.mem_mb,
+            "status": status,
+            "returncode": returncode,
+            "error": error,
+        }
+        self.status[stage.key] = status
+        self.records.append(record)
+        with open(self.timings_file, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        return record
+
+    def _run(self, stage, threads, done):
+        """Worker thread: runs one stage and reports (key, threads, start, wall, returncode, error)."""
+        start = datetime.now().isoformat(timespec="seconds")
+        wall = time.perf_counter()
+        returncode, error = None, None
+        try:
+            if stage.action is not None:
+                stage.action()
+                returncode = 0
+            else:
+                returncode = run_pipeline(stage.commands(threads), stage.log)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        done.put((stage.key, threads, start, time.perf_counter() - wall, returncode, error))
+
+    def _remove_outputs(self, stage):
+        for pattern in stage.outputs:
+            for path in glob.glob(pattern):
+                try:
+                    os.remove(path)
+                    self.logger.info(f"{stage.key}: removed incomplete output {path}")
+                except OSError as e:
+                    self.logger.warning(f"{stage.key}: could not remove {path}: {e}")
+
+    def _fits(self, stage, free_cores, free_mem):
+        # Stages larger than the whole budget run alone
+        return (free_cores >= min(stage.threads[0], self.cores)
+                and free_mem >= min(stage.mem_mb, self.mem_mb))
+
+    def run(self):
+        """Runs every stage; returns {key: status}."""
+        pending = dict(self.stages)
+        running = {}
+        free_cores, free_mem = self.cores, self.mem_mb
+        done = queue.Queue()
+        wall = time.perf_counter()
+
+        while pending or running:
+            for key, stage in list(pending.items()):
+                failed = [dep for dep in stage.deps if self.status.get(dep) in ("failed", "skipped")]
+                if failed:
+                    del pending[key]
+                    self._record(stage, "skipped", error=f"dependency {failed[0]} not completed")
+
+            ready = sorted((stage for stage in pending.values()
+                            if all(self.status.get(dep) == "done" for dep in stage.deps)
+                            and all(key in self.status for key in stage.after)),
+                           key=lambda s: (-PRIORITY[s.kind], s.order))
+            reserved_cores, reserved_mem = 0, 0
+            for i, stage in enumerate(ready):
+                available_cores, available_mem = free_cores - reserved_cores, free_mem - reserved_mem
+                if not self._fits(stage, available_cores, available_mem):
+                    if not reserved_cores and not reserved_mem:
+                        reserved_cores = min(stage.threads[0], self.cores)
+                        reserved_mem = min(stage.mem_mb, self.mem_mb)
+                    continue
+                del pending[stage.key]
+                reason = stage.skip_if() if stage.skip_if else None
+                if reason:
+                    self._record(stage, "skipped", error=reason)
+                    self.logger.info(f"{stage.key}: {reason}, skipped")
+                    continue
+                low, high = min(stage.threads[0], self.cores), stage.threads[1]
+                threads = min(high, available_cores, max(low, available_cores // (len(ready) - i)))
+                free_cores -= threads
+                free_mem -= min(stage.mem_mb, self.mem_mb)
+                running[stage.key] = threads
+                self.peak_cores = max(self.peak_cores, self.cores - free_cores)
+                self.peak_mem_mb = max(self.peak_mem_mb, self.mem_mb - free_mem)
+                self.logger.info(f"{stage.key}: started with {threads} threads ({free_cores} cores free)")
+                threading.Thread(target=self._run, args=(stage, threads, done), daemon=True).start()
+
+            if not running:
+                if pending:
+                    # Only reachable if dependencies are missing from the DAG
+                    for key, stage in list(pending.items()):
+                        del pending[key]
+                        self._record(stage, "skipped", error="unresolved dependencies")
+                continue
+
+            key, threads, start, stage_wall, returncode, error = done.get()
+            stage = self.stages[key]
+            del running[key]
+            free_cores += threads
+            free_mem += min(stage.mem_mb, self.mem_mb)
+            status = "done" if returncode == 0 and error is None else "failed"
+            self._record(stage, status, start, stage_wall, threads, returncode, error)
+            if status == "done":
+                self.logger.info(f"{key}: done in {stage_wall:.1f} s")
+            else:
+                self.logger.error(f"{key}: failed ({error or f'exit status {returncode}'}), see {stage.log}")
+                self._remove_outputs(stage)
+
+        self.wall_s = time.perf_counter() - wall
+        return dict(self.status)
+
+    def summary(self):
+        """Text table of the wall time by stage kind, with the makespan and the core utilization."""
+        rows = {}
+        for record in self.records:
+            row = rows.setdefault(record["kind"], {"count": 0, "failed": 0, "wall": 0.0, "core_s": 0.0})
+            row["count"] += 1
+            row["failed"] += record["status"] != "done"
+            row["wall"] += record["wall_s"]
+            row["core_s"] += record["wall_s"] * record["threads"]
+        lines = [f"{'stage':<15}  {'count':>5}  {'not_done':>8}  {'wall_s':>10}  {'mean_s':>9}  {'core_s':>10}"]
+        for kind, row in rows.items():
+            lines.append(f"{kind:<15}  {row['count']:>5}  {row['failed']:>8}  {row['wall']:>10.1f}  "
+                         f"{row['wall'] / row['count']:>9.1f}  {row['core_s']:>10.1f}")
+        used = sum(row["core_s"] for row in rows.values())
+        wall = getattr(self, "wall_s", 0.0)
+        utilization = used / (self.cores * wall) if wall else 0.0
+        lines.append(f"Makespan {wall:.1f} s on {self.cores} cores, {self.mem_mb} MB: "
+                     f"core utilization {100 * utilization:.0f}%, peak {self.peak_cores} cores, "
+                     f"{self.peak_mem_mb} MB")
+        return "\n".join(lines)
+
+
+def discover_samples(path_to_data, logger):
+    """
+    Paired samples of the subfolders of path_to_data, as reads_preprocessing.sh:
+    <subfolder>/<base>_R1.fastq.gz with its <base>_R2.fastq.gz.
+
+    Returns a list of sample dicts (subfolder, dir, base), in subfolder and file order.
+    """
+    samples = []
+    for subdir in sorted(glob.glob(os.path.join(path_to_data.rstrip("/"), "*", ""))):
+        subdir = subdir.rstrip("/")
+        files = sorted(glob.glob(os.path.join(subdir, "*_R1.fastq.gz")))
+        if not files:
+            logger.info(f"No R1 fastq files found in {subdir}, skipping.")
+            continue
+        for path in files:
+            base = os.path.basename(path).split("_R1")[0]
+            if not os.path.isfile(os.path.join(subdir, f"{base}_R2.fastq.gz")):
+                logger.warning(f"Missing paired files for sample {base} in {subdir}. Skipping.")
+                continue
+            samples.append({"subfolder": os.path.basename(subdir), "dir": subdir, "base": base})
+    return samples
+
+
+def output_dirs(path_to_data, data_subdir, subdir):
+    """Output folders of a subfolder, as in reads_preprocessing.sh."""
+    sub = os.path.basename(subdir)
+    return {
+        "untrimm_log": os.path.join(subdir, "untrimm", "log"),
+        "untrimm_fastqc": os.path.join(subdir, "untrimm", "untrimm_fastqc"),
+        "untrimm_multiqc": os.path.join(subdir, "untrimm", "untrimm_fastqc", "untrimm_multiqc"),
+        "trimm": os.path.join(path_to_data, "trimm", data_subdir, sub),
+        "trimm_log": os.path.join(path_to_data, "trimm", "log", data_subdir, sub),
+        "trimm_fastqc": os.path.join(path_to_data, "trimm", "trimm_fastqc", data_subdir, sub),
+        "trimm_multiqc": os.path.join(path_to_data, "trimm", "trimm_fastqc", "trimm_multiqc", data_subdir, sub),
+        "mapped": os.path.join(path_to_data, "mapped", data_subdir, sub),
+        "mapped_log": os.path.join(path_to_data, "mapped", "log", data_subdir, sub),
+        "mapped_fastqc": os.path.join(path_to_data, "mapped", "mapped_fastqc", data_subdir, sub),
+        "mapped_multiqc": os.path.join(path_to_data, "mapped", "mapped_fastqc", "mapped_multiqc", data_subdir, sub),
+    }
+
+
+def index_mem_mb(genome_index):
+    """Memory of a bowtie2 index: the size of its .bt2/.bt2l files (MB), at least 256."""
+    size = sum(os.path.getsize(path) for path in glob.glob(f"{genome_index}*.bt2*"))
+    return max(256, int(size / 2**20))
+
+
+def final_bam(dirs, base):
+    """Deduplicated BAM if present, else the sorted BAM (as reads_preprocessing.sh)."""
+    deduplicated = os.path.join(dirs["mapped"], f"{base}_sort_ndp.bam")
+    return deduplicated if os.path.isfile(deduplicated) else os.path.join(dirs["mapped"], f"{base}_sort.bam")
+
+
+def build_stages(samples, path_to_data, data_subdir, adapter, genome_index, output_dir, log_dir, tools, max_cores):
+    """
+    Stage DAG of the samples: per sample fastqc (raw) and trimmomatic on the
+    raw reads, fastqc (trimmed) after trimming, bowtie2 | samtools sort after
+    trimming, fastqc (BAM) and the copy of the BAM to output_dir/<subfolder>
+    after the alignment; per subfolder, multiqc of every fastqc set once the
+    fastqc stages of its samples have finished or been skipped.
+
+    Parameters:
+    - samples: discover_samples result
+    - tools: {tool: executable}
+    - max_cores: cores of the job (upper bound of the alignment threads)
+    """
+    stages = []
+    align_mem = index_mem_mb(genome_index) + SORT_THREADS * SORT_MEM_MB_PER_THREAD
+    by_subfolder = {}
+
+    for order, sample in enumerate(samples):
+        subdir, base, sub = sample["dir"], sample["base"], sample["subfolder"]
+        dirs = output_dirs(path_to_data, data_subdir, subdir)
+        for directory in dirs.values():
+            os.makedirs(directory, exist_ok=True)
+        stage_logs = os.path.join(log_dir, sub, base)
+        os.makedirs(stage_logs, exist_ok=True)
+        key = f"{sub}/{base}"
+        raw = [os.path.join(subdir, f"{base}_R1.fastq.gz"), os.path.join(subdir, f"{base}_R2.fastq.gz")]
+        paired = [os.path.join(dirs["trimm"], f"{base}_1-trimmP.fastq.gz"),
+                  os.path.join(dirs["trimm"], f"{base}_2-trimmP.fastq.gz")]
+        unpaired = [os.path.join(dirs["trimm"], f"{base}_1-trimmU.fastq.gz"),
+                    os.path.join(dirs["trimm"], f"{base}_2-trimmU.fastq.gz")]
+        sorted_bam = os.path.join(dirs["mapped"], f"{base}_sort.bam")
+
+        def fastqc(files, out_dir, fmt, log):
+            return lambda threads: [([tools["fastqc"], "-t", str(threads), "--noextract", "-f", fmt, "-o", out_dir]
+                                     + (files() if callable(files) else files), log)]
+
+        def trimmomatic(threads, raw=raw, dirs=dirs, base=base, paired=paired, unpaired=unpaired,
+                        log=os.path.join(stage_logs, "trimmomatic.log")):
+            return [([tools["trimmomatic"], "PE", "-threads", str(threads), "-phred33",
+                      "-trimlog", os.path.join(dirs["trimm_log"], f"trimm_{base}_log.log")]
+                     + raw + [paired[0], unpaired[0], paired[1], unpaired[1]]
+                     + [step.format(adapter=adapter) for step in TRIMMOMATIC_STEPS], log)]
+
+        def align(threads, base=base, dirs=dirs, paired=paired, sorted_bam=sorted_bam,
+                  log=os.path.join(stage_logs, "align.log")):
+            # bowtie2 writes SAM to its standard output, sorted by samtools without a .sam file
+            sort_threads = min(SORT_THREADS, max(1, threads // 4))
+            bowtie2_threads = max(1, threads - sort_threads)
+            return [([tools["bowtie2"], "--threads", str(bowtie2_threads), "--phred33", "--local",
+                      "--minins", "100", "--maxins", "600", "--no-discordant", "--no-mixed",
+                      "-x", genome_index, "-1", paired[0], "-2", paired[1]],
+                     os.path.join(dirs["mapped_log"], f"bowtie2_{base}_logfile.log")),
+                    ([tools["samtools"], "sort", "-@", str(sort_threads), "-m", f"{SORT_MEM_MB_PER_THREAD}M",
+                      "-T", os.path.join(dirs["mapped"], f"{base}.sort_tmp"), "-o", sorted_bam, "-"], log)]
+
+        def copy(dirs=dirs, base=base, sub=sub):
+            target_dir = os.path.join(output_dir, sub)
+            os.makedirs(target_dir, exist_ok=True)
+            bam = final_bam(dirs, base)
+            shutil.copy(bam, os.path.join(target_dir, os.path.basename(bam)))
+
+        log = lambda kind: os.path.join(stage_logs, f"{kind}.log")
+        stages += [
+            Stage(f"{key}/fastqc_raw", "fastqc_raw", threads=(1, 2), mem_mb=2 * FASTQC_MEM_MB_PER_THREAD,
+                  commands=fastqc(raw, dirs["untrimm_fastqc"], "fastq", log("fastqc_raw")), log=log("fastqc_raw"),
+                  order=order),
+            Stage(f"{key}/trimmomatic", "trimmomatic", threads=TRIMMOMATIC_THREADS, mem_mb=TRIMMOMATIC_MEM_MB,
+                  commands=trimmomatic, outputs=paired + unpaired, log=log("trimmomatic"), order=order),
+            Stage(f"{key}/fastqc_trimmed", "fastqc_trimmed", deps=[f"{key}/trimmomatic"], threads=(1, 4),
+                  mem_mb=4 * FASTQC_MEM_MB_PER_THREAD,
+                  commands=fastqc(paired + unpaired, dirs["trimm_fastqc"], "fastq", log("fastqc_trimmed")),
+                  log=log("fastqc_trimmed"), order=order),
+            Stage(f"{key}/align", "align", deps=[f"{key}/trimmomatic"], threads=(ALIGN_MIN_THREADS, max_cores),
+                  mem_mb=align_mem, commands=align,
+                  outputs=[sorted_bam, os.path.join(dirs["mapped"], f"{base}.sort_tmp.*.bam")],
+                  log=log("align"), order=order),
+            Stage(f"{key}/fastqc_bam", "fastqc_bam", deps=[f"{key}/align"], threads=(1, 1),
+                  mem_mb=FASTQC_MEM_MB_PER_THREAD,
+                  commands=fastqc(lambda dirs=dirs, base=base: [final_bam(dirs, base)], dirs["mapped_fastqc"],
+                                  "bam", log("fastqc_bam")),
+                  log=log("fastqc_bam"), order=order),
+            Stage(f"{key}/copy", "copy", deps=[f"{key}/align"], action=copy, log=log("copy"), order=order),
+        ]
+        by_subfolder.setdefault(sub, {"dirs": dirs, "fastqc": [], "order": order})["fastqc"] += [
+            f"{key}/fastqc_raw", f"{key}/fastqc_trimmed", f"{key}/fastqc_bam"]
+
+    # MultiQC of every fastqc set of a subfolder, once its fastqc stages have run (failed or not)
+    for sub, group in by_subfolder.items():
+        dirs = group["dirs"]
+        for fastqc_set, kind in (("untrimm", "fastqc_raw"), ("trimm", "fastqc_trimmed"), ("mapped", "fastqc_bam")):
+            fastqc_dir, multiqc_dir = dirs[f"{fastqc_set}_fastqc"], dirs[f"{fastqc_set}_multiqc"]
+            log = os.path.join(log_dir, sub, f"multiqc_{fastqc_set}.log")
+
+            def skip_if(fastqc_dir=fastqc_dir):
+                if not glob.glob(os.path.join(fastqc_dir, "*.zip")):
+                    return "no FASTQC zip files"
+                return None
+
+            stages.append(Stage(
+                f"{sub}/multiqc_{fastqc_set}", "multiqc",
+                after=[key for key in group["fastqc"] if key.endswith(kind)], mem_mb=MULTIQC_MEM_MB,
+                commands=lambda threads, fastqc_dir=fastqc_dir, multiqc_dir=multiqc_dir, log=log, fastqc_set=fastqc_set:
+                    [([tools["multiqc"], fastqc_dir, "-o", multiqc_dir, "-n", f"multiqc_{fastqc_set}_{data_subdir}"], log)],
+                skip_if=skip_if, log=log, order=group["order"]))
+    return stages
+
+
+# Stand-ins of the tools for --self-test: they write the files the stages expect.
+# bowtie2 streams SAM_RECORDS records and fails (exit 3) for samples named FAIL,
+# after part of its output, as an interrupted alignment does
+SAM_RECORDS = 200
+STUB_TOOLS = {
+    "fastqc": """#!/bin/bash
+out=""; files=()
+while [ $# -gt 0 ]; do case $1 in -t|-f) shift 2;; --noextract) shift;; -o) out=$2; shift 2;; *) files+=("$1"); shift;; esac; done
+sleep 0.2
+for f in "${files[@]}"; do [ -e "$f" ] || exit 2; touch "$out/$(basename "$f")_fastqc.zip"; done
+""",
+    "trimmomatic": """#!/bin/bash
+# PE -threads T -phred33 -trimlog LOG R1 R2 P1 U1 P2 U2 STEPS...
+touch "$6"
+for out in "$9" "${10}" "${11}" "${12}"; do echo reads > "$out"; done
+sleep 0.3
+""",
+    "bowtie2": """#!/bin/bash
+r1=""; while [ $# -gt 0 ]; do case $1 in -1) r1=$2; shift 2;; *) shift;; esac; done
+for i in $(seq 1 %d); do printf 'read%%s\t99\tchr1\t%%s\t42\t10M\t=\t1\t100\tACGTACGTAC\tIIIIIIIIII\n' $i $i; done
+case $(basename "$r1") in FAIL*) echo "stub alignment failure" >&2; exit 3;; esac
+echo "100.00%% overall alignment rate" >&2
+""" % SAM_RECORDS,
+    "samtools": """#!/bin/bash
+out=""; while [ $# -gt 0 ]; do case $1 in -o) out=$2; shift 2;; *) shift;; esac; done
+wc -l > "$out"
+""",
+    "multiqc": """#!/bin/bash
+mkdir -p "$3"; touch "$3/$5.html"
+""",
+}
+
+
+def resolve_tools(tool_dir=None):
+    """{tool: executable} from tool_dir if given, else from PATH (None if not found)."""
+    return {tool: shutil.which(tool, path=tool_dir) for tool in TOOLS}
+
+
+def preprocess(path_to_data, data_subdir, adapter, genome_index, output_dir, log_dir, tools, cores, mem_mb, logger):
+    """Builds the stages of the samples of path_to_data and runs them; returns (scheduler, {key: status})."""
+    samples = discover_samples(path_to_data, logger)
+    stages = build_stages(samples, path_to_data, data_subdir, adapter, genome_index, output_dir, log_dir, tools, cores)
+    logger.info(f"{len(samples)} samples, {len(stages)} stages, budget {cores} cores and {mem_mb} MB")
+    timings_file = os.path.join(log_dir, "timings.jsonl")
+    scheduler = Scheduler(stages, cores, mem_mb, logger, timings_file)
+    status = scheduler.run()
+    logger.info(f"Stage timings ({timings_file}):\n" + scheduler.summary())
+    return scheduler, status
+
+
+def self_test(cores=4, mem_mb=8000):
+    """
+    Runs the preprocessing of three samples (A, B and FAIL, whose alignment
+    fails) with the STUB_TOOLS in a temporary directory and checks the outputs,
+    the streaming of the alignment, the removal of the failed outputs and the
+    core budget. Returns the failed checks (empty if all passed).
+    """
+    with tempfile.TemporaryDirectory() as base:
+        tool_dir = os.path.join(base, "bin")
+        os.makedirs(tool_dir)
+        for tool, script in STUB_TOOLS.items():
+            path = os.path.join(tool_dir, tool)
+            with open(path, "w") as f:
+                f.write(script)
+            os.chmod(path, 0o755)
+        path_to_data = os.path.join(base, "data")
+        os.makedirs(os.path.join(path_to_data, "s1"))
+        for sample in ("A", "B", "FAIL"):
+            for read in ("R1", "R2"):
+                with open(os.path.join(path_to_data, "s1", f"{sample}_{read}.fastq.gz"), "w") as f:
+                    f.write("reads\n")
+        os.makedirs(os.path.join(base, "ref"))
+        with open(os.path.join(base, "ref", "index.1.bt2"), "w") as f:
+            f.write("index\n")
+        output_dir = os.path.join(base, "samples", "species")
+        log_dir = os.path.join(base, "logs")
+
+        logger = mylogging.setup_logger("Preprocessing.SelfTest", f"{log_dir}/__SelfTest__.log")
+        scheduler, status = preprocess(path_to_data, "run", os.path.join(base, "ref", "adapters.fa"),
+                                       os.path.join(base, "ref", "index"), output_dir, log_dir,
+                                       resolve_tools(tool_dir), cores, mem_mb, logger)
+
+        mapped = os.path.join(path_to_data, "mapped", "run", "s1")
+
+        def records(sample):
+            with open(os.path.join(output_dir, "s1", f"{sample}_sort.bam")) as f:
+                return int(f.read().split()[0])
+
+        with open(os.path.join(log_dir, "timings.jsonl")) as f:
+            n_timings = sum(1 for _ in f)
+        checks = {
+            "BAM files of A and B copied": all(os.path.isfile(os.path.join(output_dir, "s1", f"{sample}_sort.bam"))
+                                               for sample in ("A", "B")),
+            "alignment streamed into samtools sort": all(records(sample) == SAM_RECORDS for sample in ("A", "B")),
+            "no SAM file written": not glob.glob(os.path.join(path_to_data, "**", "*.sam"), recursive=True),
+            "failed alignment reported": status.get("s1/FAIL/align") == "failed",
+            "stages after the failed alignment skipped": all(status.get(f"s1/FAIL/{kind}") == "skipped"
+                                                             for kind in ("fastqc_bam", "copy")),
+            "truncated BAM of the failed alignment removed": not os.path.exists(os.path.join(mapped, "FAIL_sort.bam")),
+            "multiqc run after the failure": status.get("s1/multiqc_mapped") == "done",
+            "core budget respected": 0 < scheduler.peak_cores <= cores,
+            "timing of every stage recorded": n_timings == len(status),
+        }
+        for check, passed in checks.items():
+            print(f"{'ok' if passed else 'FAILED'}\t{check}")
+        return [check for check, passed in checks.items() if not passed]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Reads preprocessing (fastqc, trimmomatic, bowtie2 | samtools sort) "
+                                                 "of the samples of every subfolder, run concurrently under a "
+                                                 "shared core and memory budget")
+    parser.add_argument("-o", dest="base_dir", help="base directory of the paths below")
+    parser.add_argument("path_to_data", nargs="?", help="folder of the sample subfolders (relative to the base directory)")
+    parser.add_argument("data_subdir", nargs="?", help="subfolder name of the trimmed and mapped outputs")
+    parser.add_argument("adapter_file", nargs="?", help="adapter FASTA of trimmomatic (relative to the base directory)")
+    parser.add_argument("genome_index", nargs="?", help="bowtie2 index prefix (relative to the base directory)")
+    parser.add_argument("species", nargs="?", help="species folder of the final BAM files (<base>/samples/<species>)")
+    parser.add_argument("--cores", type=int, default=None,
+                        help="cores of the job (default: GALAXY_SLOTS/SLURM_CPUS_PER_TASK, else 10)")
+    parser.add_argument("--mem-mb", type=int, default=None,
+                        help=f"memory of the job in MB (default: GALAXY_MEMORY_MB, else {DEFAULT_MEM_MB})")
+    parser.add_argument("--log-dir", default=None, help="stage logs and timings (default: <base>/logs/preprocessing)")
+    parser.add_argument("--tool-dir", default=None, help="directory of the tools (default: PATH)")
+    parser.add_argument("--dry-run", action="store_true", help="only list the stages")
+    parser.add_argument("--self-test", action="store_true",
+                        help="run the scheduler on three samples with stand-ins of the tools and check the outputs")
+    args = parser.parse_args(argv)
+    if not args.self_test:
+        missing = [key for key in ("base_dir", "path_to_data", "data_subdir", "adapter_file", "genome_index", "species")
+                   if getattr(args, key) is None]
+        if missing:
+            parser.error(f"missing arguments: {', '.join(missing)}")
+    return args
+
+
+def main():
+    args = parse_args()
+    if args.self_test:
+        print("Self-test with stub tools (the failure of sample FAIL is expected)")
+        sys.exit(1 if self_test(cores=args.cores or 4) else 0)
+
+    base_dir = args.base_dir.strip()
+    path_to_data = os.path.join(base_dir, args.path_to_data.strip().lstrip("/"))
+    adapter = os.path.join(base_dir, args.adapter_file.strip())
+    genome_index = os.path.join(base_dir, args.genome_index.strip())
+    output_dir = os.path.join(base_dir, "samples", args.species.strip())
+    log_dir = args.log_dir or os.path.join(base_dir, "logs", "preprocessing")
+    cores = args.cores or parallel.available_cores(default=10)
+    mem_mb = args.mem_mb or int(os.environ.get("GALAXY_MEMORY_MB", DEFAULT_MEM_MB))
+
+    logger = mylogging.setup_logger("Preprocessing", f"{log_dir}/__Preprocessing__.log")
+    logger.info("Inside the " + name + " module")
+
+    tools = resolve_tools(args.tool_dir)
+    missing = [tool for tool, exe in tools.items() if exe is None]
+    if missing and not args.dry_run:
+        logger.error(f"Required tool '{missing[0]}' not found in {args.tool_dir or 'PATH'}")
+        sys.exit(1)
+    tools = {tool: exe or tool for tool, exe in tools.items()}
+
+    if args.dry_run:
+        samples = discover_samples(path_to_data, logger)
+        for stage in build_stages(samples, path_to_data, args.data_subdir.strip(), adapter, genome_index,
+                                  output_dir, log_dir, tools, cores):
+            print(f"{stage.key}\tthreads {stage.threads[0]}-{stage.threads[1]}\t{stage.mem_mb} MB\t"
+                  f"after {', '.join(stage.deps + stage.after) or '-'}")
+        return
+
+    scheduler, status = preprocess(path_to_data, args.data_subdir.strip(), adapter, genome_index, output_dir,
+                                   log_dir, tools, cores, mem_mb, logger)
+    failed = sorted({key.rsplit("/", 1)[0] for key, value in status.items() if value == "failed"})
+    if failed:
+        logger.error(f"Preprocessing failed for {len(failed)} samples: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
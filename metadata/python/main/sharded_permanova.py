@@ -0,0 +1,100 @@
+'''
+Created on Oct 18, 2026
+
+@author: avo
+'''
+import sys
+import os
+# Get the directory where the current script is located
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+# Add custom module folders relative to the script location
+sys.path.insert(0, os.path.join(parent_dir, 'Mylogging'))
+sys.path.insert(0, os.path.join(parent_dir, 'FeatureSelection'))
+
+import argparse
+
+#Logging module
+import mylogging
+
+# Cores of the job
+import parallel
+
+# Plans, shards and merge of sharded permutation tests
+import permutation_shards
+
+# %%%%%%%%%%%%%
+name = "ShardedPermanova"
+# %%%%%%%%%%%%%
+
+
+def current_shard():
+    """
+    Shard index of this SLURM array task (SLURM_ARRAY_TASK_ID - SLURM_ARRAY_TASK_MIN), None outside an array.
+    """
+    task_id = os.environ.get("SLURM_ARRAY_TASK_ID")
+    if task_id is None:
+        return None
+    return int(task_id) - int(os.environ.get("SLURM_ARRAY_TASK_MIN", 0))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="PERMANOVA of the selected features with its permutations split into shards "
+                    "(SLURM array tasks), from a plan written by jcna_featureSelect.py --sharded-permutations. "
+                    "Run the shards, e.g. sbatch --array=0-<shards-1> ... sharded_permanova.py run <plan dir>, "
+                    "then sharded_permanova.py merge <plan dir>")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="run one shard and write its partial counts")
+    run.add_argument("plan", help="plan directory (<output stem>_permutations)")
+    run.add_argument("--shard", type=int, default=None, help="shard to run (default: from SLURM_ARRAY_TASK_ID)")
+
+    merge = subparsers.add_parser("merge", help="combine the partial counts into the p-value (result.json)")
+    merge.add_argument("plan", help="plan directory")
+
+    local = subparsers.add_parser("local", help="run every shard in a local process pool, then merge")
+    local.add_argument("plan", help="plan directory")
+    local.add_argument("--workers", type=int, default=None,
+                       help="worker processes (default: GALAXY_SLOTS/SLURM_CPUS_PER_TASK)")
+
+    parser.add_argument("--log-dir", default="logs/ML/permutations", help="log directory")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    logger = mylogging.setup_logger("ML.Permutations", f"{args.log_dir}/__Permutations__.log")
+    logger.info("Inside the " + name + " module")
+
+    try:
+        if args.command == "run":
+            shard = current_shard() if args.shard is None else args.shard
+            if shard is None:
+                logger.error("No shard given (--shard) and not in a SLURM array")
+                sys.exit(2)
+            spec = permutation_shards.read_plan(args.plan)[0]
+            if shard >= spec["n_shards"]:
+                # More array tasks than chunks: nothing to do
+                logger.info(f"Shard {shard}: no chunks ({spec['n_shards']} shards in {args.plan})")
+                return
+            record = permutation_shards.run_shard(args.plan, shard)
+            logger.info(f"Shard {shard}/{record['n_shards']} of {args.plan}: {len(record['counts'])} chunks, "
+                        f"{sum(record['counts'].values())} exceedances")
+            return
+
+        if args.command == "local":
+            result = permutation_shards.run_local(args.plan, args.workers or parallel.available_cores())
+        else:
+            result = permutation_shards.merge(args.plan)
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(3)
+    logger.info(f"{result['test']} of {result['features']} features on {result['sample size']} samples "
+                f"({result['shards']} shards): statistic={result['test statistic']:.6g}, "
+                f"p-value={result['p-value']:.6g} ({result['exceedances']} of {result['permutations']} permutations)")
+
+
+# Guard needed by the process pools ('spawn' start method)
+if __name__ == "__main__":
+    main()
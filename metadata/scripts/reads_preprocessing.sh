@@ -4,6 +4,9 @@ set -euo pipefail
 IFS=$'\n\t'
 export LC_ALL=C
 
+# Runs the samples one stage at a time. metadata/python/main/reads_preprocessing.py takes the same
+# arguments and runs the stages of different samples concurrently (bowtie2 piped into samtools sort)
+
 for tool in trimmomatic fastqc bowtie2 samtools multiqc; do
   if ! command -v "$tool" &> /dev/null; then
     echo "Error: Required tool '$tool' not found in PATH"
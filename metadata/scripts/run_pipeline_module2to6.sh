@@ -54,9 +54,22 @@ if [[ -n "$CHR" ]]; then
   CHROMOSOME_JOB=true
 fi
 
-if [[ "$CHR" == *Y* || "$CHR" == *M* ]]; then
-  echo "Chromosome $CHR is excluded from hte analysis. Exiting."
-  exit 0;
+# A work unit of python/main/chromosome_units.py lists several chromosomes: chr1,chr21,...
+CHROMOSOMES=()
+if [[ "$CHROMOSOME_JOB" == "true" ]]; then
+  IFS=',' read -ra UNIT_CHRS <<< "$CHR"
+  for C in "${UNIT_CHRS[@]}"; do
+    C="$(trim "$C")"
+    if [[ "$C" == *Y* || "$C" == *M* ]]; then
+      echo "Chromosome $C is excluded from hte analysis. Skipping."
+    elif [[ -n "$C" ]]; then
+      CHROMOSOMES+=("$C")
+    fi
+  done
+  if [[ ${#CHROMOSOMES[@]} -eq 0 ]]; then
+    echo "No chromosome of $CHR is included in the analysis. Exiting."
+    exit 0;
+  fi
 fi
 
 # Validation
@@ -86,7 +99,8 @@ ls -lh
 CPUS_PER_TASK=${GALAXY_SLOTS:-1}
 TOTAL_MEM_MB=${GALAXY_MEMORY_MB:-32000}
 MEM_PER_CPU_MB=$(( TOTAL_MEM_MB / CPUS_PER_TASK ))
-HEAP_MEM_GB=$(( TOTAL_MEM_MB * 9 / 10240 ))  # 9/10 of total memory in GB
+# 9/10 of total memory in GB, unless set from the heap_mem_gb column of the unit manifest
+HEAP_MEM_GB=${HEAP_MEM_GB:-$(( TOTAL_MEM_MB * 9 / 10240 ))}
 
 # Auxiliary parameters to run the jar file
 # Define CLASSPATH if not already set in the environment
@@ -96,6 +110,8 @@ LOGFILE_PATH=${LOGFILE_PATH:-./config/log4j2.xml}
 echo "Java command: java -Xmx$HEAP_SIZE -Dlog4j.configurationFile=$LOGFILE_PATH -cp "$CLASSPATH" task.test.Jcna_input ..."
 
 # Run Java analysis with or without chromosome and DATAINFO
+# (one run per chromosome of the unit, one after another)
+for CHR in "${CHROMOSOMES[@]:-}"; do
 if [[ -n "$DATAINFO" && "$CHROMOSOME_JOB" == "true" ]]; then
 echo "Running with data file & chromosome for the job"
   java -Xmx"$HEAP_SIZE" -Dlog4j.configurationFile="$LOGFILE_PATH" -cp "$CLASSPATH" task.test.Jcna_input \
@@ -125,3 +141,4 @@ echo "Running with no data file & no chromosome for the job"
     "$PARAMETERSINFO" \
     "$SPECIES"
 fi
+done